@@ -1,13 +1,70 @@
 import os
-import tkinter as tk
-from tkinter import filedialog, ttk, messagebox
+import sys
+import queue
 import threading
+import time
 import subprocess
-from PIL import Image
-import piexif
 import json
+from collections import deque
 from datetime import datetime
 
+from stripper.core import check_overwrite_risk, plan_output_paths, preview_output_paths, process_batch
+from stripper.cache import ResultCache
+from stripper.events import EventChannel
+from stripper.ffmpeg import probe_ffmpeg
+from stripper.history import HistoryStore
+from stripper.journal import BatchJournal
+from stripper.prescan import has_metadata
+from stripper.metrics import BatchMetrics
+from stripper.scan import FolderScanner, path_key
+
+# How often folder scan results are pushed into the file list
+SCAN_REFRESH_MS = 100
+
+# How often batch status and progress are redrawn (about 30 frames per second)
+UI_REFRESH_MS = 33
+
+# Files checked by the metadata pre-scan between updates of the file list
+PRESCAN_BATCH = 200
+
+# Rows added to the file list per UI tick, so huge scans never freeze the window
+FILE_LIST_CHUNK = 2000
+
+# Tcl procedures that add file list rows and fill in pre-scan results for a
+# whole chunk in one call, instead of one Tk call per row
+TREE_INSERT = "{tree rows} {foreach {row file} $rows {$tree insert {} end -id $row -values [list $file ...]}}"
+TREE_SET = "{tree column cells} {foreach {row text} $cells {$tree set $row $column $text}}"
+
+# "Metadata Found" column text for each pre-scan answer
+METADATA_LABELS = {True: "Yes", False: "No", None: "Unknown"}
+
+# How often new history entries are shown while a batch runs
+HISTORY_REFRESH_MS = 250
+
+# Pause after typing in the history search before querying
+HISTORY_FILTER_DELAY_MS = 300
+
+# History tab status filter choices and the status prefix each one matches
+HISTORY_STATUS_FILTERS = {
+    "All": None,
+    "Success": "Success",
+    "Cached": "Cached",
+    "Copied": "Copied",
+    "Skipped": "Skipped",
+    "Error": "Error",
+}
+
+# Tk is imported by load_tk() so command-line runs never pay for it (or need it)
+tk = ttk = filedialog = messagebox = None
+
+
+def load_tk():
+    """Import tkinter into this module for the GUI"""
+    global tk, ttk, filedialog, messagebox
+    import tkinter as tk
+    from tkinter import filedialog, ttk, messagebox
+
+
 class MetadataStripperApp:
     def __init__(self, root):
         self.root = root
@@ -16,8 +73,26 @@ class MetadataStripperApp:
         self.root.resizable(True, True)
         
         self.files = []
+        self.file_keys = set()  # Real paths of self.files, for O(1) duplicate checks
+        self.scanner = None  # Folder scan currently running, if any
         self.output_dir = None
-        self.ffmpeg_available = self.check_ffmpeg()
+        self.file_rows = 0  # File list rows ever added, for unique row ids
+        self.pending_rows = deque()  # (row id, file) waiting to be added to the file list
+        self.filling_rows = False  # Whether fill_file_list is scheduled
+        
+        # Batch and pre-scan workers report through this channel, drained by poll_events
+        self.events = EventChannel()
+        
+        # Selected files are checked for metadata in the background
+        self.prescan_queue = queue.Queue()
+        self.prescan_generation = 0  # Bumped when the selection is cleared
+        self.prescan_counts = [0, 0]  # Files with metadata, files checked
+        threading.Thread(target=self.prescan_files, daemon=True).start()
+        
+        # Probe FFmpeg in the background so the window appears right away
+        self.ffmpeg_info = None
+        self.ffmpeg_probed = threading.Event()
+        threading.Thread(target=self.check_ffmpeg, daemon=True).start()
         
         # User preferences with default values
         self.preferences = {
@@ -27,15 +102,30 @@ class MetadataStripperApp:
             "allow_overwrite": False,  # Default to not overwrite (safer)
             "last_output_directory": "",  # Remember last output directory
             "keep_log": True,  # Default to keeping processing history
-            "max_history_entries": 100  # Maximum number of history entries to keep
+            "max_history_entries": 100,  # Maximum number of history entries to keep
+            "max_history_age_days": None,  # Drop history entries older than this, None to keep all
+            "image_workers": None,  # Image worker processes, None for one per CPU core
+            "video_workers": 4,  # FFmpeg processes to run at the same time
+            "exclude_patterns": [],  # Glob patterns to skip when scanning folders
+            "result_cache": True,  # Skip files whose clean copy from an earlier run is still in place
+            "result_cache_max_entries": 100000,  # Least recently used cache entries beyond this are dropped
+            "result_cache_verify_content": False,  # Also hash the start and end of each file to detect changes
+            "fsync_outputs": False,  # Flush cleaned files to disk in groups while a batch runs
+            "link_clean_files": False,  # Hard-link files without metadata instead of copying them
+            "memory_limit_mb": 256,  # Most memory one image re-encode may use; larger images are done in bands
+            "memory_budget_mb": None,  # Estimated memory running image jobs may use together, None for half the RAM
+            "metrics_jsonl": None,  # File to append per-file stage timings to as JSON lines
+            "metrics_textfile": None  # Prometheus textfile to write batch metrics to
         }
         
-        # Processing history
-        self.history = []
+        # Processing history, opened by load_history()
+        self.history_store = None
         
         # Try to load preferences and history
         self.load_preferences()
         self.load_history()
+        self.open_result_cache()
+        self.open_journal()
         
         # Initialize with saved preference
         self.allow_overwrite = tk.BooleanVar(value=self.preferences["allow_overwrite"])
@@ -48,6 +138,15 @@ class MetadataStripperApp:
             self.output_dir = self.preferences["last_output_directory"]
             self.output_var.set(self.output_dir)
         
+        # Report the FFmpeg probe result once it is in
+        self.root.after(100, self.poll_ffmpeg_probe)
+        
+        # Offer to finish a batch the last session didn't get through
+        self.root.after_idle(self.offer_resume)
+        
+        # Workers report through self.events; only the Tk thread touches widgets
+        self.root.after(UI_REFRESH_MS, self.poll_events)
+        
     def load_preferences(self):
         """Load user preferences from file"""
         try:
@@ -76,37 +175,87 @@ class MetadataStripperApp:
             pass
     
     def load_history(self):
-        """Load processing history from file"""
+        """Open the processing history database, importing the old JSON history once"""
+        data_dir = os.path.dirname(os.path.abspath(__file__))
+        self.history_store = HistoryStore(os.path.join(data_dir, 'processing_history.db'))
         try:
-            history_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'processing_history.json')
-            if os.path.exists(history_file):
-                with open(history_file, 'r') as f:
-                    self.history = json.load(f)
+            self.history_store.import_json(os.path.join(data_dir, 'processing_history.json'))
         except Exception:
-            # If anything goes wrong, just use an empty history
-            self.history = []
+            # An unreadable old history is simply left behind
+            pass
+        self.apply_history_retention()
     
     def save_history(self):
-        """Save processing history to file"""
+        """Make sure the history is on disk and apply the retention settings"""
         try:
-            # Only save if history logging is enabled
-            if not self.keep_log.get():
+            # Only save if history logging is enabled (read from preferences, this runs on the worker)
+            if not self.preferences["keep_log"]:
                 return
-                
-            # Trim history if it exceeds the maximum number of entries
-            if len(self.history) > self.preferences["max_history_entries"]:
-                self.history = self.history[-self.preferences["max_history_entries"]:]
-                
-            history_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'processing_history.json')
-            with open(history_file, 'w') as f:
-                json.dump(self.history, f)
+            self.history_store.flush()
+            self.apply_history_retention()
         except Exception:
             # If saving fails, just continue - not critical
             pass
     
-    def add_to_history(self, source_file, output_file, status="Success"):
+    def apply_history_retention(self):
+        """Drop history entries beyond the configured count or age"""
+        self.history_store.prune(
+            max_entries=self.preferences["max_history_entries"],
+            max_age_days=self.preferences["max_history_age_days"]
+        )
+    
+    def open_result_cache(self):
+        """Open the cache of earlier results, if enabled in preferences"""
+        self.result_cache = None
+        if not self.preferences["result_cache"]:
+            return
+        try:
+            self.result_cache = ResultCache(
+                os.path.join(os.path.dirname(os.path.abspath(__file__)), 'result_cache.db'),
+                max_entries=self.preferences["result_cache_max_entries"],
+                verify_content=self.preferences["result_cache_verify_content"]
+            )
+        except Exception:
+            # Without a cache every file is simply processed
+            self.result_cache = None
+    
+    def open_journal(self):
+        """Open the journal that lets interrupted batches be resumed"""
+        try:
+            self.journal = BatchJournal(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'batch_journal.db'))
+        except Exception:
+            # Batches still run, they just can't be resumed
+            self.journal = None
+    
+    def offer_resume(self):
+        """Ask whether to resume the most recent interrupted batch"""
+        if self.journal is None:
+            return
+        interrupted = self.journal.interrupted()
+        if not interrupted:
+            return
+        batch = interrupted[0]
+        
+        if not messagebox.askyesno(
+            "Resume Interrupted Batch",
+            f"Processing started {batch['started']} was interrupted after {batch['finished']} of "
+            f"{batch['total']} files.\n\nOutput directory: {batch['output_dir']}\n\n"
+            "Do you want to process the remaining files now?"
+        ):
+            self.journal.finish(batch["id"])
+            return
+        
+        files, output_paths = self.journal.resume(batch["id"])
+        self.clear_selection()
+        self.add_files(files)
+        self.output_dir = batch["output_dir"]
+        self.output_var.set(self.output_dir)
+        self.allow_overwrite.set(batch["allow_overwrite"])
+        self.start_batch(self.output_dir, (batch["id"], output_paths))
+    
+    def add_to_history(self, source_file, output_file, status="Success", duration=None):
         """Add a processed file to the history"""
-        if not self.keep_log.get():
+        if not self.preferences["keep_log"]:
             return
             
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -116,29 +265,21 @@ class MetadataStripperApp:
             "output_file": output_file,
             "status": status
         }
+        if duration is not None:
+            entry["duration"] = round(duration, 3)
         
-        self.history.append(entry)
-        
-        # If the history tab is created, update it
-        if hasattr(self, 'history_tree'):
-            self.update_history_display()
+        # Written by the store's background writer; the view refreshes on its next tick
+        self.history_store.add(entry)
     
     def clear_history(self):
         """Clear processing history"""
-        self.history = []
+        self.history_store.clear()
         
         # Clear the history display if it exists
         if hasattr(self, 'history_tree'):
-            for item in self.history_tree.get_children():
-                self.history_tree.delete(item)
-                
-        # Delete the history file
-        try:
-            history_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'processing_history.json')
-            if os.path.exists(history_file):
-                os.remove(history_file)
-        except Exception:
-            pass
+            self.history_top_id = None
+            self.history_follow = True
+            self.update_history_display()
             
         messagebox.showinfo("History Cleared", "Processing history has been cleared.")
     
@@ -178,6 +319,14 @@ class MetadataStripperApp:
         clear_btn = ttk.Button(button_frame, text="Clear Selection", command=self.clear_selection)
         clear_btn.pack(side=tk.LEFT, padx=(0, 5))
         
+        # Cancel scan button, only enabled while a folder is being scanned
+        self.cancel_scan_btn = ttk.Button(button_frame, text="Cancel Scan", command=self.cancel_scan, state=tk.DISABLED)
+        self.cancel_scan_btn.pack(side=tk.LEFT, padx=(0, 5))
+        
+        # Preview button, shows where each file will be written
+        preview_btn = ttk.Button(button_frame, text="Preview Outputs", command=self.preview_outputs)
+        preview_btn.pack(side=tk.LEFT, padx=(0, 5))
+        
         # Process button
         process_btn = ttk.Button(button_frame, text="Strip Metadata", command=self.start_processing)
         process_btn.pack(side=tk.LEFT)
@@ -190,10 +339,19 @@ class MetadataStripperApp:
         scrollbar = ttk.Scrollbar(list_frame)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
-        # Files listbox
-        self.files_listbox = tk.Listbox(list_frame, yscrollcommand=scrollbar.set)
-        self.files_listbox.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        scrollbar.config(command=self.files_listbox.yview)
+        # Files list, with what the metadata pre-scan found in each file
+        self.files_tree = ttk.Treeview(
+            list_frame,
+            columns=("file", "metadata"),
+            show="headings",
+            yscrollcommand=scrollbar.set
+        )
+        self.files_tree.heading("file", text="File")
+        self.files_tree.heading("metadata", text="Metadata Found")
+        self.files_tree.column("file", width=600)
+        self.files_tree.column("metadata", width=140, anchor=tk.CENTER, stretch=False)
+        self.files_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        scrollbar.config(command=self.files_tree.yview)
         
         # Progress bar
         self.progress_frame = ttk.Frame(main_frame)
@@ -241,7 +399,7 @@ class MetadataStripperApp:
         # Keep log option
         log_check = ttk.Checkbutton(
             options_frame, 
-            text="Keep processing history log (Stored locally in processing_history.json)",
+            text="Keep processing history log (Stored locally in processing_history.db)",
             variable=self.keep_log,
             command=self.update_log_preference
         )
@@ -264,25 +422,46 @@ class MetadataStripperApp:
         refresh_btn = ttk.Button(toolbar, text="Refresh", command=self.update_history_display)
         refresh_btn.pack(side=tk.LEFT)
         
+        # Status filter and path search, both answered by the history database
+        self.history_status_var = tk.StringVar(value="All")
+        status_filter = ttk.Combobox(
+            toolbar,
+            textvariable=self.history_status_var,
+            values=list(HISTORY_STATUS_FILTERS),
+            state="readonly",
+            width=10
+        )
+        status_filter.pack(side=tk.RIGHT)
+        ttk.Label(toolbar, text="Status:").pack(side=tk.RIGHT, padx=(10, 5))
+        
+        self.history_search_var = tk.StringVar()
+        search_entry = ttk.Entry(toolbar, textvariable=self.history_search_var, width=30)
+        search_entry.pack(side=tk.RIGHT)
+        ttk.Label(toolbar, text="Search:").pack(side=tk.RIGHT, padx=(10, 5))
+        
+        self.history_filter_job = None
+        self.history_status_var.trace_add("write", lambda *args: self.on_history_filter_changed())
+        self.history_search_var.trace_add("write", lambda *args: self.on_history_filter_changed())
+        
         # Create a treeview for history display
         tree_frame = ttk.Frame(history_frame)
         tree_frame.pack(fill=tk.BOTH, expand=True)
         
         # Scrollbars
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical")
+        self.history_vsb = ttk.Scrollbar(tree_frame, orient="vertical")
         hsb = ttk.Scrollbar(tree_frame, orient="horizontal")
         
-        # Create the treeview
+        # Create the treeview. Only the rows that fit on screen exist as items,
+        # so the vertical scrollbar pages through the history store instead of the tree.
         self.history_tree = ttk.Treeview(
             tree_frame,
             columns=("timestamp", "source", "output", "status"),
             show="headings",
-            yscrollcommand=vsb.set,
             xscrollcommand=hsb.set
         )
         
         # Set up the scrollbars
-        vsb.config(command=self.history_tree.yview)
+        self.history_vsb.config(command=self.scroll_history)
         hsb.config(command=self.history_tree.xview)
         
         # Configure column headings
@@ -299,14 +478,29 @@ class MetadataStripperApp:
         
         # Pack everything
         self.history_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        self.history_vsb.pack(side=tk.RIGHT, fill=tk.Y)
         hsb.pack(side=tk.BOTTOM, fill=tk.X)
         
         # Add right-click menu for copying paths
         self.create_context_menu()
         
-        # Populate with existing history
+        # Id of the entry in the top row, and whether to stick to the newest entries
+        self.history_top_id = None
+        self.history_follow = True
+        
+        # Store version last shown, and the cached id range for the current filters
+        self.history_shown_version = None
+        self.history_range_key = None
+        self.history_range = (None, None)
+        
+        # Re-page when resized, and scroll the page with the mouse wheel
+        self.history_tree.bind("<Configure>", lambda e: self.update_history_display())
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.history_tree.bind(sequence, self.on_history_wheel)
+        
+        # Populate with existing history and refresh at a fixed rate from now on
         self.update_history_display()
+        self.root.after(HISTORY_REFRESH_MS, self.poll_history)
     
     def create_context_menu(self):
         # Create a right-click menu
@@ -386,17 +580,58 @@ class MetadataStripperApp:
         except Exception:
             messagebox.showerror("Error", "Could not open file location.")
     
+    def history_page_size(self):
+        """Number of history rows that fit in the treeview"""
+        children = self.history_tree.get_children()
+        bbox = self.history_tree.bbox(children[0]) if children else ""
+        if bbox:
+            header_height, row_height = bbox[1], bbox[3]
+        else:
+            header_height, row_height = 25, 20
+        return max(1, (self.history_tree.winfo_height() - header_height) // row_height)
+    
+    def history_filters(self):
+        """Current (search text, status prefix) of the history tab"""
+        search = self.history_search_var.get().strip() or None
+        status = HISTORY_STATUS_FILTERS.get(self.history_status_var.get())
+        return search, status
+    
+    def history_id_range(self):
+        """(first id, last id) of the history entries matching the current filters"""
+        # Filtered ranges can mean a scan, so look them up once per filter and store version
+        key = self.history_filters() + (self.history_store.version,)
+        if key != self.history_range_key:
+            self.history_range = self.history_store.id_range(*key[:2])
+            self.history_range_key = key
+        return self.history_range
+    
     def update_history_display(self):
-        """Update the history treeview with current history data"""
-        # Clear the current view
-        for item in self.history_tree.get_children():
-            self.history_tree.delete(item)
-            
-        # Add entries
-        for entry in self.history:
+        """Show the page of history starting at history_top_id, creating only the visible rows"""
+        self.history_shown_version = self.history_store.version
+        search, status = self.history_filters()
+        page = self.history_page_size()
+        
+        entries = None
+        if not self.history_follow and self.history_top_id is not None:
+            entries = self.history_store.fetch(page, search, status, start=self.history_top_id)
+            if len(entries) < page:
+                # Past the end: show the last full page instead
+                entries = None
+        if entries is None:
+            entries = self.history_store.fetch(page, search, status)
+        first, last = self.history_id_range()
+        self.history_top_id = entries[0]["id"] if entries else None
+        # Keep following new entries only while scrolled to the end
+        self.history_follow = not entries or entries[-1]["id"] == last
+        
+        # Rows are keyed by entry id so a selection survives the refresh
+        selection = self.history_tree.selection()
+        self.history_tree.delete(*self.history_tree.get_children())
+        for entry in entries:
             self.history_tree.insert(
                 "", 
                 "end", 
+                iid=str(entry["id"]),
                 values=(
                     entry.get("timestamp", "Unknown"),
                     entry.get("source_file", "Unknown"),
@@ -404,6 +639,66 @@ class MetadataStripperApp:
                     entry.get("status", "Unknown")
                 )
             )
+        still_visible = [item for item in selection if self.history_tree.exists(item)]
+        if still_visible:
+            self.history_tree.selection_set(still_visible)
+        
+        # Position the scrollbar by id, which tracks the row position without counting rows
+        if entries and last > first:
+            span = last - first + 1
+            self.history_vsb.set((entries[0]["id"] - first) / span, (entries[-1]["id"] - first + 1) / span)
+        else:
+            self.history_vsb.set(0, 1)
+    
+    def on_history_filter_changed(self):
+        """Re-query the history shortly after the search or status filter changes"""
+        if self.history_filter_job is not None:
+            self.root.after_cancel(self.history_filter_job)
+        self.history_filter_job = self.root.after(HISTORY_FILTER_DELAY_MS, self.apply_history_filter)
+    
+    def apply_history_filter(self):
+        """Show the newest entries matching the new filters"""
+        self.history_filter_job = None
+        self.history_follow = True
+        self.update_history_display()
+    
+    def scroll_history(self, action, amount, unit=None):
+        """Vertical scrollbar callback: move the page through the history"""
+        if action == "moveto":
+            first, last = self.history_id_range()
+            if first is None:
+                return
+            # The first match at or after the id at that fraction of the range
+            self.history_top_id = first + int(float(amount) * (last - first + 1))
+            self.history_follow = False
+            self.update_history_display()
+        else:
+            step = self.history_page_size() if unit == "pages" else 1
+            self.scroll_history_by(int(amount) * step)
+    
+    def scroll_history_by(self, rows):
+        """Move the history page up (negative) or down by a number of rows"""
+        if self.history_top_id is None:
+            return
+        search, status = self.history_filters()
+        self.history_top_id = self.history_store.seek(self.history_top_id, rows, search, status)
+        self.history_follow = False
+        self.update_history_display()
+    
+    def on_history_wheel(self, event):
+        """Scroll the history page with the mouse wheel"""
+        if event.num == 4 or (event.num != 5 and event.delta > 0):
+            self.scroll_history_by(-3)
+        else:
+            self.scroll_history_by(3)
+        # Stop the treeview's own wheel binding from scrolling inside the page
+        return "break"
+    
+    def poll_history(self):
+        """Refresh the history view at a fixed rate when the store has changed"""
+        if self.history_store.version != self.history_shown_version:
+            self.update_history_display()
+        self.root.after(HISTORY_REFRESH_MS, self.poll_history)
     
     def update_log_preference(self):
         """Update the log keeping preference"""
@@ -411,7 +706,7 @@ class MetadataStripperApp:
         self.save_preferences()
         
         # If logging is disabled, ask if user wants to clear history
-        if not self.keep_log.get() and self.history:
+        if not self.keep_log.get() and self.history_store.total:
             if messagebox.askyesno(
                 "Clear History", 
                 "Do you want to clear the existing processing history?"
@@ -466,7 +761,7 @@ class MetadataStripperApp:
     
     def select_files(self):
         filetypes = (
-            ("Image/Video files", "*.jpg *.jpeg *.png *.gif *.bmp *.tiff *.mp4 *.mov *.avi *.mkv"),
+            ("Image/Video files", "*.jpg *.jpeg *.png *.gif *.bmp *.tif *.tiff *.webp *.mp4 *.mov *.avi *.mkv"),
             ("All files", "*.*")
         )
         files = filedialog.askopenfilenames(filetypes=filetypes)
@@ -479,35 +774,156 @@ class MetadataStripperApp:
             self.add_folder_files(folder)
     
     def add_folder_files(self, folder):
-        image_extensions = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff')
-        video_extensions = ('.mp4', '.mov', '.avi', '.mkv')
-        
-        for root, _, files in os.walk(folder):
-            for file in files:
-                ext = os.path.splitext(file.lower())[1]
-                if ext in image_extensions or ext in video_extensions:
-                    full_path = os.path.join(root, file)
-                    if full_path not in self.files:
-                        self.files.append(full_path)
-                        self.files_listbox.insert(tk.END, full_path)
+        """Scan folder in the background, streaming found files into the list"""
+        if self.scanner is not None:
+            messagebox.showinfo("Scan in Progress", "Please wait for the current folder scan to finish")
+            return
         
-        self.status_var.set(f"{len(self.files)} files selected")
+        scanner = FolderScanner(exclude=self.preferences["exclude_patterns"])
+        found = queue.Queue()
+        self.scanner = scanner
+        self.cancel_scan_btn.config(state=tk.NORMAL)
+        self.status_var.set(f"Scanning... {len(self.files)} files selected")
+        
+        threading.Thread(target=self.scan_folder, args=(scanner, folder, found), daemon=True).start()
+        self.root.after(SCAN_REFRESH_MS, self.poll_scan, scanner, found)
+    
+    def scan_folder(self, scanner, folder, found):
+        """Worker thread: pass scanned files to the UI in batches"""
+        batch = []
+        last_flush = time.monotonic()
+        try:
+            for item in scanner.scan(folder):
+                batch.append(item)
+                if len(batch) >= 1000 or time.monotonic() - last_flush >= SCAN_REFRESH_MS / 1000:
+                    found.put(batch)
+                    batch = []
+                    last_flush = time.monotonic()
+        finally:
+            if batch:
+                found.put(batch)
+            # Tell the UI the scan is over
+            found.put(None)
+    
+    def poll_scan(self, scanner, found):
+        """Move scanned files into the selection; the list shows them in chunks via show_files"""
+        if scanner is not self.scanner:
+            # The selection was cleared while scanning; drop what is left
+            return
+        
+        new_files = []
+        finished = False
+        while not finished:
+            try:
+                batch = found.get_nowait()
+            except queue.Empty:
+                break
+            if batch is None:
+                finished = True
+                break
+            for path, key in batch:
+                if key not in self.file_keys:
+                    self.file_keys.add(key)
+                    self.files.append(path)
+                    new_files.append(path)
+        
+        if new_files:
+            self.show_files(new_files)
+        
+        if finished:
+            self.scanner = None
+            self.cancel_scan_btn.config(state=tk.DISABLED)
+            prefix = "Scan cancelled. " if scanner.cancelled.is_set() else ""
+            self.status_var.set(f"{prefix}{len(self.files)} files selected")
+        else:
+            self.status_var.set(f"Scanning... {len(self.files)} files selected")
+            self.root.after(SCAN_REFRESH_MS, self.poll_scan, scanner, found)
+    
+    def cancel_scan(self):
+        """Stop the running folder scan, keeping the files found so far"""
+        if self.scanner is not None:
+            self.scanner.cancel()
     
     def add_files(self, files):
+        new_files = []
         for file in files:
-            if file not in self.files:
+            key = path_key(file)
+            if key not in self.file_keys:
+                self.file_keys.add(key)
                 self.files.append(file)
-                self.files_listbox.insert(tk.END, file)
+                new_files.append(file)
         
+        if new_files:
+            self.show_files(new_files)
         self.status_var.set(f"{len(self.files)} files selected")
     
+    def show_files(self, new_files):
+        """Queue rows for newly selected files; fill_file_list adds them in chunks"""
+        for file in new_files:
+            self.pending_rows.append((str(self.file_rows), file))
+            self.file_rows += 1
+        if not self.filling_rows:
+            self.filling_rows = True
+            self.root.after_idle(self.fill_file_list)
+    
+    def fill_file_list(self):
+        """Add the next chunk of rows in one Tk call and queue it for the metadata pre-scan"""
+        rows = []
+        while self.pending_rows and len(rows) < FILE_LIST_CHUNK:
+            rows.append(self.pending_rows.popleft())
+        if rows:
+            self.root.tk.call("apply", TREE_INSERT, str(self.files_tree),
+                              tuple(value for row in rows for value in row))
+            # Only rows already in the list are checked, so results always have a row to land in
+            self.prescan_queue.put((self.prescan_generation, rows))
+        if self.pending_rows:
+            self.root.after(1, self.fill_file_list)
+        else:
+            self.filling_rows = False
+    
+    def prescan_files(self):
+        """Worker thread: check queued files for metadata, reporting through self.events"""
+        while True:
+            generation, rows = self.prescan_queue.get()
+            for start in range(0, len(rows), PRESCAN_BATCH):
+                if generation != self.prescan_generation:
+                    # The selection was cleared; these rows are gone
+                    break
+                found = [(row, has_metadata(file)) for row, file in rows[start:start + PRESCAN_BATCH]]
+                self.events.post("metadata", generation, found)
+    
+    def show_prescan(self, generation, found):
+        """Fill in the "Metadata Found" column for checked files"""
+        if generation != self.prescan_generation:
+            return
+        self.root.tk.call("apply", TREE_SET, str(self.files_tree), "metadata",
+                          tuple(value for row, result in found for value in (row, METADATA_LABELS[result])))
+        self.prescan_counts[0] += sum(1 for _, result in found if result)
+        self.prescan_counts[1] += len(found)
+        with_metadata, checked = self.prescan_counts
+        self.files_tree.heading("metadata", text=f"Metadata Found ({with_metadata}/{checked})")
+    
     def clear_selection(self):
+        # Abandon any running scan so its results don't land in the new selection
+        if self.scanner is not None:
+            self.scanner.cancel()
+            self.scanner = None
+            self.cancel_scan_btn.config(state=tk.DISABLED)
         self.files = []
-        self.files_listbox.delete(0, tk.END)
+        self.file_keys = set()
+        self.pending_rows.clear()
+        self.files_tree.delete(*self.files_tree.get_children())
+        self.prescan_generation += 1
+        self.prescan_counts = [0, 0]
+        self.files_tree.heading("metadata", text="Metadata Found")
         self.status_var.set("Ready")
         self.progress_var.set(0)
     
     def start_processing(self):
+        if self.scanner is not None:
+            messagebox.showinfo("Scan in Progress", "Please wait for the folder scan to finish or cancel it")
+            return
+        
         if not self.files:
             messagebox.showinfo("No Files", "Please select files to process")
             return
@@ -522,7 +938,7 @@ class MetadataStripperApp:
             self.save_preferences()
         
         # Check if any files would be overwritten, only if overwrite is not allowed
-        overwrite_risk = self.check_overwrite_risk()
+        overwrite_risk = check_overwrite_risk(self.files, self.output_dir)
         
         if not self.allow_overwrite.get() and overwrite_risk:
             # Skip warning if user chose to suppress it
@@ -553,13 +969,73 @@ class MetadataStripperApp:
                 if not response:
                     return
             
-        # Create a thread to process files
+        self.start_batch(self.output_dir)
+    
+    def start_batch(self, output_dir, resume=None):
+        """Process the selected files on a worker thread"""
+        # Tk variables are read here, on the Tk thread, and handed to the worker
         threading.Thread(
             target=self.process_files,
-            args=(self.output_dir,),
+            args=(output_dir, self.allow_overwrite.get(), resume),
             daemon=True
         ).start()
     
+    def preview_outputs(self):
+        """Show where each selected file would be written, without processing anything"""
+        if not self.files:
+            messagebox.showinfo("No Files", "Please select files to process")
+            return
+        
+        if not self.output_dir:
+            messagebox.showinfo("No Output Directory", "Please select an output directory")
+            return
+        
+        files = list(self.files)
+        output_paths = plan_output_paths(files, self.output_dir, self.allow_overwrite.get())
+        preview = preview_output_paths(files, output_paths)
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Output Preview")
+        dialog.transient(self.root)
+        dialog.geometry("800x400")
+        
+        frame = ttk.Frame(dialog, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        replaced = sum(1 for _, _, action in preview if action != "new")
+        summary = f"{len(preview)} files will be written to {self.output_dir}"
+        if replaced:
+            summary += f" ({replaced} replacing existing files)"
+        ttk.Label(frame, text=summary, wraplength=760).pack(anchor=tk.W, pady=(0, 10))
+        
+        tree_frame = ttk.Frame(frame)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical")
+        tree = ttk.Treeview(
+            tree_frame,
+            columns=("source", "output", "action"),
+            show="headings",
+            yscrollcommand=vsb.set
+        )
+        vsb.config(command=tree.yview)
+        vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+        
+        tree.heading("source", text="Source File")
+        tree.heading("output", text="Output File")
+        tree.heading("action", text="Action")
+        tree.column("source", width=320)
+        tree.column("output", width=320)
+        tree.column("action", width=80)
+        
+        for source_file, output_file, action in preview:
+            tree.insert("", tk.END, values=(source_file, output_file, action))
+        
+        close_btn = ttk.Button(frame, text="Close", command=dialog.destroy, width=10)
+        close_btn.pack(pady=(10, 0))
+        close_btn.focus_set()
+        dialog.bind("<Escape>", lambda e: dialog.destroy())
+    
     def show_warning_with_dont_show_again(self, title, message, preference_key):
         """Display a custom warning dialog with a 'Don't show again' checkbox"""
         dialog = tk.Toplevel(self.root)
@@ -629,242 +1105,164 @@ class MetadataStripperApp:
         
         return result.get()
     
-    def check_overwrite_risk(self):
-        """Check if any original files would be overwritten"""
-        for file_path in self.files:
-            file_dir = os.path.dirname(file_path)
-            if os.path.normpath(file_dir) == os.path.normpath(self.output_dir):
-                return True
-        return False
-    
-    def get_safe_output_path(self, file_path, output_dir):
-        """Generate a safe output path that won't overwrite the original file"""
-        file_name = os.path.basename(file_path)
-        base_name, extension = os.path.splitext(file_name)
-        output_path = os.path.join(output_dir, file_name)
-        
-        # If the input and output paths are identical, and overwrite is not allowed, modify the output filename
-        if os.path.normpath(os.path.dirname(file_path)) == os.path.normpath(output_dir) and not self.allow_overwrite.get():
-            output_path = os.path.join(output_dir, f"{base_name}_clean{extension}")
-            # If that still exists, add a number
-            counter = 1
-            while os.path.exists(output_path):
-                output_path = os.path.join(output_dir, f"{base_name}_clean_{counter}{extension}")
-                counter += 1
-                
-        return output_path
-    
-    def process_files(self, output_dir):
-        total = len(self.files)
+    def process_files(self, output_dir, allow_overwrite, resume=None):
+        """Worker thread: run a batch, reporting to the UI only through self.events"""
+        files = list(self.files)
+        total = len(files)
         processed = 0
         skipped = 0
+        cached = 0
         
-        for file in self.files:
-            try:
-                # Update status
-                file_name = os.path.basename(file)
-                self.status_var.set(f"Processing: {file_name}")
-                
-                # Process based on file type
-                ext = os.path.splitext(file.lower())[1]
-                output_path = self.get_safe_output_path(file, output_dir)
-                
-                if ext in ('.jpg', '.jpeg', '.png', '.tiff', '.bmp', '.gif'):
-                    self.strip_image_metadata(file, output_dir)
-                    # Add to history
-                    self.add_to_history(file, output_path)
-                elif ext in ('.mp4', '.mov', '.avi', '.mkv'):
-                    # Skip video processing if FFmpeg is not available
-                    if not self.ffmpeg_available:
-                        self.status_var.set(f"Skipping video file (FFmpeg not available): {file_name}")
-                        # Add to history with skip status
-                        self.add_to_history(file, output_path, "Skipped - No FFmpeg")
-                        skipped += 1
-                        continue
-                    self.strip_video_metadata(file, output_dir)
-                    # Add to history
-                    self.add_to_history(file, output_path)
-                else:
-                    # Just copy the file for unsupported types
-                    output_path = self.get_safe_output_path(file, output_dir)
-                    with open(file, 'rb') as src, open(output_path, 'wb') as dst:
-                        dst.write(src.read())
-                    # Add to history
-                    self.add_to_history(file, output_path, "Copied (No Metadata)")
-                
-                # Update progress
+        # Fraction done of each video that is still being remuxed
+        self.video_progress = {}
+        
+        # Videos need the result of the startup FFmpeg probe
+        self.ffmpeg_probed.wait()
+        
+        # Plan every output up front and journal it, so an interrupted batch can be resumed
+        if resume is None:
+            output_paths = plan_output_paths(files, output_dir, allow_overwrite)
+            batch_id = self.journal.begin(output_dir, allow_overwrite, output_paths) if self.journal else None
+        else:
+            batch_id, output_paths = resume
+        
+        # Per-stage timings, reported in the completion message and optionally exported
+        try:
+            metrics = BatchMetrics(self.preferences["metrics_jsonl"])
+        except OSError:
+            metrics = BatchMetrics()
+        
+        results = process_batch(
+            files,
+            output_dir,
+            allow_overwrite=allow_overwrite,
+            image_workers=self.preferences["image_workers"],
+            video_workers=self.preferences["video_workers"],
+            ffmpeg_info=self.ffmpeg_info,
+            on_progress=lambda file, fraction: self.update_video_progress(file, fraction, processed + skipped, total),
+            output_paths=output_paths,
+            cache=self.result_cache,
+            sync_outputs=self.preferences["fsync_outputs"],
+            link_clean=self.preferences["link_clean_files"],
+            memory_limit=self.preferences["memory_limit_mb"] * 1024 * 1024,
+            memory_budget=self.preferences["memory_budget_mb"] and self.preferences["memory_budget_mb"] * 1024 * 1024
+        )
+        for result in results:
+            metrics.observe(result)
+            if batch_id is not None:
+                journal_start = time.perf_counter()
+                self.journal.record(batch_id, result)
+                metrics.add_stage("journal", time.perf_counter() - journal_start)
+            ui_start = time.perf_counter()
+            source_file = result["source_file"]
+            file_name = os.path.basename(source_file)
+            self.video_progress.pop(source_file, None)
+            
+            if result["status"] == "Cached":
+                self.events.set("status", f"Unchanged since last run: {file_name}")
+                self.add_to_history(source_file, result["output_file"], result["status"])
+                processed += 1
+                cached += 1
+            elif result["error"] is None:
+                self.events.set("status", f"Processed: {file_name}")
+                self.add_to_history(source_file, result["output_file"], result["status"], result["duration"])
                 processed += 1
-                progress = (processed / total) * 100
-                self.progress_var.set(progress)
-                self.root.update_idletasks()
-                
-            except Exception as e:
-                error_msg = str(e)
-                self.status_var.set(f"Error processing {file_name}: {error_msg}")
+            elif result["status"] == "Error":
+                error_msg = result["error"]
+                self.events.set("status", f"Error processing {file_name}: {error_msg}")
                 # Add to history with error status
-                output_path = self.get_safe_output_path(file, output_dir)
-                self.add_to_history(file, output_path, f"Error: {error_msg[:30]}...")
+                self.add_to_history(source_file, result["output_file"], f"Error: {error_msg[:30]}...", result["duration"])
                 skipped += 1
-                # Continue with next file
+            else:
+                self.events.set("status", f"Skipping video file ({result['error']}): {file_name}")
+                # Add to history with skip status
+                self.add_to_history(source_file, result["output_file"], result["status"])
+                skipped += 1
+            
+            self.update_progress(processed + skipped, total)
+            metrics.add_stage("ui", time.perf_counter() - ui_start)
+        
+        if batch_id is not None:
+            self.journal.finish(batch_id)
+        
+        metrics.finish()
+        if self.preferences["metrics_textfile"]:
+            try:
+                metrics.write_prometheus(self.preferences["metrics_textfile"])
+            except OSError:
+                # Metrics export is not critical
+                pass
         
         # Update final status message with processed and skipped counts
         status_msg = f"Completed! Processed {processed} of {total} files."
+        if cached > 0:
+            status_msg += f" {cached} were unchanged since the last run."
         if skipped > 0:
             status_msg += f" Skipped {skipped} files."
         
-        self.status_var.set(status_msg)
+        self.events.set("status", status_msg)
         
-        # Save the history to disk
+        # Save the history to disk and keep the result cache within its size limit
         self.save_history()
+        if self.result_cache is not None:
+            self.result_cache.evict()
         
-        # Show completion message unless suppressed
-        if not self.preferences["suppress_completion_message"]:
-            self.show_completion_message(status_msg, processed, skipped, total)
+        # The completion message is shown by the Tk thread
+        self.events.post("complete", status_msg, processed, skipped, total, metrics.describe())
+    
+    def poll_events(self):
+        """Apply what the batch worker reported since the last frame"""
+        latest, events = self.events.drain()
+        if "status" in latest:
+            self.status_var.set(latest["status"])
+        if "progress" in latest:
+            self.progress_var.set(latest["progress"])
+        
+        for name, args in events:
+            if name == "metadata":
+                self.show_prescan(*args)
+            elif name == "complete":
+                # Show completion message unless suppressed
+                if not self.preferences["suppress_completion_message"]:
+                    self.show_completion_message(*args)
+        
+        self.root.after(UI_REFRESH_MS, self.poll_events)
+    
+    def update_progress(self, finished, total):
+        """Report progress from finished files and running videos; redrawn on the next frame"""
+        # list() takes a snapshot, as video threads may be updating the dict
+        progress = (finished + sum(list(self.video_progress.values()))) / total * 100
+        self.events.set("progress", progress)
+    
+    def update_video_progress(self, file, fraction, finished, total):
+        """Record how far a running video job has got and update the bar"""
+        self.video_progress[file] = fraction
+        self.update_progress(finished, total)
     
-    def strip_image_metadata(self, file_path, output_dir):
-        try:
-            # Get the output file path with safety check
-            output_path = self.get_safe_output_path(file_path, output_dir)
-            
-            # Process based on file type
-            ext = os.path.splitext(file_path.lower())[1]
-            
-            if ext in ('.jpg', '.jpeg'):
-                # Remove EXIF data using piexif
-                try:
-                    # Create a copy first, don't modify the original
-                    img = Image.open(file_path)
-                    # Try to use piexif on the memory image 
-                    piexif_data = piexif.load(img.info.get("exif", b""))
-                    # Just create empty exif data
-                    exif_bytes = piexif.dump({})
-                    img.save(output_path, exif=exif_bytes)
-                except:
-                    # Fallback to PIL if piexif fails
-                    img = Image.open(file_path)
-                    data = list(img.getdata())
-                    image_without_exif = Image.new(img.mode, img.size)
-                    image_without_exif.putdata(data)
-                    image_without_exif.save(output_path)
-            else:
-                # For PNG, GIF, etc.
-                img = Image.open(file_path)
-                data = list(img.getdata())
-                image_without_meta = Image.new(img.mode, img.size)
-                image_without_meta.putdata(data)
-                image_without_meta.save(output_path)
-                
-        except Exception as e:
-            raise Exception(f"Failed to process image: {str(e)}")
-    
-    def strip_video_metadata(self, file_path, output_dir):
-        try:
-            # Get the output file path with safety check
-            output_path = self.get_safe_output_path(file_path, output_dir)
-            
-            # Check if FFmpeg is available
-            try:
-                # Try to run a simple FFmpeg command to check if it's available
-                subprocess.run(
-                    ['ffmpeg', '-version'],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    check=True
-                )
-            except (subprocess.SubprocessError, FileNotFoundError):
-                messagebox.showerror(
-                    "FFmpeg Not Found", 
-                    "FFmpeg is required for video processing but was not found. "
-                    "Please install FFmpeg and make sure it's in your system PATH."
-                )
-                raise Exception("FFmpeg not found")
-            
-            # Use FFmpeg to strip metadata with more robust options
-            command = [
-                'ffmpeg',
-                '-i', file_path,
-                '-map_metadata', '-1',       # Remove all metadata
-                '-map', '0',                 # Map all streams from input to output
-                '-c', 'copy',                # Copy all streams without re-encoding
-                '-movflags', 'faststart',    # Optimize for web playback
-                '-y',                        # Overwrite output files without asking
-                output_path
-            ]
-            
-            # Run FFmpeg process with timeout
-            try:
-                result = subprocess.run(
-                    command,
-                    stderr=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    text=True,
-                    timeout=300  # 5 minute timeout for very large files
-                )
-                
-                if result.returncode != 0:
-                    error_msg = result.stderr
-                    # Make the error message more user-friendly
-                    if "No such file or directory" in error_msg:
-                        error_msg = "FFmpeg could not find the input file."
-                    elif "Invalid data found when processing input" in error_msg:
-                        error_msg = "The video file appears to be corrupt or in an unsupported format."
-                    raise Exception(f"FFmpeg error: {error_msg}")
-                    
-            except subprocess.TimeoutExpired:
-                raise Exception("Video processing timed out. The file may be too large.")
-                
-        except Exception as e:
-            # If something goes wrong, try a simpler approach for some common formats
-            if os.path.splitext(file_path.lower())[1] in ('.mp4', '.mov'):
-                try:
-                    self.status_var.set(f"Trying alternative method for {os.path.basename(file_path)}...")
-                    # Alternative command for MP4/MOV files
-                    alt_command = [
-                        'ffmpeg',
-                        '-i', file_path,
-                        '-map_metadata', '-1',
-                        '-c:v', 'copy',
-                        '-c:a', 'copy',
-                        '-f', 'mp4',
-                        '-y',
-                        output_path
-                    ]
-                    subprocess.run(
-                        alt_command,
-                        stderr=subprocess.PIPE,
-                        stdout=subprocess.PIPE,
-                        check=True,
-                        timeout=300
-                    )
-                    return  # If alternative method succeeds, return
-                except:
-                    # If alternative also fails, continue with raising the original error
-                    pass
-                
-            raise Exception(f"Failed to process video: {str(e)}")
-
     def check_ffmpeg(self):
-        """Check if FFmpeg is available on the system"""
+        """Probe FFmpeg's capabilities, using the on-disk cache when it is current"""
         try:
-            # Try to run a simple FFmpeg command
-            subprocess.run(
-                ['ffmpeg', '-version'],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                check=False
-            )
-            return True
-        except (subprocess.SubprocessError, FileNotFoundError):
+            cache_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ffmpeg_capabilities.json')
+            self.ffmpeg_info = probe_ffmpeg(cache_file)
+        finally:
+            self.ffmpeg_probed.set()
+
+    def poll_ffmpeg_probe(self):
+        """Warn on the UI thread if the background probe found no usable FFmpeg"""
+        if not self.ffmpeg_probed.is_set():
+            self.root.after(100, self.poll_ffmpeg_probe)
+            return
+        
+        if self.ffmpeg_info is None:
             # Show a warning message
             messagebox.showwarning(
                 "FFmpeg Not Found", 
                 "FFmpeg is required for video processing but was not found. "
-                "You can still process images, but video files will be skipped. "
+                "You can still process images, MP4 and MOV files, but other video files will be skipped. "
                 "To process videos, please install FFmpeg and make sure it's in your system PATH."
             )
-            return False
 
-    def show_completion_message(self, status_msg, processed, skipped, total):
+    def show_completion_message(self, status_msg, processed, skipped, total, timing=""):
         """Show completion message with option to not show again"""
         dialog = tk.Toplevel(self.root)
         dialog.title("Processing Complete")
@@ -873,7 +1271,7 @@ class MetadataStripperApp:
         dialog.resizable(False, False)
         
         # Center the dialog
-        dialog.geometry("400x200")
+        dialog.geometry("400x260" if timing else "400x200")
         dialog.update_idletasks()
         x = (dialog.winfo_screenwidth() // 2) - (dialog.winfo_width() // 2)
         y = (dialog.winfo_screenheight() // 2) - (dialog.winfo_height() // 2)
@@ -893,6 +1291,11 @@ class MetadataStripperApp:
         output_label = ttk.Label(frame, text=output_info, wraplength=350, justify="center")
         output_label.pack(pady=(0, 20))
         
+        # Where the time went, from the batch metrics
+        if timing:
+            timing_label = ttk.Label(frame, text=timing, wraplength=350, justify="center")
+            timing_label.pack(pady=(0, 20))
+        
         # "Don't show again" checkbox
         dont_show_var = tk.BooleanVar(value=False)
         dont_show_check = ttk.Checkbutton(
@@ -925,7 +1328,25 @@ class MetadataStripperApp:
         dialog.wait_window()
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    """Run the command line when given arguments, otherwise the GUI"""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        from stripper.cli import main as cli_main
+        return cli_main(argv)
+    
+    load_tk()
     root = tk.Tk()
     app = MetadataStripperApp(root)
-    root.mainloop() 
\ No newline at end of file
+    root.mainloop()
+    # Commit any history entries still queued
+    app.history_store.close()
+    if app.journal is not None:
+        app.journal.close()
+    if app.result_cache is not None:
+        app.result_cache.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,11 @@
+"""Format-level metadata strippers used by the Metadata Stripper app.
+
+Nothing in this package imports tkinter, so the engines can be used from
+scripts and background workers as well as from the GUI.
+"""
+
+from .jpeg import strip_jpeg, DEFAULT_JPEG_DROP
+from .png import strip_png, DEFAULT_PNG_DROP
+from .mp4 import strip_mp4, MP4_EXTENSIONS
+from .images import strip_image, IMAGE_EXTENSIONS
+from .video import strip_video, VIDEO_EXTENSIONS
@@ -0,0 +1,210 @@
+"""Process-pool batch engine for image stripping.
+
+Workers only receive (source path, output path) pairs and send back a small
+result dict, so no pixel data ever crosses a process boundary. Output paths
+must be planned by the caller before submitting, which keeps naming
+deterministic no matter in which order the workers finish. How many jobs
+run at once is bounded by the worker count and by a memory budget, checked
+against estimates taken from the image headers before anything is decoded.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .images import MEMORY_LIMIT, estimate_memory, strip_image
+from .metrics import Spans, file_sizes, make_result
+from .prescan import CLEAN_STATUS
+
+
+def default_worker_count():
+    """Number of image workers to use when none is configured"""
+    return os.cpu_count() or 1
+
+
+def default_memory_budget():
+    """Memory (bytes) concurrent image jobs may use when none is configured: half the RAM"""
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 2
+    except (AttributeError, ValueError, OSError):
+        # No sysconf (Windows) - assume a modest machine
+        return 2 * 1024 * 1024 * 1024
+
+
+def run_image_job(file_path, output_path, link_clean=False, memory_limit=MEMORY_LIMIT):
+    """Strip one image and describe the outcome; never raises"""
+    start = time.perf_counter()
+    spans = Spans()
+    try:
+        strip_image(file_path, output_path, spans, link_clean, memory_limit)
+        status = CLEAN_STATUS if spans.handler == "clean" else "Success"
+        error = None
+    except Exception as e:
+        status, error = "Error", f"Failed to process image: {str(e)}"
+    bytes_in, bytes_out = file_sizes(file_path, output_path if error is None else None)
+    return make_result(file_path, output_path, status, error, time.perf_counter() - start,
+                       spans.handler, spans.stages, bytes_in, bytes_out)
+
+
+def worker_failed(file_path, output_path, error):
+    """Result for a job whose worker process died, or that never got one"""
+    return make_result(file_path, output_path, "Error", f"Worker failed: {str(error)}")
+
+
+class ImageBatchRunner:
+    """Runs image jobs on a pool of worker processes.
+
+    Use as a context manager: submit() every job, then iterate results(),
+    which yields result dicts in completion order. With a single worker (or
+    a single job) the jobs run in the calling thread instead, which avoids
+    the cost of starting a pool. With link_clean, images that have no
+    metadata are hard-linked rather than copied. memory_limit caps what
+    each re-encode may use (see stripper.images.strip_image).
+
+    Jobs are admitted to the pool only while their estimated memory
+    (stripper.images.estimate_memory, from the file headers) fits in
+    memory_budget alongside the jobs already running. Jobs that don't fit
+    yet wait while smaller ones behind them go ahead; a job larger than the
+    whole budget runs on its own.
+
+    results() may run on another thread than submit() and shutdown(); the
+    job bookkeeping is shared under self.lock. If a worker dies the pool
+    breaks, and every job it had not finished is reported as an Error.
+    """
+
+    def __init__(self, workers=None, link_clean=False, memory_limit=MEMORY_LIMIT, memory_budget=None):
+        self.workers = workers or default_worker_count()
+        self.link_clean = link_clean
+        self.memory_limit = memory_limit
+        self.memory_budget = memory_budget or default_memory_budget()
+        self.jobs = []
+        self.waiting = []  # (file path, output path, estimated memory) not yet admitted
+        self.futures = {}  # Admitted jobs by future
+        self.in_use = 0  # Estimated memory of the admitted jobs
+        self.failed = []  # Results for jobs the broken pool could not take
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    def submit(self, file_path, output_path):
+        """Queue an image for stripping"""
+        self.jobs.append((file_path, output_path))
+        if self.workers < 2 or len(self.jobs) < 2:
+            return
+
+        if self.executor is None:
+            # Spawn rather than fork: the parent runs Tk and other threads
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            # The first job was held back in case it was the only one
+            first_job = self.jobs[0] + (estimate_memory(self.jobs[0][0], self.memory_limit),)
+            with self.lock:
+                self.waiting.append(first_job)
+        job = (file_path, output_path, estimate_memory(file_path, self.memory_limit))
+        with self.lock:
+            self.waiting.append(job)
+            self.admit()
+
+    def admit(self):
+        """Start waiting jobs, in order, while they fit in the memory budget.
+
+        Call with self.lock held.
+        """
+        if self.executor is None:
+            # Shut down
+            return
+        still_waiting = []
+        for index, job in enumerate(self.waiting):
+            if self.in_use + job[2] <= self.memory_budget or not self.futures:
+                try:
+                    future = self.executor.submit(run_image_job, job[0], job[1], self.link_clean,
+                                                  self.memory_limit)
+                except BrokenProcessPool as e:
+                    # A worker died; nothing more can run, so report the rest instead of losing them
+                    unstarted = still_waiting + self.waiting[index:]
+                    self.failed += [worker_failed(failed[0], failed[1], e) for failed in unstarted]
+                    self.waiting = []
+                    return
+                self.futures[future] = job
+                self.in_use += job[2]
+            else:
+                still_waiting.append(job)
+        self.waiting = still_waiting
+
+    def results(self):
+        """Yield result dicts as the jobs finish"""
+        if self.executor is None:
+            for file_path, output_path in self.jobs:
+                yield run_image_job(file_path, output_path, self.link_clean, self.memory_limit)
+            return
+
+        while True:
+            with self.lock:
+                failed, self.failed = self.failed, []
+                pending = list(self.futures)
+            yield from failed
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                with self.lock:
+                    job = self.futures.pop(future, None)
+                    if job is None:
+                        # Cancelled by shutdown()
+                        continue
+                    self.in_use -= job[2]
+                    # Freed memory lets waiting jobs in
+                    self.admit()
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself died (e.g. killed by the OOM killer)
+                    result = worker_failed(job[0], job[1], e)
+                yield result
+
+    def shutdown(self):
+        """Stop the worker processes, cancelling jobs that haven't started"""
+        with self.lock:
+            executor, self.executor = self.executor, None
+            futures, self.futures = list(self.futures), {}
+            self.waiting = []
+            self.failed = []
+        if executor is not None:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+
+def merge_results(*sources):
+    """Yield items from several result iterators in the order they arrive"""
+    arrivals = queue.Queue()
+    finished = object()
+
+    def drain(source):
+        try:
+            for item in source:
+                arrivals.put(item)
+        finally:
+            arrivals.put(finished)
+
+    for source in sources:
+        threading.Thread(target=drain, args=(source,), daemon=True).start()
+
+    remaining = len(sources)
+    while remaining:
+        item = arrivals.get()
+        if item is finished:
+            remaining -= 1
+        else:
+            yield item
@@ -0,0 +1,368 @@
+"""Benchmark harness with a deterministic synthetic corpus.
+
+Usage: python -m stripper.bench [--quick] [--out results.json] [--compare old.json]
+
+The corpus (JPEGs with large EXIF/XMP segments, PNGs with text chunks, big
+TIFFs, FFmpeg-generated MP4/MKV clips when FFmpeg is available, and a deep
+folder tree for the scanner) is generated from a fixed seed, so two runs on
+different commits measure the same input. Every case runs in a fresh
+process, which makes its peak RSS meaningful. Results are written as JSON
+and can be compared with an earlier run.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is reported as None there
+    resource = None
+
+# Bump when the corpus changes, so a stale one is regenerated
+CORPUS_VERSION = 1
+
+# Corpus sizes for a full run and for --quick
+FULL = {
+    "jpeg": 500, "jpeg_size": (1600, 1200),
+    "png": 200, "png_size": (800, 600),
+    "tiff": 2, "tiff_size": (6000, 4000),
+    "video": 2, "video_seconds": 10,
+    "tree_entries": 100000, "tree_fanout": 10,
+    "batch_sizes": [1, 10, 100, 500],
+}
+QUICK = {
+    "jpeg": 50, "jpeg_size": (640, 480),
+    "png": 20, "png_size": (320, 240),
+    "tiff": 1, "tiff_size": (1500, 1000),
+    "video": 1, "video_seconds": 2,
+    "tree_entries": 10000, "tree_fanout": 10,
+    "batch_sizes": [1, 10, 50],
+}
+
+
+# Corpus generation
+
+def _random_bytes(rng, count):
+    """count bytes from a seeded generator"""
+    return rng.getrandbits(count * 8).to_bytes(count, "little") if count else b""
+
+
+def _noise_image(rng, size):
+    """A deterministic RGB image that doesn't compress to nothing"""
+    from PIL import Image
+    width, height = size
+    # Low-resolution noise scaled up, so JPEG sizes look like photos rather than static
+    small_size = (max(1, width // 8), max(1, height // 8))
+    small = Image.frombytes("RGB", small_size, _random_bytes(rng, small_size[0] * small_size[1] * 3))
+    return small.resize(size)
+
+
+def _segment(marker, payload):
+    """A JPEG marker segment"""
+    return bytes((0xFF, marker)) + struct.pack(">H", len(payload) + 2) + payload
+
+
+def _make_jpeg(path, rng, size):
+    """A JPEG with a ~60 KB EXIF segment, an XMP packet and a comment"""
+    import io
+    buffer = io.BytesIO()
+    _noise_image(rng, size).save(buffer, "JPEG", quality=90)
+    data = buffer.getvalue()
+    # Little-endian TIFF header with an empty IFD, padded out like a maker note
+    exif = b"Exif\x00\x00II*\x00\x08\x00\x00\x00\x00\x00" + _random_bytes(rng, 60000)
+    xmp = (b"http://ns.adobe.com/xap/1.0/\x00<x:xmpmeta xmlns:x='adobe:ns:meta/'>"
+           + b"<rdf:Description>" + b"x" * 16000 + b"</rdf:Description></x:xmpmeta>")
+    metadata = _segment(0xE1, exif) + _segment(0xE1, xmp) + _segment(0xFE, b"benchmark comment")
+    with open(path, 'wb') as f:
+        # Right after SOI, where cameras put them
+        f.write(data[:2] + metadata + data[2:])
+
+
+def _make_png(path, rng, size):
+    """A PNG with a handful of text chunks and a timestamp"""
+    from PIL import PngImagePlugin
+    info = PngImagePlugin.PngInfo()
+    for index in range(20):
+        info.add_text(f"Comment{index}", "benchmark " * 50)
+    info.add_text("XML:com.adobe.xmp", "<x:xmpmeta>" + "y" * 4000 + "</x:xmpmeta>", zip=True)
+    image = _noise_image(rng, size)
+    image.save(path, "PNG", pnginfo=info)
+
+
+def _make_tiff(path, rng, size):
+    """A large uncompressed TIFF with descriptive tags"""
+    from PIL import TiffImagePlugin
+    tags = TiffImagePlugin.ImageFileDirectory_v2()
+    tags[270] = "benchmark image description"  # ImageDescription
+    tags[305] = "benchmark software"  # Software
+    _noise_image(rng, size).save(path, "TIFF", tiffinfo=tags)
+
+
+def _make_video(path, ffmpeg, seconds):
+    """A short test-pattern clip with title and creation time tags"""
+    subprocess.run(
+        [ffmpeg, '-y', '-hide_banner', '-loglevel', 'error',
+         '-f', 'lavfi', '-i', f'testsrc=duration={seconds}:size=640x480:rate=25',
+         '-metadata', 'title=Benchmark', '-metadata', 'creation_time=2020-01-01T00:00:00Z',
+         '-c:v', 'mpeg4', path],
+        stdin=subprocess.DEVNULL, check=True
+    )
+
+
+def _make_tree(root, entries, fanout):
+    """A folder tree with entries files spread over nested directories"""
+    directories = [root]
+    made = 0
+    # Breadth-first: each directory gets fanout subdirectories until there are enough
+    while len(directories) * fanout < entries // fanout:
+        directory = directories.pop(0)
+        for index in range(fanout):
+            directories.append(os.path.join(directory, f"d{index}"))
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+    while made < entries:
+        for directory in directories:
+            if made >= entries:
+                break
+            name = f"f{made}.jpg" if made % 3 else f"f{made}.txt"
+            open(os.path.join(directory, name), 'wb').close()
+            made += 1
+
+
+def build_corpus(corpus_dir, sizes, seed=0):
+    """Generate the corpus into corpus_dir unless an identical one is already there"""
+    from .ffmpeg import probe_ffmpeg
+
+    ffmpeg_info = probe_ffmpeg()
+    settings = {"version": CORPUS_VERSION, "seed": seed, "sizes": sizes, "ffmpeg": ffmpeg_info is not None}
+    # Round-tripped so it compares equal to the manifest read back from JSON
+    settings = json.loads(json.dumps(settings))
+    manifest_path = os.path.join(corpus_dir, "manifest.json")
+    try:
+        with open(manifest_path, 'r') as f:
+            if json.load(f) == settings:
+                return
+    except (OSError, ValueError):
+        pass
+
+    shutil.rmtree(corpus_dir, ignore_errors=True)
+    rng = random.Random(seed)
+    for kind in ("jpeg", "png", "tiff", "video"):
+        os.makedirs(os.path.join(corpus_dir, kind))
+    for index in range(sizes["jpeg"]):
+        _make_jpeg(os.path.join(corpus_dir, "jpeg", f"img{index:05d}.jpg"), rng, tuple(sizes["jpeg_size"]))
+    for index in range(sizes["png"]):
+        _make_png(os.path.join(corpus_dir, "png", f"img{index:05d}.png"), rng, tuple(sizes["png_size"]))
+    for index in range(sizes["tiff"]):
+        _make_tiff(os.path.join(corpus_dir, "tiff", f"img{index:05d}.tiff"), rng, tuple(sizes["tiff_size"]))
+    if ffmpeg_info is not None:
+        for index in range(sizes["video"]):
+            for extension in (".mp4", ".mkv"):
+                _make_video(os.path.join(corpus_dir, "video", f"clip{index:03d}{extension}"),
+                            ffmpeg_info["path"], sizes["video_seconds"])
+    _make_tree(os.path.join(corpus_dir, "tree"), sizes["tree_entries"], sizes["tree_fanout"])
+
+    with open(manifest_path, 'w') as f:
+        json.dump(settings, f)
+
+
+def _corpus_files(corpus_dir, kind):
+    """Sorted paths of one kind of corpus file"""
+    directory = os.path.join(corpus_dir, kind)
+    try:
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory))]
+    except OSError:
+        return []
+
+
+# Measurement
+
+def _percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process and its finished children, in MB"""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _summarize(case, files, total_bytes, elapsed, durations):
+    """Build the result record for one case"""
+    return dict(
+        case,
+        files=files,
+        bytes=total_bytes,
+        elapsed=round(elapsed, 4),
+        files_per_s=round(files / elapsed, 2) if elapsed else None,
+        mb_per_s=round(total_bytes / elapsed / 1e6, 2) if elapsed else None,
+        p50_ms=round(_percentile(durations, 0.5) * 1000, 3) if durations else None,
+        p99_ms=round(_percentile(durations, 0.99) * 1000, 3) if durations else None,
+        peak_rss_mb=_peak_rss_mb(),
+    )
+
+
+def run_case(case):
+    """Run one benchmark case in this process and return its result record"""
+    corpus_dir = case["corpus"]
+    with tempfile.TemporaryDirectory() as output_dir:
+        if case["kind"] == "scan":
+            from .core import MEDIA_EXTENSIONS
+            from .scan import FolderScanner
+            start = time.perf_counter()
+            found = sum(1 for _ in FolderScanner(MEDIA_EXTENSIONS).scan(os.path.join(corpus_dir, "tree")))
+            elapsed = time.perf_counter() - start
+            return _summarize(case, found, 0, elapsed, [])
+
+        files = []
+        for kind in case["inputs"]:
+            files += _corpus_files(corpus_dir, kind)
+        if case.get("batch_size"):
+            files = files[:case["batch_size"]]
+        total_bytes = sum(os.path.getsize(file) for file in files)
+
+        if case["kind"] == "handler":
+            from .core import copy_file
+            from .images import strip_image
+            from .video import strip_video
+            handler = {
+                "image": strip_image,
+                "video": strip_video,
+                "copy": lambda src, dst: copy_file(src, dst),
+            }[case["handler"]]
+            durations = []
+            start = time.perf_counter()
+            for index, file in enumerate(files):
+                file_start = time.perf_counter()
+                handler(file, os.path.join(output_dir, f"{index}_{os.path.basename(file)}"))
+                durations.append(time.perf_counter() - file_start)
+            return _summarize(case, len(files), total_bytes, time.perf_counter() - start, durations)
+
+        # A whole batch through the engine, as the GUI and CLI run it
+        from .core import process_batch
+        from .ffmpeg import probe_ffmpeg
+        start = time.perf_counter()
+        results = list(process_batch(files, output_dir, ffmpeg_info=probe_ffmpeg()))
+        elapsed = time.perf_counter() - start
+        durations = [result["duration"] for result in results if result["duration"] is not None]
+        return _summarize(case, len(files), total_bytes, elapsed, durations)
+
+
+def plan_cases(corpus_dir, sizes):
+    """List the cases to run for the generated corpus"""
+    cases = [
+        {"name": "jpeg", "kind": "handler", "handler": "image", "inputs": ["jpeg"]},
+        {"name": "png", "kind": "handler", "handler": "image", "inputs": ["png"]},
+        {"name": "tiff", "kind": "handler", "handler": "image", "inputs": ["tiff"]},
+        {"name": "copy", "kind": "handler", "handler": "copy", "inputs": ["tiff"]},
+    ]
+    if _corpus_files(corpus_dir, "video"):
+        cases.append({"name": "video", "kind": "handler", "handler": "video", "inputs": ["video"]})
+    for batch_size in sizes["batch_sizes"]:
+        cases.append({"name": f"batch_{batch_size}", "kind": "batch", "inputs": ["jpeg", "png"],
+                      "batch_size": batch_size})
+    cases.append({"name": "scan", "kind": "scan"})
+    for case in cases:
+        case["corpus"] = corpus_dir
+    return cases
+
+
+def _git_commit():
+    """Current commit of the source tree, if it is a git checkout"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True
+        ).stdout.strip()
+    except (subprocess.SubprocessError, OSError):
+        return None
+
+
+def compare(old, new):
+    """Print throughput and latency changes between two result files"""
+    previous = {result["name"]: result for result in old["results"]}
+    print(f"{'case':<14}{'files/s':>12}{'change':>10}{'p99 ms':>12}{'change':>10}")
+    for result in new["results"]:
+        before = previous.get(result["name"])
+        changes = []
+        for key in ("files_per_s", "p99_ms"):
+            if before and before.get(key) and result.get(key):
+                changes.append(f"{(result[key] / before[key] - 1) * 100:+.1f}%")
+            else:
+                changes.append("-")
+        print(f"{result['name']:<14}{result['files_per_s'] or 0:>12.1f}{changes[0]:>10}"
+              f"{result['p99_ms'] or 0:>12.2f}{changes[1]:>10}")
+
+
+def main(argv=None):
+    """Build the corpus, run every case and save the results"""
+    parser = argparse.ArgumentParser(prog="python -m stripper.bench", description=__doc__.split("\n")[0])
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), "metadata_stripper_bench"),
+                        metavar="DIR", help="where to generate (and reuse) the corpus")
+    parser.add_argument("--out", default="bench_results.json", metavar="FILE", help="JSON file to write results to")
+    parser.add_argument("--quick", action="store_true", help="use a small corpus for a fast smoke run")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the generated corpus")
+    parser.add_argument("--only", action="append", default=[], metavar="CASE", help="run only the named case (repeatable)")
+    parser.add_argument("--compare", metavar="FILE", help="earlier results to compare against")
+    args = parser.parse_args(argv)
+
+    sizes = QUICK if args.quick else FULL
+    print(f"Preparing corpus in {args.corpus}", file=sys.stderr)
+    build_corpus(args.corpus, sizes, args.seed)
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for case in plan_cases(args.corpus, sizes):
+        if args.only and case["name"] not in args.only:
+            continue
+        print(f"Running {case['name']}", file=sys.stderr)
+        # A fresh process per case, so peak RSS belongs to that case alone
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(run_case, case).result()
+        result.pop("corpus")
+        results.append(result)
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "quick": args.quick,
+        "seed": args.seed,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(json.load(f), report)
+    else:
+        compare({"results": []}, report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
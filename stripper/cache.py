@@ -0,0 +1,135 @@
+"""Persistent cache of finished results, used to skip unchanged inputs.
+
+Each entry maps a source file's identity (device, inode, size, mtime and,
+optionally, a hash of its first and last blocks) plus the strip settings to
+the output that was produced. A file is only skipped while that output
+still exists with the size and mtime recorded for it, so deleting or
+touching an output makes the next run redo it. The cache is an SQLite
+table trimmed to a maximum number of entries, least recently used first.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+
+# Bump when stripping output changes, so old entries stop matching
+CACHE_FORMAT = 1
+
+# Bytes hashed at each end of a file for the optional content check
+HASH_BLOCK_SIZE = 64 * 1024
+
+# Pending writes are committed once this many have accumulated
+COMMIT_EVERY = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    output_file TEXT NOT NULL,
+    output_size INTEGER NOT NULL,
+    output_mtime_ns INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+"""
+
+
+def fast_hash(path, size):
+    """Hash a file's size with its first and last blocks"""
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(HASH_BLOCK_SIZE))
+        if size > 2 * HASH_BLOCK_SIZE:
+            f.seek(-HASH_BLOCK_SIZE, os.SEEK_END)
+            digest.update(f.read(HASH_BLOCK_SIZE))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Manifest of source identities and the clean outputs made from them.
+
+    settings is any string describing what affects the output (e.g. the
+    output directory and strip options); entries only match under the same
+    settings.
+    """
+
+    def __init__(self, path, max_entries=100000, verify_content=False):
+        self.max_entries = max_entries
+        self.verify_content = verify_content
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.uncommitted = 0
+
+    def source_key(self, file_path, settings):
+        """Identity of file_path under settings, or None if it can't be read"""
+        try:
+            stat = os.stat(file_path)
+            parts = [CACHE_FORMAT, settings, stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns]
+            if self.verify_content:
+                parts.append(fast_hash(file_path, stat.st_size))
+        except OSError:
+            return None
+        return "|".join(str(part) for part in parts)
+
+    def lookup(self, key):
+        """Return the recorded output for key if it is still in place, else None"""
+        if key is None:
+            return None
+        row = self.connection.execute(
+            "SELECT output_file, output_size, output_mtime_ns FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        output_file, output_size, output_mtime_ns = row
+        try:
+            stat = os.stat(output_file)
+            valid = stat.st_size == output_size and stat.st_mtime_ns == output_mtime_ns
+        except OSError:
+            valid = False
+
+        if valid:
+            self.connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        else:
+            # The output was removed or changed since; forget it
+            self.connection.execute("DELETE FROM results WHERE key = ?", (key,))
+        self._written()
+        return output_file if valid else None
+
+    def record(self, key, output_file):
+        """Remember that the source identified by key was cleaned into output_file"""
+        if key is None:
+            return
+        try:
+            stat = os.stat(output_file)
+        except OSError:
+            return
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results (key, output_file, output_size, output_mtime_ns, last_used) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, output_file, stat.st_size, stat.st_mtime_ns, time.time())
+        )
+        self._written()
+
+    def _written(self):
+        """Commit once enough changes have piled up"""
+        self.uncommitted += 1
+        if self.uncommitted >= COMMIT_EVERY:
+            self.connection.commit()
+            self.uncommitted = 0
+
+    def evict(self):
+        """Trim the cache to max_entries, dropping the least recently used first"""
+        self.connection.execute(
+            "DELETE FROM results WHERE key IN "
+            "(SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        self.connection.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        """Commit outstanding changes and close the database"""
+        self.evict()
+        self.connection.close()
@@ -0,0 +1,286 @@
+"""Headless command-line interface.
+
+Usage: python -m meta_data_strip --out DIR PATHS...
+       python -m meta_data_strip --out DIR --dry-run PATHS...
+       python -m meta_data_strip --resume
+       python -m meta_data_strip --watch --out DIR FOLDERS...
+
+Each processed file is reported as one JSON object per line on stdout,
+followed by a summary line, so the output can be piped into other tools.
+Nothing heavier than argparse is imported until the arguments are parsed.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+
+def build_parser():
+    """Create the argument parser for the command line"""
+    parser = argparse.ArgumentParser(
+        prog="python -m meta_data_strip",
+        description="Strip metadata from images and videos. Prints one JSON object per file."
+    )
+    parser.add_argument("paths", nargs="*", help="files or folders to process (folders are searched recursively)")
+    parser.add_argument("--out", metavar="DIR", help="directory to write cleaned files to")
+    parser.add_argument("--resume", action="store_true",
+                        help="finish the most recent batch that was interrupted, instead of starting a new one")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="allow replacing originals when they are in the output directory")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print where each file would be written, without processing anything")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and strip new files as they arrive in the given folders (Ctrl+C to stop)")
+    parser.add_argument("--settle", type=float, default=None, metavar="SECONDS",
+                        help="with --watch, how long a new file must stay unchanged before it is processed (default: 1)")
+    parser.add_argument("--poll", action="store_true",
+                        help="with --watch, rescan the folders periodically instead of using inotify")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="skip files and folders matching GLOB while scanning folders (repeatable)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="process every file, even if its clean copy from an earlier run is still in place")
+    parser.add_argument("--verify-content", action="store_true",
+                        help="also compare file contents (first and last blocks) when checking the cache")
+    parser.add_argument("--link-clean", action="store_true",
+                        help="hard-link files that have no metadata into the output directory instead of copying them")
+    parser.add_argument("--memory-limit", type=int, default=None, metavar="MB",
+                        help="most memory one image re-encode may use; larger images are re-encoded in bands "
+                             "or skipped (default: 256)")
+    parser.add_argument("--memory-budget", type=int, default=None, metavar="MB",
+                        help="estimated memory all running image jobs may use together; larger images wait "
+                             "for room (default: half the RAM)")
+    parser.add_argument("--fsync", action="store_true",
+                        help="flush cleaned files to disk as the batch runs (in groups, to keep it fast)")
+    parser.add_argument("--metrics-jsonl", metavar="FILE",
+                        help="append per-file stage timings and a batch summary to FILE as JSON lines")
+    parser.add_argument("--metrics-textfile", metavar="FILE",
+                        help="write batch metrics to FILE in Prometheus textfile format (e.g. for node_exporter)")
+    parser.add_argument("--image-workers", type=int, default=None, metavar="N",
+                        help="image worker processes (default: one per CPU core)")
+    parser.add_argument("--video-workers", type=int, default=4, metavar="N",
+                        help="FFmpeg jobs to run at the same time (default: 4)")
+    return parser
+
+
+def emit(record, stream=None):
+    """Write one JSON line and flush so consumers see it immediately"""
+    stream = stream or sys.stdout
+    stream.write(json.dumps(record) + "\n")
+    stream.flush()
+
+
+def memory_limit(args):
+    """The per-image memory limit in bytes from --memory-limit"""
+    from .images import MEMORY_LIMIT
+
+    return MEMORY_LIMIT if args.memory_limit is None else args.memory_limit * 1024 * 1024
+
+
+def main(argv=None):
+    """Run a batch from the command line and return the exit code"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.resume and args.dry_run:
+        parser.error("--dry-run can't be combined with --resume")
+    if args.watch and (args.resume or args.dry_run):
+        parser.error("--watch can't be combined with --resume or --dry-run")
+    if args.watch and not all(os.path.isdir(path) for path in args.paths):
+        parser.error("--watch only takes folders")
+    if args.resume and (args.paths or args.out):
+        parser.error("--resume takes the files and output directory from the interrupted batch")
+    if not args.resume and not (args.paths and args.out):
+        parser.error("PATHS and --out are required unless --resume is given")
+
+    # Absolute paths, so an input and the output directory are recognised as the same folder however typed
+    args.paths = [os.path.abspath(path) for path in args.paths]
+    if args.out:
+        args.out = os.path.abspath(args.out)
+    if args.watch:
+        from .watch import same_folder
+        if any(same_folder(path, args.out) for path in args.paths):
+            parser.error("--out can't be one of the watched folders")
+
+    from .core import DATA_DIR, MEDIA_EXTENSIONS, plan_output_paths
+    from .journal import BatchJournal
+    from .scan import FolderScanner, path_key
+
+    if args.watch:
+        return watch(args)
+
+    if args.resume:
+        journal = BatchJournal(os.path.join(DATA_DIR, 'batch_journal.db'))
+        interrupted = journal.interrupted()
+        if not interrupted:
+            emit({"event": "error", "error": "No interrupted batch to resume"})
+            journal.close()
+            return 1
+        batch = interrupted[0]
+        batch_id = batch["id"]
+        args.out = batch["output_dir"]
+        args.overwrite = batch["allow_overwrite"]
+        files, output_paths = journal.resume(batch_id)
+        emit({"event": "resume", "output_dir": args.out, "total": batch["total"], "remaining": len(files)})
+        return run(args, files, output_paths, journal, batch_id)
+
+    files = []
+    seen = set()
+    scanner = FolderScanner(MEDIA_EXTENSIONS, args.exclude)
+    for path in args.paths:
+        if os.path.isdir(path):
+            found = scanner.scan(path)
+        elif os.path.isfile(path):
+            found = [(path, path_key(path))]
+        else:
+            emit({"event": "error", "source_file": path, "error": "No such file or directory"})
+            continue
+        for file, key in found:
+            if key not in seen:
+                seen.add(key)
+                files.append(file)
+
+    output_paths = plan_output_paths(files, args.out, args.overwrite)
+    if args.dry_run:
+        return preview(files, output_paths)
+
+    journal = BatchJournal(os.path.join(DATA_DIR, 'batch_journal.db'))
+    batch_id = journal.begin(args.out, args.overwrite, output_paths)
+    return run(args, files, output_paths, journal, batch_id)
+
+
+def watch(args):
+    """Strip files arriving in the watched folders until interrupted"""
+    import signal
+
+    from .cache import ResultCache
+    from .core import DATA_DIR
+    from .ffmpeg import probe_ffmpeg
+    from .journal import BatchJournal
+    from .watch import SETTLE_SECONDS, WatchDaemon
+
+    cache = None
+    if not args.no_cache:
+        cache = ResultCache(os.path.join(DATA_DIR, 'result_cache.db'), verify_content=args.verify_content)
+    journal = BatchJournal(os.path.join(DATA_DIR, 'batch_journal.db'))
+    daemon = WatchDaemon(
+        args.paths,
+        args.out,
+        allow_overwrite=args.overwrite,
+        exclude=args.exclude,
+        settle=SETTLE_SECONDS if args.settle is None else args.settle,
+        use_inotify=not args.poll,
+        image_workers=args.image_workers,
+        video_workers=args.video_workers,
+        ffmpeg_info=probe_ffmpeg(os.path.join(DATA_DIR, 'ffmpeg_capabilities.json')),
+        cache=cache,
+        journal=journal,
+        link_clean=args.link_clean,
+        memory_limit=memory_limit(args),
+        memory_budget=args.memory_budget and args.memory_budget * 1024 * 1024
+    )
+
+    def on_signal(signum, frame):
+        # Finish what is queued; a second signal stops at once
+        signal.signal(signum, signal.SIG_DFL)
+        emit({"event": "stopping"})
+        daemon.stop()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    counts = {"processed": 0, "skipped": 0}
+
+    def on_result(result):
+        counts["processed" if result["error"] is None else "skipped"] += 1
+        emit(dict(result, event="file"))
+
+    emit({"event": "watch", "folders": daemon.watcher.folders, "mode": daemon.watcher.mode})
+    try:
+        daemon.run(on_result)
+    finally:
+        journal.close()
+        if cache is not None:
+            cache.close()
+    emit(dict(counts, event="summary"))
+    return 0
+
+
+def preview(files, output_paths):
+    """Report a planned batch without processing it"""
+    from .core import preview_output_paths
+
+    actions = {}
+    for source_file, output_file, action in preview_output_paths(files, output_paths):
+        actions[action] = actions.get(action, 0) + 1
+        emit({"event": "plan", "source_file": source_file, "output_file": output_file, "action": action})
+    emit({"event": "summary", "dry_run": True, "total": len(files), "actions": actions})
+    return 0
+
+
+def run(args, files, output_paths, journal, batch_id):
+    """Process a planned batch, marking each file off in the journal"""
+    from .core import DATA_DIR, process_batch
+    from .metrics import BatchMetrics
+    from .video import VIDEO_EXTENSIONS
+
+    os.makedirs(args.out, exist_ok=True)
+
+    # Only look for FFmpeg when there is a video to process
+    ffmpeg_info = None
+    if any(os.path.splitext(file.lower())[1] in VIDEO_EXTENSIONS for file in files):
+        from .ffmpeg import probe_ffmpeg
+        ffmpeg_info = probe_ffmpeg(os.path.join(DATA_DIR, 'ffmpeg_capabilities.json'))
+
+    cache = None
+    if not args.no_cache:
+        from .cache import ResultCache
+        cache = ResultCache(os.path.join(DATA_DIR, 'result_cache.db'), verify_content=args.verify_content)
+
+    metrics = BatchMetrics(args.metrics_jsonl)
+    start = time.perf_counter()
+    processed = 0
+    skipped = 0
+    cached = 0
+    for result in process_batch(
+        files,
+        args.out,
+        allow_overwrite=args.overwrite,
+        image_workers=args.image_workers,
+        video_workers=args.video_workers,
+        ffmpeg_info=ffmpeg_info,
+        output_paths=output_paths,
+        cache=cache,
+        sync_outputs=args.fsync,
+        link_clean=args.link_clean,
+        memory_limit=memory_limit(args),
+        memory_budget=args.memory_budget and args.memory_budget * 1024 * 1024
+    ):
+        journal.record(batch_id, result)
+        metrics.observe(result)
+        if result["status"] == "Cached":
+            cached += 1
+        if result["error"] is None:
+            processed += 1
+        else:
+            skipped += 1
+        emit(dict(result, event="file"))
+
+    metrics.finish()
+    if args.metrics_textfile:
+        metrics.write_prometheus(args.metrics_textfile)
+    journal.finish(batch_id)
+    journal.close()
+    if cache is not None:
+        cache.close()
+
+    emit({
+        "event": "summary",
+        "total": len(files),
+        "processed": processed,
+        "skipped": skipped,
+        "cached": cached,
+        "elapsed": round(time.perf_counter() - start, 3),
+        "metrics": metrics.summary(),
+    })
+    return 0 if skipped == 0 else 1
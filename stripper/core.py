@@ -0,0 +1,270 @@
+"""Tk-free batch engine shared by the GUI and the command line.
+
+process_batch() plans output names, fans images out to worker processes and
+videos out to concurrent jobs, copies everything else, and yields one
+result dict per file as soon as it finishes.
+"""
+
+import os
+import time
+
+from .batch import ImageBatchRunner, merge_results
+from .fastcopy import copy_file as copy_contents
+from .images import IMAGE_EXTENSIONS, MEMORY_LIMIT
+from .metrics import Spans, file_sizes, make_result
+from .mp4 import MP4_EXTENSIONS
+from .output import OutputSyncer, atomic_output
+from .scan import FolderScanner
+from .video import VIDEO_EXTENSIONS, VideoScheduler, strip_video
+
+MEDIA_EXTENSIONS = IMAGE_EXTENSIONS + VIDEO_EXTENSIONS
+
+# Preferences, history and caches live next to meta_data_strip.py
+DATA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def find_media_files(folder, exclude=()):
+    """Yield every supported image/video file below folder"""
+    for path, _ in FolderScanner(MEDIA_EXTENSIONS, exclude).scan(folder):
+        yield path
+
+
+def check_overwrite_risk(files, output_dir):
+    """Check if any of files lives in output_dir"""
+    for file_path in files:
+        file_dir = os.path.dirname(file_path)
+        if os.path.normpath(file_dir) == os.path.normpath(output_dir):
+            return True
+    return False
+
+
+def _plan_key(path):
+    """Identity of a path while planning: absolute, normalized, and case-folded where the filesystem is"""
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+def list_directory(directory):
+    """Plan keys of every entry in directory; empty if it doesn't exist yet"""
+    try:
+        entries = os.listdir(directory)
+    except OSError:
+        return set()
+    return set(_plan_key(os.path.join(directory, entry)) for entry in entries)
+
+
+class OutputPlanner:
+    """Assigns output paths for one batch without touching the disk per file.
+
+    The output directory is listed at most once, the first time a name has
+    to be checked against files already there; every other check is a set
+    lookup. Numbered names continue from the last number handed out for the
+    same base name, so many files called e.g. IMG_0001.jpg cost no more
+    than one each.
+    """
+
+    def __init__(self, files, output_dir, allow_overwrite=False):
+        self.output_dir = output_dir
+        self.output_key = _plan_key(output_dir)
+        self.allow_overwrite = allow_overwrite
+        # Inputs are reserved too, so no job writes over a file another job is reading
+        self.reserved = set(_plan_key(file) for file in files)
+        self.existing = None  # Entries already in output_dir, listed when first needed
+        self.counters = {}  # Next number to try per numbered name pattern
+
+    def is_taken(self, key):
+        """Whether a planned output with this key would clobber something"""
+        if key in self.reserved:
+            return True
+        if self.existing is None:
+            self.existing = list_directory(self.output_dir)
+        return key in self.existing
+
+    def numbered(self, base_name, suffix, extension):
+        """First free name of the form base_name{suffix}_N.ext"""
+        pattern = (base_name, suffix, extension)
+        counter = self.counters.get(pattern, 1)
+        while True:
+            output_path = os.path.join(self.output_dir, f"{base_name}{suffix}_{counter}{extension}")
+            counter += 1
+            if not self.is_taken(_plan_key(output_path)):
+                break
+        self.counters[pattern] = counter
+        return output_path
+
+    def output_path(self, file_path):
+        """Plan the output for file_path and reserve it"""
+        file_name = os.path.basename(file_path)
+        base_name, extension = os.path.splitext(file_name)
+        output_path = os.path.join(self.output_dir, file_name)
+        output_key = _plan_key(output_path)
+
+        # If the input and output paths are identical, and overwrite is not allowed, modify the output filename
+        if _plan_key(os.path.dirname(file_path)) == self.output_key and not self.allow_overwrite:
+            output_path = os.path.join(self.output_dir, f"{base_name}_clean{extension}")
+            # If that still exists, add a number
+            if self.is_taken(_plan_key(output_path)):
+                output_path = self.numbered(base_name, "_clean", extension)
+        elif output_key in self.reserved and output_key != _plan_key(file_path):
+            # Another file in this batch already uses this name, add a number
+            output_path = self.numbered(base_name, "", extension)
+
+        self.reserved.add(_plan_key(output_path))
+        return output_path
+
+    def reserve(self, file_path):
+        """Keep outputs from being planned over file_path, e.g. an input arriving later"""
+        self.reserved.add(_plan_key(file_path))
+
+
+def get_safe_output_path(file_path, output_dir, allow_overwrite=False):
+    """Generate a safe output path for a single file that won't overwrite the original"""
+    return OutputPlanner([file_path], output_dir, allow_overwrite).output_path(file_path)
+
+
+def plan_output_paths(files, output_dir, allow_overwrite=False):
+    """Assign every file its output path before any work starts, in selection order"""
+    planner = OutputPlanner(files, output_dir, allow_overwrite)
+    return {file: planner.output_path(file) for file in files}
+
+
+def preview_output_paths(files, output_paths):
+    """Dry run of a plan: (source, output, action) per file, without writing anything.
+
+    action is "new", "replace" (an earlier output or other file is in the
+    way) or "in place" (the original itself is overwritten).
+    """
+    listings = {}
+    preview = []
+    for file in files:
+        output_path = output_paths[file]
+        output_key = _plan_key(output_path)
+        directory = os.path.dirname(output_path)
+        if directory not in listings:
+            listings[directory] = list_directory(directory)
+        if output_key == _plan_key(file):
+            action = "in place"
+        elif output_key in listings[directory]:
+            action = "replace"
+        else:
+            action = "new"
+        preview.append((file, output_path, action))
+    return preview
+
+
+def copy_file(file_path, output_path):
+    """Copy a file we have no metadata handler for"""
+    start = time.perf_counter()
+    spans = Spans()
+    try:
+        with atomic_output(output_path, spans) as temp_path:
+            with spans.stage("copy"), open(file_path, 'rb') as src, open(temp_path, 'wb') as dst:
+                copy_contents(src, dst)
+    except Exception as e:
+        return make_result(file_path, output_path, "Error", str(e), time.perf_counter() - start,
+                           "copy", spans.stages, *file_sizes(file_path))
+    return make_result(file_path, output_path, "Copied (No Metadata)", None, time.perf_counter() - start,
+                       "copy", spans.stages, *file_sizes(file_path, output_path))
+
+
+def process_batch(files, output_dir, allow_overwrite=False, image_workers=None, video_workers=4,
+                  ffmpeg_info=None, on_progress=None, output_paths=None, cache=None, sync_outputs=False,
+                  link_clean=False, memory_limit=MEMORY_LIMIT, memory_budget=None):
+    """Strip metadata from files into output_dir, yielding a result dict per file.
+
+    Results arrive in completion order. A result with an error other than
+    None counts as skipped. ffmpeg_info comes from stripper.ffmpeg.probe_ffmpeg;
+    without it MP4/MOV files are still stripped natively but other videos
+    are skipped. on_progress(file_path, fraction) reports partial progress
+    of running videos. output_paths may hold a plan from
+    plan_output_paths(), otherwise one is made here. With a ResultCache,
+    files whose earlier output, made with the same output directory and
+    options, is still in place are reported as "Cached" without being
+    planned or processed. With sync_outputs, finished outputs
+    are flushed to disk in groups as the batch runs. Images and MP4/MOV
+    files that carry no metadata are copied unchanged (status
+    "Copied (Already Clean)"), or hard-linked with link_clean. Images that
+    must be re-encoded are held to memory_limit bytes each, and image jobs
+    only run together while their estimated memory fits in memory_budget
+    (default: half the RAM).
+    """
+    results = _cached_batch(files, output_dir, allow_overwrite, image_workers, video_workers,
+                            ffmpeg_info, on_progress, output_paths, cache, link_clean, memory_limit, memory_budget)
+    if not sync_outputs:
+        yield from results
+        return
+
+    syncer = OutputSyncer()
+    for result in results:
+        if result["error"] is None:
+            syncer.add(result["output_file"])
+        yield result
+    syncer.flush()
+
+
+def _cached_batch(files, output_dir, allow_overwrite, image_workers, video_workers,
+                  ffmpeg_info, on_progress, output_paths, cache, link_clean, memory_limit, memory_budget):
+    """Run a batch, skipping files the result cache knows are already done"""
+    if cache is None:
+        yield from _run_batch(files, output_dir, allow_overwrite, image_workers, video_workers,
+                              ffmpeg_info, on_progress, output_paths, link_clean, memory_limit, memory_budget)
+        return
+
+    # Outputs only count for the directory and options they were written with
+    settings = repr((os.path.normcase(os.path.abspath(output_dir)), bool(allow_overwrite), bool(link_clean),
+                     memory_limit))
+    keys = {}
+    remaining = []
+    for file in files:
+        key = cache.source_key(file, settings)
+        cached_output = cache.lookup(key)
+        if cached_output is not None:
+            yield make_result(file, cached_output, "Cached", handler="cache")
+        else:
+            keys[file] = key
+            remaining.append(file)
+
+    for result in _run_batch(remaining, output_dir, allow_overwrite, image_workers, video_workers,
+                             ffmpeg_info, on_progress, output_paths, link_clean, memory_limit, memory_budget):
+        if result["error"] is None:
+            source_file = result["source_file"]
+            key = keys[source_file]
+            if os.path.normpath(result["output_file"]) == os.path.normpath(source_file):
+                # Cleaned in place: the source now has a new identity, the clean one
+                key = cache.source_key(source_file, settings)
+            cache.record(key, result["output_file"])
+        yield result
+
+
+def _run_batch(files, output_dir, allow_overwrite, image_workers, video_workers,
+               ffmpeg_info, on_progress, output_paths, link_clean, memory_limit, memory_budget):
+    """Plan and process files without consulting a result cache"""
+    if output_paths is None:
+        output_paths = plan_output_paths(files, output_dir, allow_overwrite)
+
+    def video_handler(file_path, output_path, progress, spans=None):
+        strip_video(file_path, output_path, progress, ffmpeg_info, use_ffmpeg=ffmpeg_info is not None, spans=spans,
+                    link_clean=link_clean)
+
+    with ImageBatchRunner(image_workers, link_clean, memory_limit, memory_budget) as image_runner, \
+            VideoScheduler(video_workers, handler=video_handler, on_progress=on_progress) as video_scheduler:
+        # Images go to the worker pool and videos to FFmpeg; copies are done here meanwhile
+        other_files = []
+        for file in files:
+            ext = os.path.splitext(file.lower())[1]
+            if ext in IMAGE_EXTENSIONS:
+                image_runner.submit(file, output_paths[file])
+            elif ext in VIDEO_EXTENSIONS:
+                if ffmpeg_info is None and ext not in MP4_EXTENSIONS:
+                    yield make_result(file, output_paths[file], "Skipped - No FFmpeg", "FFmpeg not available")
+                    continue
+                video_scheduler.add(file, output_paths[file])
+            else:
+                other_files.append(file)
+        video_scheduler.start()
+
+        for file in other_files:
+            yield copy_file(file, output_paths[file])
+
+        # Collect image and video results in the order they finish
+        for result in merge_results(image_runner.results(), video_scheduler.results()):
+            yield result
@@ -0,0 +1,38 @@
+"""Thread-safe event channel from batch workers to the UI thread.
+
+Workers never touch widgets. They either set a value (status text,
+progress), where only the latest one matters and earlier ones are simply
+overwritten, or post an event that must be delivered in order (e.g. the
+batch finishing). The UI thread drains the channel on a timer, so however
+fast results arrive, the widgets are redrawn at most once per tick.
+"""
+
+import threading
+from collections import deque
+
+
+class EventChannel:
+    """Coalesced values plus an ordered event queue, drained by the UI"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latest = {}
+        self.events = deque()
+
+    def set(self, key, value):
+        """Replace the pending value for key; only the newest is delivered"""
+        with self.lock:
+            self.latest[key] = value
+
+    def post(self, name, *args):
+        """Queue an event for delivery, in order, after the values"""
+        with self.lock:
+            self.events.append((name, args))
+
+    def drain(self):
+        """Take everything pending as (values dict, list of (name, args) events)"""
+        with self.lock:
+            latest, self.latest = self.latest, {}
+            events = list(self.events)
+            self.events.clear()
+        return latest, events
@@ -0,0 +1,99 @@
+"""Copying byte ranges between files without passing them through Python.
+
+Whole files are cloned (reflinked) where the filesystem supports it, so no
+data is copied at all. Otherwise copy_file_range() lets the kernel copy (or
+share) the data directly; sendfile() is the next best thing, and a plain
+read/write loop is used where neither is available.
+"""
+
+import os
+import sys
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows
+    fcntl = None
+
+# ioctl that makes dst share src's blocks (Btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+# Bytes handed to the kernel per call, so progress can be reported
+COPY_CHUNK = 64 * 1024 * 1024
+
+# Buffer for the read/write fallback
+BUFFER_SIZE = 1024 * 1024
+
+
+def _copy_file_range(src_fd, dst_fd, offset, count):
+    """Copy with copy_file_range, writing at dst's file position"""
+    return os.copy_file_range(src_fd, dst_fd, count, offset)
+
+
+def _sendfile(src_fd, dst_fd, offset, count):
+    """Copy with sendfile, writing at dst's file position"""
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+
+# Kernel copy primitives available on this platform, best first
+KERNEL_COPIES = [
+    copy for name, copy in (("copy_file_range", _copy_file_range), ("sendfile", _sendfile))
+    if hasattr(os, name)
+]
+
+
+def clone_file(src, dst):
+    """Make dst a copy-on-write clone of src; returns False if that isn't possible"""
+    if fcntl is None or not sys.platform.startswith("linux"):
+        return False
+    dst.flush()
+    try:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        return False
+    dst.seek(0, 2)
+    return True
+
+
+def copy_file(src, dst):
+    """Copy all of src to dst, cloning it where the filesystem allows"""
+    if not clone_file(src, dst):
+        copy_range(src, dst, 0, os.fstat(src.fileno()).st_size)
+
+
+def copy_range(src, dst, offset, length, on_copied=None):
+    """Copy length bytes of src, starting at offset, to the current position of dst.
+
+    src and dst are binary file objects backed by real files. on_copied,
+    if given, is called with the number of bytes copied so far.
+    """
+    # Anything dst has buffered must land before the kernel writes behind it
+    dst.flush()
+    copied = 0
+    src_fd = src.fileno()
+    dst_fd = dst.fileno()
+
+    for kernel_copy in KERNEL_COPIES:
+        try:
+            while copied < length:
+                count = kernel_copy(src_fd, dst_fd, offset + copied, min(length - copied, COPY_CHUNK))
+                if count == 0:
+                    raise ValueError("Unexpected end of file while copying")
+                copied += count
+                if on_copied:
+                    on_copied(copied)
+            return
+        except OSError:
+            # Not supported for this pair of files (e.g. across filesystems); try the next way
+            continue
+
+    src.seek(offset + copied)
+    while copied < length:
+        data = src.read(min(length - copied, BUFFER_SIZE))
+        if not data:
+            raise ValueError("Unexpected end of file while copying")
+        dst.write(data)
+        copied += len(data)
+        if on_copied:
+            on_copied(copied)
+    dst.flush()
@@ -0,0 +1,107 @@
+"""One-time FFmpeg capability probe with an on-disk cache.
+
+The probe records the binary path, version, available muxers and whether
+ffprobe is installed. Results are cached in a JSON file keyed by the
+binary's path and mtime, so later launches don't need to spawn FFmpeg at
+all unless it was replaced or upgraded.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+
+PROBE_TIMEOUT = 10
+
+
+def _run(command):
+    """Run a short FFmpeg query and return its stdout, or None on failure"""
+    try:
+        result = subprocess.run(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            timeout=PROBE_TIMEOUT
+        )
+    except (subprocess.SubprocessError, OSError):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout
+
+
+def _parse_muxers(output):
+    """Collect muxer names from `ffmpeg -muxers` output"""
+    muxers = set()
+    in_list = False
+    for line in output.splitlines():
+        if line.strip() == "--":
+            in_list = True
+            continue
+        fields = line.split()
+        if in_list and len(fields) >= 2 and "E" in fields[0]:
+            muxers.update(fields[1].split(","))
+    return sorted(muxers)
+
+
+def _load_cache(cache_file, path, mtime):
+    """Return cached capabilities if they were recorded for this exact binary"""
+    try:
+        with open(cache_file, 'r') as f:
+            cached = json.load(f)
+        if cached.get("path") == path and cached.get("mtime") == mtime:
+            return cached
+    except Exception:
+        pass
+    return None
+
+
+def probe_ffmpeg(cache_file=None, binary="ffmpeg"):
+    """Describe the FFmpeg install, or return None if it is missing or broken.
+
+    The result is a dict with path, mtime, version, muxers and ffprobe (the
+    ffprobe path or None).
+    """
+    path = shutil.which(binary)
+    if path is None:
+        return None
+    path = os.path.realpath(path)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+
+    if cache_file:
+        cached = _load_cache(cache_file, path, mtime)
+        if cached is not None:
+            return cached
+
+    version_output = _run([path, '-hide_banner', '-version'])
+    if version_output is None:
+        return None
+    first_line = version_output.splitlines()[0] if version_output else ""
+    # "ffmpeg version 6.1.1 Copyright ..." -> "6.1.1"
+    fields = first_line.split()
+    version = fields[2] if len(fields) > 2 and fields[1] == "version" else first_line
+
+    muxers_output = _run([path, '-hide_banner', '-muxers'])
+    ffprobe = shutil.which("ffprobe", path=os.path.dirname(path)) or shutil.which("ffprobe")
+
+    info = {
+        "path": path,
+        "mtime": mtime,
+        "version": version,
+        "muxers": _parse_muxers(muxers_output) if muxers_output else [],
+        "ffprobe": ffprobe,
+    }
+
+    if cache_file:
+        try:
+            with open(cache_file, 'w') as f:
+                json.dump(info, f)
+        except Exception:
+            # Caching is only an optimisation
+            pass
+    return info
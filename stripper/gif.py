@@ -0,0 +1,134 @@
+"""Streaming GIF metadata stripping at the block level.
+
+The block structure is walked by its length bytes alone. Comment
+extensions and application extensions other than the looping ones
+(NETSCAPE2.0 / ANIMEXTS1.0) - XMP packets, ICC profiles and the like - are
+left out. Everything else, including every frame's LZW data, is copied
+byte for byte in merged runs with kernel copy primitives, so animations
+are kept intact and memory use does not depend on the file size.
+"""
+
+from .fastcopy import copy_range
+
+GIF_SIGNATURES = (b"GIF87a", b"GIF89a")
+
+EXTENSION = 0x21
+IMAGE = 0x2C
+TRAILER = 0x3B
+
+COMMENT = 0xFE
+APPLICATION = 0xFF
+
+# Application extensions that control playback rather than describe the file
+KEPT_APPLICATIONS = frozenset([b"NETSCAPE2.0", b"ANIMEXTS1.0"])
+
+# Bytes read at a time while hopping over sub-blocks
+CHUNK_SIZE = 64 * 1024
+
+
+def _read_exact(src, offset, size):
+    """Read exactly size bytes at offset or fail on a truncated stream"""
+    src.seek(offset)
+    data = src.read(size)
+    if len(data) != size:
+        raise ValueError("Unexpected end of GIF data")
+    return data
+
+
+def _color_table_size(flags):
+    """Size of the color table announced by a descriptor's flags byte"""
+    return 3 << ((flags & 0x07) + 1) if flags & 0x80 else 0
+
+
+def _skip_sub_blocks(src, offset):
+    """Return the offset just past the terminator of the sub-blocks at offset"""
+    while True:
+        src.seek(offset)
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            raise ValueError("Unexpected end of GIF data")
+        position = 0
+        while position < len(chunk):
+            size = chunk[position]
+            if size == 0:
+                return offset + position + 1
+            position += size + 1
+        # The next length byte lies beyond this chunk
+        offset += position
+
+
+def _iter_blocks(src):
+    """Yield (start, end, keep) for the header and every block up to the trailer.
+
+    Raises ValueError if the stream is not a well-formed GIF.
+    """
+    header = _read_exact(src, 0, 13)
+    if header[:6] not in GIF_SIGNATURES:
+        raise ValueError("Not a GIF file")
+    # Header, logical screen descriptor and global color table
+    offset = 13 + _color_table_size(header[10])
+    yield 0, offset, True
+
+    while True:
+        introducer = _read_exact(src, offset, 1)[0]
+        if introducer == TRAILER:
+            yield offset, offset + 1, True
+            return
+
+        if introducer == IMAGE:
+            descriptor = _read_exact(src, offset, 10)
+            # Descriptor, local color table and the LZW minimum code size byte
+            data_start = offset + 10 + _color_table_size(descriptor[9]) + 1
+            end = _skip_sub_blocks(src, data_start)
+            yield offset, end, True
+        elif introducer == EXTENSION:
+            label = _read_exact(src, offset + 1, 1)[0]
+            keep = True
+            if label == COMMENT:
+                keep = False
+            elif label == APPLICATION:
+                # The first sub-block holds the application identifier and code
+                block = _read_exact(src, offset + 2, 12)
+                keep = block[0] == 11 and block[1:] in KEPT_APPLICATIONS
+            end = _skip_sub_blocks(src, offset + 2)
+            yield offset, end, keep
+        else:
+            raise ValueError("Invalid GIF block")
+        offset = end
+
+
+def gif_has_metadata(src):
+    """Check whether strip_gif would remove anything from src.
+
+    Only the block structure is read. Data after the trailer counts as
+    metadata, as strip_gif drops it. Raises ValueError if the stream is
+    not a GIF.
+    """
+    end = 0
+    for _, end, keep in _iter_blocks(src):
+        if not keep:
+            return True
+    return src.seek(0, 2) != end
+
+
+def strip_gif(src, dst):
+    """Copy a GIF from src to dst without comment and metadata application blocks.
+
+    src and dst are binary file objects backed by real files; src must be
+    seekable. Anything after the trailer is dropped. Returns the number of
+    blocks removed. Raises ValueError if the stream is not a well-formed GIF.
+    """
+    # Find every block first, so a malformed file fails before anything is written
+    runs = []
+    removed = 0
+    for start, end, keep in _iter_blocks(src):
+        if not keep:
+            removed += 1
+        elif runs and runs[-1][1] == start:
+            runs[-1][1] = end
+        else:
+            runs.append([start, end])
+
+    for start, end in runs:
+        copy_range(src, dst, start, end - start)
+    return removed
@@ -0,0 +1,284 @@
+"""Durable processing history backed by SQLite in WAL mode.
+
+Entries are appended from any thread and written by a single background
+writer that commits whatever has queued up in one transaction, so a busy
+batch costs one commit per group of files rather than one per file, and
+nothing is lost if the process dies mid-batch. Timestamp, source path and
+status are indexed for filtering, and a trigram full-text index over the
+paths serves substring search; retention deletes old rows in place instead
+of rewriting the whole log. Pages are read by id (keyset), so showing the
+millionth row costs the same as showing the first.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+# Upper bound on entries written in one transaction
+GROUP_COMMIT_SIZE = 500
+
+COLUMNS = ("timestamp", "source_file", "output_file", "status", "duration")
+
+INSERT_SQL = "INSERT INTO history ({}) VALUES (?, ?, ?, ?, ?)".format(", ".join(COLUMNS))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    source_file TEXT NOT NULL,
+    output_file TEXT NOT NULL,
+    status TEXT NOT NULL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp);
+CREATE INDEX IF NOT EXISTS history_source_file ON history (source_file);
+CREATE INDEX IF NOT EXISTS history_status ON history (status);
+"""
+
+# Trigram index over both paths, kept in step with the table by triggers.
+# Needs SQLite 3.34+ built with FTS5; without it every search scans the table.
+FULL_TEXT_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_paths USING fts5(
+    source_file, output_file, content='history', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS history_paths_insert AFTER INSERT ON history BEGIN
+    INSERT INTO history_paths (rowid, source_file, output_file)
+    VALUES (new.id, new.source_file, new.output_file);
+END;
+CREATE TRIGGER IF NOT EXISTS history_paths_delete AFTER DELETE ON history BEGIN
+    INSERT INTO history_paths (history_paths, rowid, source_file, output_file)
+    VALUES ('delete', old.id, old.source_file, old.output_file);
+END;
+"""
+
+# Shortest search the trigram index can answer
+TRIGRAM_LENGTH = 3
+
+SELECT_SQL = "SELECT id, {} FROM history".format(", ".join(COLUMNS))
+
+
+def _connect(path):
+    """Open a connection with the pragmas every user of the store needs"""
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # WAL keeps NORMAL crash-safe; only the last commits can be lost on power failure
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+def _row(entry):
+    """Turn a history entry dict into a row tuple"""
+    return (
+        entry.get("timestamp", "Unknown"),
+        entry.get("source_file", "Unknown"),
+        entry.get("output_file", "Unknown"),
+        entry.get("status", "Unknown"),
+        entry.get("duration"),
+    )
+
+
+def _where(search=None, status=None, full_text=False, clauses=(), params=()):
+    """Build the WHERE clause and parameters for a filtered query.
+
+    search always means a case-insensitive substring of either path. Status
+    is answered by its index, and searches by the trigram index when
+    full_text is set and the search is long enough to have trigrams.
+    """
+    clauses = list(clauses)
+    params = list(params)
+    if status:
+        # A prefix range rather than LIKE, so the status index is used
+        clauses.append("status >= ? AND status < ?")
+        params += [status, status + "\uffff"]
+    if search and full_text and len(search) >= TRIGRAM_LENGTH:
+        # Quoted as one phrase: a case-insensitive substring of either path
+        clauses.append("id IN (SELECT rowid FROM history_paths WHERE history_paths MATCH ?)")
+        params.append('"' + search.replace('"', '""') + '"')
+    elif search:
+        # No trigram index, or too short for one: scan, which is rare and cheap enough
+        clauses.append("(instr(lower(source_file), lower(?)) OR instr(lower(output_file), lower(?)))")
+        params += [search, search]
+    if not clauses:
+        return "", params
+    return " WHERE " + " AND ".join(clauses), params
+
+
+def _entries(rows):
+    """Turn result rows of SELECT_SQL into entry dicts, including their id"""
+    return [dict(zip(("id",) + COLUMNS, row)) for row in rows]
+
+
+class HistoryStore:
+    """Append-only processing history in an SQLite database.
+
+    add() never blocks on disk; flush() waits until everything added so far
+    is committed. version increases after every commit so views can tell
+    when to refresh. Entries are addressed by id, which only grows, so
+    views page with fetch() and seek() rather than by row number.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = _connect(path)
+        with self.lock, self.connection:
+            self.connection.executescript(SCHEMA)
+        self.full_text = self._create_full_text()
+        self.total = self.count()
+        self.version = 0
+
+        self.pending = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    def _create_full_text(self):
+        """Set up the path search index; False if this SQLite can't"""
+        with self.lock:
+            exists = self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'history_paths'"
+            ).fetchone()
+            try:
+                with self.connection:
+                    self.connection.executescript(FULL_TEXT_SCHEMA)
+                    if not exists:
+                        # Index rows written before the index existed
+                        self.connection.execute("INSERT INTO history_paths (history_paths) VALUES ('rebuild')")
+            except sqlite3.OperationalError:
+                return False
+        return True
+
+    def import_json(self, json_path):
+        """Copy entries from the old processing_history.json into an empty store.
+
+        Returns True if the file was imported, after which it is renamed so
+        it isn't imported again.
+        """
+        if self.total or not os.path.exists(json_path):
+            return False
+        with open(json_path, 'r') as f:
+            entries = json.load(f)
+        with self.lock, self.connection:
+            self.connection.executemany(INSERT_SQL, [_row(entry) for entry in entries])
+        self.total = self.count()
+        self.version += 1
+        os.replace(json_path, json_path + ".imported")
+        return True
+
+    def add(self, entry):
+        """Queue an entry dict for writing"""
+        self.pending.put(entry)
+
+    def _write_loop(self):
+        """Writer thread: commit queued entries in groups"""
+        connection = _connect(self.path)
+        while True:
+            entries = [self.pending.get()]
+            # Everything that queued up while the last commit ran goes in this one
+            while len(entries) < GROUP_COMMIT_SIZE:
+                try:
+                    entries.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in entries
+            rows = [_row(entry) for entry in entries if entry is not None]
+            try:
+                if rows:
+                    with connection:
+                        connection.executemany(INSERT_SQL, rows)
+                    self.total += len(rows)
+                    self.version += 1
+            except sqlite3.Error:
+                # History is not critical; keep the batch running
+                pass
+            finally:
+                for _ in entries:
+                    self.pending.task_done()
+            if stop:
+                connection.close()
+                return
+
+    def flush(self):
+        """Wait until every queued entry has been committed"""
+        self.pending.join()
+
+    def close(self):
+        """Write out queued entries and close the database"""
+        self.pending.put(None)
+        self.writer.join()
+        with self.lock:
+            self.connection.close()
+
+    def count(self, search=None, status=None):
+        """Number of entries matching the filters"""
+        where, params = _where(search, status, self.full_text)
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM history" + where, params).fetchone()[0]
+
+    def fetch(self, limit, search=None, status=None, start=None):
+        """Up to limit matching entries in insertion order, from id start onwards.
+
+        Without start, the newest limit entries.
+        """
+        if start is None:
+            where, params = _where(search, status, self.full_text)
+            order = " ORDER BY id DESC LIMIT ?"
+        else:
+            where, params = _where(search, status, self.full_text, ["id >= ?"], [start])
+            order = " ORDER BY id LIMIT ?"
+        with self.lock:
+            rows = self.connection.execute(SELECT_SQL + where + order, params + [limit]).fetchall()
+        if start is None:
+            rows.reverse()
+        return _entries(rows)
+
+    def seek(self, start, rows, search=None, status=None):
+        """Id of the matching entry rows entries after start (before, if negative).
+
+        Stops at the first or last match when there are fewer than that.
+        """
+        if rows >= 0:
+            where, params = _where(search, status, self.full_text, ["id > ?"], [start])
+            order = " ORDER BY id"
+        else:
+            where, params = _where(search, status, self.full_text, ["id < ?"], [start])
+            order = " ORDER BY id DESC"
+        with self.lock:
+            # Only the rows actually scrolled over are stepped through
+            ids = self.connection.execute(
+                "SELECT id FROM history" + where + order + " LIMIT ?", params + [abs(rows)]
+            ).fetchall()
+        return ids[-1][0] if ids else start
+
+    def id_range(self, search=None, status=None):
+        """(first id, last id) among entries matching the filters, or (None, None)"""
+        where, params = _where(search, status, self.full_text)
+        with self.lock:
+            return self.connection.execute("SELECT MIN(id), MAX(id) FROM history" + where, params).fetchone()
+
+    def prune(self, max_entries=None, max_age_days=None):
+        """Delete the oldest entries beyond max_entries or older than max_age_days"""
+        self.flush()
+        with self.lock, self.connection:
+            if max_age_days:
+                cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+                self.connection.execute("DELETE FROM history WHERE timestamp < ?", (cutoff,))
+            if max_entries is not None:
+                self.connection.execute(
+                    "DELETE FROM history WHERE id <= "
+                    "(SELECT id FROM history ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (max_entries,)
+                )
+        self.total = self.count()
+        self.version += 1
+
+    def clear(self):
+        """Delete every entry"""
+        self.flush()
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM history")
+        self.total = 0
+        self.version += 1
@@ -0,0 +1,80 @@
+"""Per-file dispatch for image formats."""
+
+import os
+
+from .gif import strip_gif
+from .jpeg import strip_jpeg
+from .metrics import Spans
+from .output import atomic_output
+from .png import strip_png
+from .prescan import copy_clean, has_metadata
+from .tiff import TIFF_EXTENSIONS, strip_tiff
+from .webp import strip_webp
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp', '.gif', '.webp')
+
+# Lossless strippers and their handler names by extension; other images are re-encoded
+LOSSLESS_STRIPPERS = dict(
+    [(ext, (strip_jpeg, "jpeg")) for ext in ('.jpg', '.jpeg')]
+    + [('.png', (strip_png, "png")), ('.gif', (strip_gif, "gif")), ('.webp', (strip_webp, "webp"))]
+    + [(ext, (strip_tiff, "tiff")) for ext in TIFF_EXTENSIONS]
+)
+
+# Most memory (bytes) one re-encode may use; larger images are re-encoded in bands
+MEMORY_LIMIT = 256 * 1024 * 1024
+
+# Most memory (bytes) the lossless strippers use, whatever the file size
+STREAM_MEMORY = 8 * 1024 * 1024
+
+
+def estimate_memory(file_path, memory_limit=MEMORY_LIMIT):
+    """Rough peak memory (bytes) of stripping file_path, judged from its header alone.
+
+    Lossless strippers stream in constant memory. Other images are decoded,
+    which costs width x height x bands twice over (the bitmap and its clean
+    copy), or at most memory_limit once they are re-encoded in bands.
+    """
+    if os.path.splitext(file_path.lower())[1] in LOSSLESS_STRIPPERS:
+        return STREAM_MEMORY
+    # Imported here so lossless-only batches never pay for PIL
+    from .reencode import open_image, reencode_memory
+    try:
+        with open_image(file_path) as img:
+            needed = reencode_memory(img)
+    except (OSError, ValueError):
+        # The worker will fail on it before decoding anything
+        return STREAM_MEMORY
+    return needed if memory_limit is None else min(needed, memory_limit)
+
+
+def strip_image(file_path, output_path, spans=None, link_clean=False, memory_limit=MEMORY_LIMIT):
+    """Write a copy of the image at file_path to output_path without metadata.
+
+    spans, a stripper.metrics.Spans, receives the handler used and its
+    stage timings. Images without any metadata are copied as they are
+    (handler "clean"), or hard-linked with link_clean. Images that have to
+    be re-encoded are held to memory_limit bytes (None for no limit).
+    """
+    spans = spans if spans is not None else Spans()
+    with spans.stage("prescan"):
+        clean = has_metadata(file_path) is False
+    if clean:
+        copy_clean(file_path, output_path, spans, link_clean)
+        return
+
+    lossless = LOSSLESS_STRIPPERS.get(os.path.splitext(file_path.lower())[1])
+    if lossless is not None:
+        strip, spans.handler = lossless
+        try:
+            with atomic_output(output_path, spans) as temp_path:
+                with spans.stage("strip"), open(file_path, 'rb') as src, open(temp_path, 'wb') as dst:
+                    strip(src, dst)
+            return
+        except ValueError:
+            # Malformed container - fall back to a PIL re-encode below
+            pass
+
+    # Imported here so lossless-only runs never pay for PIL
+    from .reencode import reencode_image
+    spans.handler = "reencode"
+    reencode_image(file_path, output_path, spans, memory_limit)
@@ -0,0 +1,164 @@
+"""Batch journal for resuming interrupted runs.
+
+The full plan (every source and the output it will be written to) is
+stored when a batch starts, and each file is marked off in its own commit
+as soon as its result is in. If the process is closed or crashes, the next
+session can pick the batch up from the journal: files that never finished
+are redone, and so are finished ones whose output has since disappeared or
+no longer matches the size and mtime recorded for it. A batch is removed
+from the journal once it completes.
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+
+from .output import remove_partials
+
+# Entry states
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY,
+    output_dir TEXT NOT NULL,
+    allow_overwrite INTEGER NOT NULL,
+    started TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    batch_id INTEGER NOT NULL,
+    source_file TEXT NOT NULL,
+    output_file TEXT NOT NULL,
+    state TEXT NOT NULL,
+    output_size INTEGER,
+    output_mtime_ns INTEGER
+);
+CREATE UNIQUE INDEX IF NOT EXISTS entries_source ON entries (batch_id, source_file);
+"""
+
+
+class BatchJournal:
+    """Record of running batches, one row per planned file.
+
+    Paths are stored absolute so a batch can be resumed from another
+    working directory.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps NORMAL safe against crashes; only power loss can drop the last commits
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def begin(self, output_dir, allow_overwrite, output_paths):
+        """Store the plan of a new batch and return its id"""
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO batches (output_dir, allow_overwrite, started) VALUES (?, ?, ?)",
+                (os.path.abspath(output_dir), int(allow_overwrite), datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            batch_id = cursor.lastrowid
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO entries (batch_id, source_file, output_file, state) VALUES (?, ?, ?, ?)",
+                [(batch_id, os.path.abspath(source), os.path.abspath(output), PENDING)
+                 for source, output in output_paths.items()]
+            )
+        return batch_id
+
+    def record(self, batch_id, result):
+        """Mark the file of a result dict as finished, in its own transaction"""
+        output_size = output_mtime_ns = None
+        if result["error"] is None:
+            state = DONE
+            try:
+                stat = os.stat(result["output_file"])
+                output_size, output_mtime_ns = stat.st_size, stat.st_mtime_ns
+            except OSError:
+                # Nothing to check against later, so a resume will redo it
+                state = PENDING
+        else:
+            state = FAILED
+        with self.connection:
+            self.connection.execute(
+                "UPDATE entries SET state = ?, output_file = ?, output_size = ?, output_mtime_ns = ? "
+                "WHERE batch_id = ? AND source_file = ?",
+                (state, os.path.abspath(result["output_file"]), output_size, output_mtime_ns,
+                 batch_id, os.path.abspath(result["source_file"]))
+            )
+
+    def interrupted(self):
+        """Describe unfinished batches, newest first, as dicts"""
+        rows = self.connection.execute(
+            "SELECT b.id, b.output_dir, b.allow_overwrite, b.started, COUNT(e.id), "
+            "SUM(e.state != ?) FROM batches b JOIN entries e ON e.batch_id = b.id "
+            "GROUP BY b.id ORDER BY b.id DESC",
+            (PENDING,)
+        ).fetchall()
+        return [
+            {
+                "id": batch_id,
+                "output_dir": output_dir,
+                "allow_overwrite": bool(allow_overwrite),
+                "started": started,
+                "total": total,
+                "finished": finished or 0,
+            }
+            for batch_id, output_dir, allow_overwrite, started, total, finished in rows
+        ]
+
+    def resume(self, batch_id):
+        """Return (files, output_paths) still to be done for an interrupted batch.
+
+        Temporary files left behind by files that never finished are deleted.
+        Their planned outputs are left alone: outputs are only ever put in
+        place whole, by rename, so one that exists was either finished or
+        there before the batch. Finished files whose output no longer
+        matches what was recorded are queued again.
+        """
+        files = []
+        output_paths = {}
+        redo = []
+        rows = self.connection.execute(
+            "SELECT source_file, output_file, state, output_size, output_mtime_ns "
+            "FROM entries WHERE batch_id = ? ORDER BY id",
+            (batch_id,)
+        ).fetchall()
+        for source_file, output_file, state, output_size, output_mtime_ns in rows:
+            if state == FAILED:
+                continue
+            if state == DONE:
+                try:
+                    stat = os.stat(output_file)
+                    if stat.st_size == output_size and stat.st_mtime_ns == output_mtime_ns:
+                        continue
+                except OSError:
+                    pass
+                redo.append(source_file)
+            else:
+                # Interrupted mid-write; only the temporary file can be incomplete
+                remove_partials(output_file)
+            files.append(source_file)
+            output_paths[source_file] = output_file
+
+        if redo:
+            with self.connection:
+                self.connection.executemany(
+                    "UPDATE entries SET state = ? WHERE batch_id = ? AND source_file = ?",
+                    [(PENDING, batch_id, source_file) for source_file in redo]
+                )
+        return files, output_paths
+
+    def finish(self, batch_id):
+        """Forget a batch that completed or that the user chose not to resume"""
+        with self.connection:
+            self.connection.execute("DELETE FROM entries WHERE batch_id = ?", (batch_id,))
+            self.connection.execute("DELETE FROM batches WHERE id = ?", (batch_id,))
+
+    def close(self):
+        """Close the database"""
+        self.connection.close()
@@ -0,0 +1,206 @@
+"""Lossless JPEG metadata stripping at the marker/segment level.
+
+The marker stream is walked segment by segment. Metadata segments (EXIF,
+XMP, IPTC, comments, ...) are dropped, everything else - including the
+entropy-coded scan data - is copied byte for byte, so the image is never
+decoded and the output pixels are identical to the input.
+jpeg_has_metadata() answers whether stripping would change a file at all,
+without writing anything.
+"""
+
+import re
+
+# Markers we need to recognise while walking the stream
+SOI = 0xD8
+EOI = 0xD9
+SOS = 0xDA
+APP0 = 0xE0
+APP1 = 0xE1
+APP2 = 0xE2
+APP13 = 0xED
+APP14 = 0xEE
+COM = 0xFE
+
+# Markers without a length field
+STANDALONE_MARKERS = frozenset([0x01] + list(range(0xD0, 0xD8)))
+
+# Default segments to drop: every APPn except APP0 (JFIF) and APP14 (Adobe,
+# which changes how colour is decoded), plus comments. ICC profiles in APP2
+# are kept separately, see strip_jpeg's keep_icc argument.
+DEFAULT_JPEG_DROP = frozenset(
+    [marker for marker in range(APP1, 0xF0) if marker != APP14] + [COM]
+)
+
+ICC_SIGNATURE = b"ICC_PROFILE\x00"
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _read_exact(src, size):
+    """Read exactly size bytes or fail on a truncated stream"""
+    data = src.read(size)
+    if len(data) != size:
+        raise ValueError("Unexpected end of JPEG data")
+    return data
+
+
+def _read_marker(src):
+    """Read the next marker byte, skipping any 0xFF fill bytes"""
+    if _read_exact(src, 1) != b"\xff":
+        raise ValueError("Invalid JPEG marker")
+    marker = 0xFF
+    while marker == 0xFF:
+        marker = _read_exact(src, 1)[0]
+    return marker
+
+
+def _copy_entropy_data(src, dst):
+    """Copy entropy-coded data up to the next marker and return that marker"""
+    pending = b""
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            raise ValueError("Unexpected end of JPEG data")
+        buf = pending + chunk
+        pending = b""
+        pos = 0
+        while True:
+            idx = buf.find(b"\xff", pos)
+            if idx == -1:
+                dst.write(buf)
+                break
+            if idx == len(buf) - 1:
+                # Can't classify a trailing 0xFF until the next chunk arrives
+                dst.write(buf[:idx])
+                pending = b"\xff"
+                break
+            following = buf[idx + 1]
+            if following == 0x00 or 0xD0 <= following <= 0xD7:
+                # Stuffed byte or restart marker - still part of the scan
+                pos = idx + 2
+                continue
+            if following == 0xFF:
+                # Fill byte before a marker
+                pos = idx + 1
+                continue
+            # A real marker: write the scan data and rewind to just after it
+            dst.write(buf[:idx])
+            src.seek(idx + 2 - len(buf), 1)
+            return following
+
+
+def _marker_pattern(markers):
+    """Regex finding any of markers in JPEG data"""
+    return re.compile(b"\\xff" + b"[" + b"".join(b"\\x%02x" % marker for marker in sorted(markers)) + b"]")
+
+
+def jpeg_has_metadata(src, drop_markers=DEFAULT_JPEG_DROP, keep_icc=True):
+    """Check whether strip_jpeg would remove anything from src.
+
+    The segments up to the first scan are walked by their headers. The rest
+    of the file is only searched for marker bytes (in C, without walking
+    the entropy-coded data): a droppable segment between scans, a second
+    image or anything after the end of the image counts as metadata. Raises
+    ValueError if the stream is not a JPEG.
+    """
+    if _read_marker(src) != SOI:
+        raise ValueError("Not a JPEG file")
+
+    marker = _read_marker(src)
+    while marker != SOS:
+        if marker == EOI:
+            # No image data at all; anything after it would be dropped
+            return bool(src.read(1))
+        if marker in STANDALONE_MARKERS:
+            marker = _read_marker(src)
+            continue
+        length = int.from_bytes(_read_exact(src, 2), "big")
+        if length < 2:
+            raise ValueError("Invalid JPEG segment length")
+        if marker in drop_markers:
+            if not (keep_icc and marker == APP2):
+                return True
+            signature = src.read(min(len(ICC_SIGNATURE), length - 2))
+            if signature != ICC_SIGNATURE:
+                return True
+            src.seek(length - 2 - len(signature), 1)
+        else:
+            src.seek(length - 2, 1)
+        marker = _read_marker(src)
+
+    # Search from the end of the first scan header
+    length = int.from_bytes(_read_exact(src, 2), "big")
+    scan_start = src.seek(length - 2, 1)
+    end = src.seek(0, 2)
+    eoi_position = end - 2
+    if eoi_position < scan_start:
+        raise ValueError("Unexpected end of JPEG data")
+    src.seek(eoi_position)
+    if src.read(2) != b"\xff\xd9":
+        return True
+
+    # Scan data never contains these byte pairs, so any match is a real marker
+    pattern = _marker_pattern(set(drop_markers) | {SOI, EOI})
+    src.seek(scan_start)
+    tail = b""
+    base = scan_start
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            return False
+        data = tail + chunk
+        for match in pattern.finditer(data):
+            if base + match.start() != eoi_position:
+                return True
+        # Keep the last byte, in case a marker straddles two chunks
+        base += len(data) - 1
+        tail = data[-1:]
+
+
+def strip_jpeg(src, dst, drop_markers=DEFAULT_JPEG_DROP, keep_icc=True):
+    """Copy a JPEG from src to dst without its metadata segments.
+
+    src and dst are binary file objects; src must be seekable. Segments whose
+    marker is in drop_markers are skipped, except ICC profiles when keep_icc
+    is set. Anything after EOI (e.g. MPF preview images) is dropped too.
+    Returns the number of segments removed. Raises ValueError if the stream
+    is not a well-formed JPEG.
+    """
+    if _read_marker(src) != SOI:
+        raise ValueError("Not a JPEG file")
+    dst.write(b"\xff\xd8")
+
+    removed = 0
+    marker = _read_marker(src)
+    while True:
+        if marker == EOI:
+            dst.write(b"\xff\xd9")
+            return removed
+
+        if marker in STANDALONE_MARKERS:
+            dst.write(bytes((0xFF, marker)))
+            marker = _read_marker(src)
+            continue
+
+        length_bytes = _read_exact(src, 2)
+        length = int.from_bytes(length_bytes, "big")
+        if length < 2:
+            raise ValueError("Invalid JPEG segment length")
+        payload = _read_exact(src, length - 2)
+
+        drop = marker in drop_markers
+        if drop and keep_icc and marker == APP2 and payload.startswith(ICC_SIGNATURE):
+            drop = False
+
+        if drop:
+            removed += 1
+        else:
+            dst.write(bytes((0xFF, marker)))
+            dst.write(length_bytes)
+            dst.write(payload)
+
+        if marker == SOS:
+            # Scan data follows the SOS header and ends at the next marker
+            marker = _copy_entropy_data(src, dst)
+        else:
+            marker = _read_marker(src)
@@ -0,0 +1,248 @@
+"""Band-wise re-encoding of images too large to decode in one piece.
+
+Images whose pixels are stored uncompressed (BMP, raw TIFF strips) are
+read a band of rows at a time straight from the file and written to a
+fresh BMP or baseline TIFF the same way, so peak memory is set by the
+memory limit rather than by the image dimensions. As with the full
+re-encode, only the pixels (and palette) are written; none of the
+source's headers or tags come along.
+"""
+
+import os
+import struct
+
+from PIL import Image
+
+from .output import atomic_output
+
+# Output rawmode and bits per pixel by image mode
+BMP_MODES = {"1": ("1", 1), "L": ("L", 8), "P": ("P", 8), "RGB": ("BGR", 24), "RGBA": ("BGRA", 32)}
+
+# Output rawmode, bits per sample, samples per pixel and photometric interpretation
+TIFF_MODES = {
+    "1": ("1", 1, 1, 1),
+    "L": ("L", 8, 1, 1),
+    "P": ("P", 8, 1, 3),
+    "RGB": ("RGB", 8, 3, 2),
+    "RGBA": ("RGBA", 8, 4, 2),
+    "CMYK": ("CMYK", 8, 4, 5),
+}
+
+# Rows of the output TIFF are grouped into strips of about this size
+TIFF_STRIP_SIZE = 1024 * 1024
+
+# Pixels per metre written to BMP headers (96 dpi, as PIL does)
+BMP_PPM = 3780
+
+
+def decoded_size(img):
+    """Bytes PIL needs to hold img's pixels once decoded"""
+    if len(img.getbands()) > 1 or img.mode in ("I", "F"):
+        # Multi-band images are stored four bytes per pixel
+        pixel = 4
+    elif img.mode.startswith("I;16"):
+        pixel = 2
+    else:
+        pixel = 1
+    return img.width * img.height * pixel
+
+
+def _packed_row_size(mode, rawmode, width):
+    """Bytes in one tightly packed row, or None if rawmode can't be packed"""
+    try:
+        return len(Image.new(mode, (width, 1)).tobytes("raw", rawmode))
+    except (ValueError, SystemError):
+        return None
+
+
+def raw_tiles(img):
+    """Describe where img's rows are stored, if they are stored uncompressed.
+
+    Returns a list of (top, bottom, offset, rawmode, stride, step) with
+    one entry per tile, or None if any tile is compressed or narrower than
+    the image.
+    """
+    tiles = []
+    for tile in img.tile:
+        name, extents, offset, args = tile[:4]
+        if name != "raw" or extents[0] != 0 or extents[2] != img.width:
+            return None
+        if isinstance(args, str):
+            args = (args,)
+        rawmode, stride, step = (tuple(args) + (0, 1))[:3]
+        if not stride:
+            stride = _packed_row_size(img.mode, rawmode, img.width)
+            if stride is None:
+                return None
+        tiles.append((extents[1], extents[3], offset, rawmode, stride, step))
+    return tiles or None
+
+
+def _palette(img):
+    """img's palette as a flat RGB list, read without decoding any pixels"""
+    palette = Image.new("P", (1, 1))
+    palette.putpalette(img.palette.palette, img.palette.rawmode or img.palette.mode)
+    return palette.getpalette()
+
+
+class _BmpWriter:
+    """Writes a bottom-up BMP band by band, starting from the bottom"""
+
+    bottom_up = True
+
+    def __init__(self, dst, img):
+        self.dst = dst
+        self.rawmode, bits = BMP_MODES[img.mode]
+        self.stride = ((img.width * bits + 31) >> 3) & ~3
+
+        if img.mode == "1":
+            palette = b"\x00\x00\x00\x00\xff\xff\xff\x00"
+        elif img.mode == "L":
+            palette = b"".join(bytes((i, i, i, 0)) for i in range(256))
+        elif img.mode == "P":
+            rgb = _palette(img)
+            palette = b"".join(bytes((rgb[i + 2], rgb[i + 1], rgb[i], 0)) for i in range(0, len(rgb), 3))
+        else:
+            palette = b""
+
+        offset = 14 + 40 + len(palette)
+        image_size = self.stride * img.height
+        if offset + image_size > 0xFFFFFFFF:
+            raise ValueError("Image too large for a BMP file")
+        dst.write(b"BM" + struct.pack("<IHHI", offset + image_size, 0, 0, offset))
+        dst.write(struct.pack("<IiiHHIIiiII", 40, img.width, img.height, 1, bits, 0, image_size,
+                              BMP_PPM, BMP_PPM, len(palette) // 4, len(palette) // 4))
+        dst.write(palette)
+
+    def write(self, band):
+        """Write a band, its bottom row first"""
+        self.dst.write(band.tobytes("raw", self.rawmode, self.stride, -1))
+
+    def finish(self):
+        pass
+
+
+class _TiffWriter:
+    """Writes an uncompressed little-endian baseline TIFF band by band"""
+
+    bottom_up = False
+
+    def __init__(self, dst, img):
+        self.dst = dst
+        self.img = img
+        self.rawmode, self.bits, self.samples, self.photometric = TIFF_MODES[img.mode]
+        self.row_size = (img.width * self.bits * self.samples + 7) // 8
+        if 8 + self.row_size * img.height + 64 * 1024 > 0xFFFFFFFF:
+            raise ValueError("Image too large for a TIFF file")
+        # The IFD offset is filled in once the pixels are written
+        dst.write(b"II*\x00\x00\x00\x00\x00")
+
+    def write(self, band):
+        """Write a band, its top row first"""
+        self.dst.write(band.tobytes("raw", self.rawmode))
+
+    def finish(self):
+        """Write the IFD describing the pixels and point the header at it"""
+        img = self.img
+        rows_per_strip = max(1, TIFF_STRIP_SIZE // self.row_size)
+        strip_size = rows_per_strip * self.row_size
+        data_size = self.row_size * img.height
+        offsets = list(range(8, 8 + data_size, strip_size))
+        counts = [min(strip_size, 8 + data_size - offset) for offset in offsets]
+
+        # (tag, type, values); type 3 is SHORT and 4 is LONG
+        entries = [
+            (256, 4, [img.width]),
+            (257, 4, [img.height]),
+            (258, 3, [self.bits] * self.samples),
+            (259, 3, [1]),
+            (262, 3, [self.photometric]),
+            (273, 4, offsets),
+            (277, 3, [self.samples]),
+            (278, 4, [rows_per_strip]),
+            (279, 4, counts),
+            (284, 3, [1]),
+        ]
+        if img.mode == "P":
+            rgb = (_palette(img) + [0] * 768)[:768]
+            entries.append((320, 3, [value * 257 for channel in range(3) for value in rgb[channel::3]]))
+        elif img.mode == "RGBA":
+            # Unassociated alpha
+            entries.append((338, 3, [2]))
+
+        ifd_offset = 8 + data_size + (data_size & 1)
+        if data_size & 1:
+            self.dst.write(b"\x00")
+        # Values that don't fit in an entry follow the IFD
+        data_offset = ifd_offset + 2 + 12 * len(entries) + 4
+        ifd = [struct.pack("<H", len(entries))]
+        extra = []
+        for tag, field_type, values in entries:
+            packed = struct.pack(f"<{len(values)}{'H' if field_type == 3 else 'I'}", *values)
+            if len(packed) <= 4:
+                value = packed.ljust(4, b"\x00")
+            else:
+                value = struct.pack("<I", data_offset)
+                extra.append(packed)
+                data_offset += len(packed)
+            ifd.append(struct.pack("<HHI", tag, field_type, len(values)) + value)
+        ifd.append(b"\x00\x00\x00\x00")
+        self.dst.write(b"".join(ifd + extra))
+        self.dst.seek(4)
+        self.dst.write(struct.pack("<I", ifd_offset))
+
+
+# Band writers by output extension
+WRITERS = {".bmp": (_BmpWriter, BMP_MODES), ".tif": (_TiffWriter, TIFF_MODES), ".tiff": (_TiffWriter, TIFF_MODES)}
+
+
+def can_reencode_in_bands(img, output_path):
+    """Whether reencode_in_bands() supports img and the format of output_path"""
+    writer = WRITERS.get(os.path.splitext(output_path.lower())[1])
+    return writer is not None and img.mode in writer[1] and raw_tiles(img) is not None
+
+
+def _bands(img, memory_limit):
+    """Split img's tiles into (tile, top, bottom) bands that fit memory_limit"""
+    # Per row: the bytes read, the decoded band and the encoded output
+    row_cost = max(tile[4] for tile in raw_tiles(img)) + 2 * decoded_size(img) // max(img.height, 1)
+    rows = max(1, memory_limit // 2 // max(row_cost, 1))
+    bands = []
+    for tile in raw_tiles(img):
+        for top in range(tile[0], tile[1], rows):
+            bands.append((tile, top, min(top + rows, tile[1])))
+    return bands
+
+
+def _read_band(src, img, tile, top, bottom):
+    """Decode rows top to bottom of a raw tile into an image"""
+    tile_top, tile_bottom, offset, rawmode, stride, step = tile
+    # Tiles stored bottom-up (step -1) hold their last row first
+    first = top - tile_top if step >= 0 else tile_bottom - bottom
+    src.seek(offset + first * stride)
+    size = (bottom - top) * stride
+    data = src.read(size)
+    if len(data) != size:
+        raise ValueError("Unexpected end of image data")
+    return Image.frombuffer(img.mode, (img.width, bottom - top), data, "raw", rawmode, stride, step)
+
+
+def reencode_in_bands(img, file_path, output_path, spans, memory_limit):
+    """Re-encode img, opened from file_path, a band of rows at a time.
+
+    Each band holds at most about memory_limit bytes. img must pass
+    can_reencode_in_bands(); the output format follows output_path.
+    """
+    writer_class, _ = WRITERS[os.path.splitext(output_path.lower())[1]]
+    bands = _bands(img, memory_limit)
+    with atomic_output(output_path, spans) as temp_path:
+        with open(file_path, 'rb') as src, open(temp_path, 'wb') as dst:
+            writer = writer_class(dst, img)
+            for tile, top, bottom in reversed(bands) if writer.bottom_up else bands:
+                with spans.stage("decode"):
+                    band = _read_band(src, img, tile, top, bottom)
+                with spans.stage("encode"):
+                    writer.write(band)
+                band.close()
+            with spans.stage("encode"):
+                writer.finish()
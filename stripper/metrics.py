@@ -0,0 +1,226 @@
+"""Per-file stage timings and per-batch metrics.
+
+Handlers time their stages (decode, encode, FFmpeg, the final rename, ...)
+into a Spans object, which travels back with the result dict, so timings
+from worker processes arrive the same way as everything else. BatchMetrics
+folds results into counters and fixed-bucket histograms as they arrive;
+the aggregate can be written as JSON lines, as a Prometheus textfile for
+node_exporter's textfile collector, or summarised for people.
+"""
+
+import json
+import os
+import time
+from bisect import bisect_left
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, 300.0)
+
+METRIC_PREFIX = "metadata_stripper"
+
+
+def _format_seconds(seconds):
+    """Seconds for people: milliseconds below one second"""
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.1f}s"
+
+
+def file_sizes(source_file, output_file=None):
+    """(bytes in, bytes out) of a finished file, None where a file can't be read"""
+    sizes = []
+    for path in (source_file, output_file):
+        try:
+            sizes.append(os.path.getsize(path) if path else None)
+        except OSError:
+            sizes.append(None)
+    return tuple(sizes)
+
+
+def make_result(source_file, output_file, status, error=None, duration=None,
+                handler=None, stages=None, bytes_in=None, bytes_out=None):
+    """Build the result dict reported for every processed file, by every handler"""
+    return {
+        "source_file": source_file,
+        "output_file": output_file,
+        "status": status,
+        "error": error,
+        "duration": duration,
+        "handler": handler,
+        "stages": stages or {},
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+    }
+
+
+class Spans:
+    """Stage timings of one file, plus which handler processed it"""
+
+    def __init__(self):
+        self.handler = None
+        self.stages = {}
+
+    def stage(self, name):
+        """Context manager that adds the time spent inside it to stage name"""
+        return _Stage(self, name)
+
+    def add(self, name, seconds):
+        """Add seconds to stage name"""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+
+class _Stage:
+    """Timer used by Spans.stage; a plain class keeps the hot path cheap"""
+
+    __slots__ = ("spans", "name", "start")
+
+    def __init__(self, spans, name):
+        self.spans = spans
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.spans.add(self.name, time.perf_counter() - self.start)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Record one value"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class BatchMetrics:
+    """Counters and histograms for one batch.
+
+    Feed every result dict to observe(); time spent outside the handlers
+    (e.g. updating the UI) can be added with add_stage(). If jsonl_path is
+    given, a line per file is appended to it as results arrive and a batch
+    summary line is written by finish().
+    """
+
+    def __init__(self, jsonl_path=None):
+        self.start = time.perf_counter()
+        self.elapsed = None
+        self.files = {}  # Results by outcome: processed, skipped, cached
+        self.handlers = {}  # Files by handler
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.stages = {}  # Stage name -> Histogram
+        self.jsonl = open(jsonl_path, 'a') if jsonl_path else None
+
+    def add_stage(self, name, seconds):
+        """Record time spent in a stage"""
+        histogram = self.stages.get(name)
+        if histogram is None:
+            histogram = self.stages[name] = Histogram()
+        histogram.observe(seconds)
+
+    def observe(self, result):
+        """Fold one result dict into the batch totals"""
+        if result["status"] == "Cached":
+            outcome = "cached"
+        elif result["error"] is None:
+            outcome = "processed"
+        else:
+            outcome = "skipped"
+        self.files[outcome] = self.files.get(outcome, 0) + 1
+
+        handler = result.get("handler")
+        if handler:
+            self.handlers[handler] = self.handlers.get(handler, 0) + 1
+        self.bytes_in += result.get("bytes_in") or 0
+        self.bytes_out += result.get("bytes_out") or 0
+        for name, seconds in (result.get("stages") or {}).items():
+            self.add_stage(name, seconds)
+
+        if self.jsonl is not None:
+            record = {key: result.get(key) for key in
+                      ("source_file", "status", "handler", "duration", "bytes_in", "bytes_out", "stages")}
+            self.jsonl.write(json.dumps(dict(record, event="file")) + "\n")
+
+    def finish(self):
+        """Stop the batch clock and close the JSON lines file"""
+        self.elapsed = time.perf_counter() - self.start
+        if self.jsonl is not None:
+            self.jsonl.write(json.dumps(dict(self.summary(), event="batch")) + "\n")
+            self.jsonl.close()
+            self.jsonl = None
+
+    def summary(self):
+        """The batch aggregate as a JSON-friendly dict"""
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.start
+        return {
+            "elapsed": round(elapsed, 3),
+            "files": dict(self.files),
+            "handlers": dict(self.handlers),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "stages": {
+                name: {"count": histogram.count, "seconds": round(histogram.sum, 4)}
+                for name, histogram in sorted(self.stages.items())
+            },
+        }
+
+    def describe(self):
+        """One line saying where the time went, largest stage first"""
+        total = sum(histogram.sum for histogram in self.stages.values())
+        if not total:
+            return ""
+        parts = [
+            f"{name} {_format_seconds(histogram.sum)} ({histogram.sum / total:.0%})"
+            for name, histogram in sorted(self.stages.items(), key=lambda item: item[1].sum, reverse=True)
+        ]
+        return "Time by stage: " + ", ".join(parts)
+
+    def prometheus(self):
+        """The batch aggregate in the Prometheus text exposition format"""
+        summary = self.summary()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{METRIC_PREFIX}_{name}{labels} {value}")
+
+        metric("last_batch_timestamp_seconds", "gauge", "When the last batch finished.",
+               [("", round(time.time(), 3))])
+        metric("last_batch_duration_seconds", "gauge", "Wall time of the last batch.",
+               [("", summary["elapsed"])])
+        metric("last_batch_files", "gauge", "Files in the last batch by outcome.",
+               [(f'{{outcome="{outcome}"}}', count) for outcome, count in sorted(self.files.items())])
+        metric("last_batch_handler_files", "gauge", "Files in the last batch by handler.",
+               [(f'{{handler="{handler}"}}', count) for handler, count in sorted(self.handlers.items())])
+        metric("last_batch_bytes", "gauge", "Bytes read and written by the last batch.",
+               [('{direction="in"}', self.bytes_in), ('{direction="out"}', self.bytes_out)])
+
+        samples = []
+        for name, histogram in sorted(self.stages.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                samples.append((f'_bucket{{stage="{name}",le="{bound}"}}', cumulative))
+            samples.append((f'_bucket{{stage="{name}",le="+Inf"}}', histogram.count))
+            samples.append((f'_sum{{stage="{name}"}}', round(histogram.sum, 6)))
+            samples.append((f'_count{{stage="{name}"}}', histogram.count))
+        metric("last_batch_stage_seconds", "histogram", "Per-file time spent in each stage in the last batch.",
+               samples)
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write the textfile atomically, as the textfile collector requires"""
+        # Not ending in .prom, so the collector never reads it half-written
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(self.prometheus())
+        os.replace(temp_path, path)
@@ -0,0 +1,304 @@
+"""Native MP4/MOV metadata stripping at the box (atom) level.
+
+The top-level boxes are walked without reading their payloads. Metadata
+boxes (udta, meta, iTunes-style ©xyz atoms and XMP uuid boxes) are dropped
+wherever they appear in the file or in the moov tree, and the creation and
+modification times in mvhd/tkhd/mdhd are zeroed. Only moov is read into
+memory; media data is copied with kernel copy primitives, so even multi-GB
+clips are written at disk speed without FFmpeg. When moov shrinks ahead of
+the media data, the stco/co64 chunk offsets are moved back to match.
+mp4_has_metadata() checks for all of this from the box headers and moov.
+"""
+
+import struct
+from bisect import bisect_right
+
+from .fastcopy import copy_range
+
+MP4_EXTENSIONS = ('.mp4', '.mov')
+
+# Boxes that hold nothing but metadata
+METADATA_BOXES = frozenset([b"udta", b"meta"])
+
+# uuid boxes carrying XMP packets
+XMP_UUID = bytes.fromhex("BE7ACFCB97A942E89C71999491E3AFAC")
+
+# moov children that contain the sample tables, and so must be rewritten
+CONTAINER_BOXES = frozenset([b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"mvex"])
+
+# Boxes an MP4 or QuickTime file can start with
+FIRST_BOXES = frozenset([b"ftyp", b"wide", b"free", b"skip", b"pnot", b"mdat", b"moov"])
+
+# Boxes whose version 0/1 payload starts with creation and modification times
+TIMESTAMP_BOXES = frozenset([b"mvhd", b"tkhd", b"mdhd"])
+
+
+def _read_exact(src, size):
+    """Read exactly size bytes or fail on a truncated stream"""
+    data = src.read(size)
+    if len(data) != size:
+        raise ValueError("Unexpected end of MP4 data")
+    return data
+
+
+def _read_box_header(src, offset, end):
+    """Read the box header at offset and return (type, header size, box size)"""
+    if end - offset < 8:
+        raise ValueError("Truncated MP4 box header")
+    src.seek(offset)
+    size, box_type = struct.unpack(">I4s", _read_exact(src, 8))
+    header_size = 8
+    if size == 1:
+        size = struct.unpack(">Q", _read_exact(src, 8))[0]
+        header_size = 16
+    elif size == 0:
+        # Extends to the end of the file
+        size = end - offset
+    if size < header_size or offset + size > end:
+        raise ValueError("Invalid MP4 box size")
+    return box_type, header_size, size
+
+
+def _iter_boxes(data, start, end):
+    """Yield (type, offset, header size, size) for the boxes in data[start:end]"""
+    offset = start
+    while offset < end:
+        if end - offset < 8:
+            # Some muxers pad containers with a 32-bit zero terminator
+            if data[offset:end].strip(b"\x00"):
+                raise ValueError("Truncated MP4 box header")
+            return
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header_size = 8
+        if size == 1:
+            if end - offset < 16:
+                raise ValueError("Truncated MP4 box header")
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise ValueError("Invalid MP4 box size")
+        yield box_type, offset, header_size, size
+        offset += size
+
+
+def _is_metadata(box_type, payload_start):
+    """Check whether a box only carries metadata"""
+    if box_type in METADATA_BOXES or box_type[0] == 0xA9:
+        return True
+    return box_type == b"uuid" and payload_start[:16] == XMP_UUID
+
+
+def _box_header(box_type, payload_size):
+    """Header of a box around payload_size bytes, with a 64-bit size only when needed"""
+    size = payload_size + 8
+    if size <= 0xFFFFFFFF:
+        return struct.pack(">I4s", size, box_type)
+    return struct.pack(">I4sQ", 1, box_type, size + 8)
+
+
+def _clear_times(box, header_size):
+    """Zero the creation and modification times of an mvhd/tkhd/mdhd box"""
+    box = bytearray(box)
+    version = box[header_size] if len(box) > header_size else None
+    field_size = 8 if version == 1 else 4
+    end = header_size + 4 + 2 * field_size
+    if version in (0, 1) and len(box) >= end:
+        box[header_size + 4:end] = bytes(2 * field_size)
+    return bytes(box)
+
+
+def _remap_offsets(box, header_size, entry_format, remap):
+    """Rewrite the chunk offset table of an stco (>I) or co64 (>Q) box"""
+    count_at = header_size + 4
+    if len(box) < count_at + 4:
+        raise ValueError("Invalid MP4 chunk offset table")
+    count = struct.unpack_from(">I", box, count_at)[0]
+    table_format = ">%d%s" % (count, entry_format)
+    if len(box) < count_at + 4 + struct.calcsize(table_format):
+        raise ValueError("Invalid MP4 chunk offset table")
+    offsets = struct.unpack_from(table_format, box, count_at + 4)
+    box = bytearray(box)
+    struct.pack_into(table_format, box, count_at + 4, *[remap(offset) for offset in offsets])
+    return bytes(box)
+
+
+def _rewrite_container(data, start, end, parts, tables):
+    """Append the boxes in data[start:end], without metadata, to parts; return (size, removed).
+
+    Chunk offset tables are appended unchanged and listed in tables as
+    (index in parts, header size, entry format), to be remapped once the
+    size of the new moov is known; remapping never changes their size.
+    """
+    written = 0
+    removed = 0
+    for box_type, offset, header_size, size in _iter_boxes(data, start, end):
+        payload_start = offset + header_size
+        if _is_metadata(box_type, data[payload_start:payload_start + 16]):
+            removed += 1
+            continue
+        if box_type in CONTAINER_BOXES:
+            # The header is filled in once the size of what is kept is known
+            header_index = len(parts)
+            parts.append(None)
+            payload_size, count = _rewrite_container(data, payload_start, offset + size, parts, tables)
+            parts[header_index] = _box_header(box_type, payload_size)
+            written += len(parts[header_index]) + payload_size
+            removed += count
+            continue
+        box = data[offset:offset + size]
+        if box_type in TIMESTAMP_BOXES:
+            box = _clear_times(box, header_size)
+        elif box_type == b"stco":
+            tables.append((len(parts), header_size, "I"))
+        elif box_type == b"co64":
+            tables.append((len(parts), header_size, "Q"))
+        parts.append(box)
+        written += len(box)
+    return written, removed
+
+
+def _offset_mapper(removed_ranges):
+    """Map source file offsets to output offsets, given the (start, length) ranges left out"""
+    removed_ranges = sorted(removed_ranges)
+    starts = [start for start, _ in removed_ranges]
+    shifts = []
+    total = 0
+    for _, length in removed_ranges:
+        total += length
+        shifts.append(total)
+
+    def remap(offset):
+        index = bisect_right(starts, offset)
+        if index == 0:
+            return offset
+        start, length = removed_ranges[index - 1]
+        if offset < start + length:
+            raise ValueError("MP4 chunk offset points into removed data")
+        return offset - shifts[index - 1]
+
+    return remap
+
+
+def _container_has_metadata(data, start, end):
+    """Check the boxes in data[start:end] for anything _rewrite_container would change"""
+    for box_type, offset, header_size, size in _iter_boxes(data, start, end):
+        payload_start = offset + header_size
+        if _is_metadata(box_type, data[payload_start:payload_start + 16]):
+            return True
+        box = data[offset:offset + size]
+        if box_type in CONTAINER_BOXES:
+            if _container_has_metadata(data, payload_start, offset + size):
+                return True
+        elif box_type in TIMESTAMP_BOXES and _clear_times(box, header_size) != box:
+            return True
+    return False
+
+
+def _iter_top_level(src, file_size):
+    """Yield (type, offset, header size, size) for the top-level boxes, reading headers only"""
+    offset = 0
+    while offset < file_size:
+        box_type, header_size, size = _read_box_header(src, offset, file_size)
+        if box_type == b"moof":
+            raise ValueError("Fragmented MP4 files are not supported")
+        yield box_type, offset, header_size, size
+        offset += size
+
+
+def _read_top_level(src):
+    """Walk the top level of src; return (boxes, moov data).
+
+    boxes holds (type, offset, header size, size, is metadata) for every
+    top-level box; only moov is read in full. Raises ValueError if the file
+    is not a well-formed, non-fragmented MP4/MOV.
+    """
+    file_size = src.seek(0, 2)
+    boxes = []
+    moov = None
+    for box_type, offset, header_size, size in _iter_top_level(src, file_size):
+        metadata = False
+        if box_type == b"moov":
+            if moov is not None:
+                raise ValueError("Not an MP4/MOV file")
+            src.seek(offset)
+            moov = _read_exact(src, size)
+        else:
+            src.seek(offset + header_size)
+            metadata = _is_metadata(box_type, src.read(16))
+        boxes.append((box_type, offset, header_size, size, metadata))
+
+    if not boxes or boxes[0][0] not in FIRST_BOXES or moov is None:
+        raise ValueError("Not an MP4/MOV file")
+    return boxes, moov
+
+
+def mp4_has_metadata(src):
+    """Check whether strip_mp4 would change src.
+
+    Top-level boxes are checked by their headers; only moov is read. Raises
+    ValueError if the file is not a well-formed, non-fragmented MP4/MOV.
+    """
+    boxes, moov = _read_top_level(src)
+    if any(metadata for _, _, _, _, metadata in boxes):
+        return True
+    moov_header_size = next(header_size for box_type, _, header_size, _, _ in boxes if box_type == b"moov")
+    return _container_has_metadata(moov, moov_header_size, len(moov))
+
+
+def strip_mp4(src, dst, on_progress=None):
+    """Copy an MP4/MOV file from src to dst without its metadata boxes.
+
+    src and dst are binary file objects backed by real files; src must be
+    seekable. on_progress, if given, receives the fraction of the file
+    written so far. Returns the number of boxes removed. Raises ValueError
+    if the file is not a well-formed, non-fragmented MP4/MOV.
+    """
+    boxes, moov = _read_top_level(src)
+
+    # Decide what goes, then rebuild moov with the offsets of what stays
+    kept = []
+    removed_ranges = []
+    removed = 0
+    for box_type, offset, header_size, size, metadata in boxes:
+        if box_type == b"moov":
+            moov_offset, moov_header_size, moov_size = offset, header_size, size
+        if metadata:
+            removed_ranges.append((offset, size))
+            removed += 1
+        else:
+            kept.append((box_type, offset, size))
+
+    parts = []
+    tables = []
+    payload_size, moov_removed = _rewrite_container(moov, moov_header_size, moov_size, parts, tables)
+    removed += moov_removed
+    header = _box_header(b"moov", payload_size)
+    new_moov_size = len(header) + payload_size
+    if new_moov_size != moov_size:
+        removed_ranges.append((moov_offset, moov_size - new_moov_size))
+    if removed_ranges:
+        remap = _offset_mapper(removed_ranges)
+        for index, table_header_size, entry_format in tables:
+            parts[index] = _remap_offsets(parts[index], table_header_size, entry_format, remap)
+    new_moov = header + b"".join(parts)
+
+    output_size = sum(size for _, _, size in kept) - moov_size + len(new_moov)
+    written = 0
+    for box_type, offset, size in kept:
+        if box_type == b"moov":
+            dst.write(new_moov)
+            written += len(new_moov)
+            continue
+        if on_progress and output_size:
+            def on_copied(copied, base=written):
+                on_progress(min((base + copied) / output_size, 1.0))
+        else:
+            on_copied = None
+        copy_range(src, dst, offset, size, on_copied)
+        written += size
+
+    if on_progress:
+        on_progress(1.0)
+    return removed
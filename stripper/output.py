@@ -0,0 +1,161 @@
+"""Atomic output files shared by every handler.
+
+Handlers never write to an output path directly. They write to a temporary
+file in the same directory, which is renamed over the output only once it
+is complete, so an interrupted write can never leave a truncated file - or
+a truncated original when cleaning in place. The temporary name keeps the
+output's extension, so tools that pick a format from it (PIL, FFmpeg) still
+work. When an existing file is replaced, the new data is flushed to disk
+before the rename; other outputs can be flushed in groups with OutputSyncer.
+"""
+
+import fnmatch
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Marks temporary files so leftovers from a crash can be found again
+PARTIAL_SUFFIX = ".partial"
+
+# Outputs flushed together by OutputSyncer
+SYNC_GROUP_SIZE = 64
+
+# New outputs get the usual permissions rather than mkstemp's private 0600
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _fsync_dir(directory):
+    """Flush a directory entry change (rename) to disk, where the platform allows it"""
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Not supported for directories here (e.g. Windows)
+        pass
+    finally:
+        os.close(fd)
+
+
+def _fsync_file(path):
+    """Flush a file's data to disk"""
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+@contextmanager
+def atomic_output(output_path, spans=None):
+    """Yield a temporary path to write output_path's content to.
+
+    If the block finishes, the temporary file is renamed over output_path;
+    if it raises, the temporary file is removed and output_path is left as
+    it was. The rename (and any fsync) is timed as the "commit" stage of
+    spans, if given.
+    """
+    directory, name = os.path.split(output_path)
+    extension = os.path.splitext(name)[1]
+    fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=PARTIAL_SUFFIX + extension, dir=directory or ".")
+    os.close(fd)
+    try:
+        yield temp_path
+
+        commit_start = time.perf_counter()
+        replacing = os.path.exists(output_path)
+        if replacing:
+            # Keep the permissions of the file being replaced
+            shutil.copymode(output_path, temp_path)
+            # Never swap an original for data that is still only in the page cache
+            _fsync_file(temp_path)
+        else:
+            os.chmod(temp_path, 0o666 & ~_UMASK)
+        os.replace(temp_path, output_path)
+        if replacing:
+            _fsync_dir(directory)
+        if spans is not None:
+            spans.add("commit", time.perf_counter() - commit_start)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def link_output(source_path, output_path):
+    """Make output_path a hard link to source_path, replacing it atomically.
+
+    Returns False if the two can't be linked (different filesystems, or no
+    hard link support), in which case nothing has changed.
+    """
+    directory, name = os.path.split(output_path)
+    extension = os.path.splitext(name)[1]
+    while True:
+        temp_path = os.path.join(directory, f".{name}.{os.urandom(4).hex()}{PARTIAL_SUFFIX}{extension}")
+        try:
+            os.link(source_path, temp_path)
+            break
+        except FileExistsError:
+            continue
+        except OSError:
+            return False
+    try:
+        os.replace(temp_path, output_path)
+    finally:
+        # rename() leaves both names alone when they are already links to the same file
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+    return True
+
+
+def remove_partials(output_path):
+    """Delete temporary files a crashed write to output_path left behind"""
+    directory, name = os.path.split(output_path)
+    extension = os.path.splitext(name)[1]
+    pattern = f".{name}.*{PARTIAL_SUFFIX}{extension}"
+    try:
+        entries = os.listdir(directory or ".")
+    except OSError:
+        return
+    for entry in entries:
+        if fnmatch.fnmatchcase(entry, pattern):
+            try:
+                os.remove(os.path.join(directory, entry))
+            except OSError:
+                pass
+
+
+class OutputSyncer:
+    """Flushes finished outputs to disk in groups.
+
+    Each output's data is synced, then each directory they were renamed
+    into is synced once per group instead of once per file.
+    """
+
+    def __init__(self, group_size=SYNC_GROUP_SIZE):
+        self.group_size = group_size
+        self.pending = []
+
+    def add(self, path):
+        """Queue an output; flushes the group once it is full"""
+        self.pending.append(path)
+        if len(self.pending) >= self.group_size:
+            self.flush()
+
+    def flush(self):
+        """Sync every queued output and its directory"""
+        directories = set()
+        for path in self.pending:
+            try:
+                _fsync_file(path)
+            except OSError:
+                # Removed or unreadable since; nothing to make durable
+                continue
+            directories.add(os.path.dirname(path))
+        for directory in directories:
+            _fsync_dir(directory)
+        self.pending = []
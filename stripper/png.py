@@ -0,0 +1,92 @@
+"""Streaming PNG metadata stripping at the chunk level.
+
+Chunks are copied through in fixed-size pieces with their original CRCs, so
+IDAT is never decompressed and memory use does not depend on the file size.
+Only the metadata chunks listed in drop_chunks are left out.
+png_has_metadata() checks for them by reading the chunk headers alone.
+"""
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Text, EXIF, timestamp and embedded ICC profile chunks
+DEFAULT_PNG_DROP = frozenset([b"tEXt", b"zTXt", b"iTXt", b"eXIf", b"tIME", b"iCCP"])
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _read_exact(src, size):
+    """Read exactly size bytes or fail on a truncated stream"""
+    data = src.read(size)
+    if len(data) != size:
+        raise ValueError("Unexpected end of PNG data")
+    return data
+
+
+def _copy_bytes(src, dst, size):
+    """Copy size bytes from src to dst in bounded pieces"""
+    while size > 0:
+        data = src.read(min(size, CHUNK_SIZE))
+        if not data:
+            raise ValueError("Unexpected end of PNG data")
+        dst.write(data)
+        size -= len(data)
+
+
+def png_has_metadata(src, drop_chunks=DEFAULT_PNG_DROP):
+    """Check whether strip_png would remove anything from src.
+
+    Only the chunk headers are read; the chunk data is skipped. Data after
+    IEND counts as metadata, as strip_png drops it. Raises ValueError if
+    the stream is not a PNG.
+    """
+    if src.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+        raise ValueError("Not a PNG file")
+
+    while True:
+        header = _read_exact(src, 8)
+        length = int.from_bytes(header[:4], "big")
+        chunk_type = header[4:]
+        if length > 0x7FFFFFFF:
+            raise ValueError("Invalid PNG chunk length")
+        if chunk_type[0] & 0x20 and chunk_type in drop_chunks:
+            return True
+        src.seek(length + 4, 1)
+        if chunk_type == b"IEND":
+            end = src.tell()
+            return src.seek(0, 2) != end
+
+
+def strip_png(src, dst, drop_chunks=DEFAULT_PNG_DROP):
+    """Copy a PNG from src to dst without the chunk types in drop_chunks.
+
+    src and dst are binary file objects; src must be seekable. Critical
+    chunks (IHDR, PLTE, IDAT, IEND) are always kept. Anything after IEND is
+    dropped. Returns the number of chunks removed. Raises ValueError if the
+    stream is not a well-formed PNG.
+    """
+    if src.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+        raise ValueError("Not a PNG file")
+    dst.write(PNG_SIGNATURE)
+
+    removed = 0
+    while True:
+        header = _read_exact(src, 8)
+        length = int.from_bytes(header[:4], "big")
+        chunk_type = header[4:]
+        if length > 0x7FFFFFFF:
+            raise ValueError("Invalid PNG chunk length")
+
+        # Bit 5 of the first byte marks ancillary chunks; never drop critical ones
+        ancillary = chunk_type[0] & 0x20
+        if ancillary and chunk_type in drop_chunks:
+            # Skip the data and its CRC
+            src.seek(length + 4, 1)
+            removed += 1
+            continue
+
+        # Kept chunks are unchanged, so their CRCs can be copied as they are
+        dst.write(header)
+        _copy_bytes(src, dst, length + 4)
+
+        if chunk_type == b"IEND":
+            return removed
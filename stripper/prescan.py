@@ -0,0 +1,67 @@
+"""Header-only check for files that carry no metadata at all.
+
+Screenshots, exports and files cleaned by an earlier run often have
+nothing to strip. has_metadata() answers from the container structure
+(JPEG segments, PNG, GIF and WebP chunks, TIFF tags, MP4 boxes) without
+decoding any image data, and copy_clean() puts such files in place by
+reflink, plain copy or, if asked, hard link - never by decode and
+re-encode.
+"""
+
+import os
+
+from .fastcopy import copy_file as copy_contents
+from .gif import gif_has_metadata
+from .jpeg import jpeg_has_metadata
+from .mp4 import MP4_EXTENSIONS, mp4_has_metadata
+from .output import atomic_output, link_output
+from .png import png_has_metadata
+from .tiff import TIFF_EXTENSIONS, tiff_has_metadata
+from .webp import webp_has_metadata
+
+# Status of files that were already clean
+CLEAN_STATUS = "Copied (Already Clean)"
+
+# Format checks by extension
+CHECKS = dict(
+    [(ext, jpeg_has_metadata) for ext in ('.jpg', '.jpeg')]
+    + [('.png', png_has_metadata), ('.gif', gif_has_metadata), ('.webp', webp_has_metadata)]
+    + [(ext, tiff_has_metadata) for ext in TIFF_EXTENSIONS]
+    + [(ext, mp4_has_metadata) for ext in MP4_EXTENSIONS]
+)
+
+
+def has_metadata(file_path):
+    """True if file_path carries metadata, False if it is clean, None if that can't be told.
+
+    None covers formats without a header check and files that can't be
+    read or parsed; those are left to the full handlers.
+    """
+    check = CHECKS.get(os.path.splitext(file_path.lower())[1])
+    if check is None:
+        return None
+    try:
+        with open(file_path, 'rb') as src:
+            return check(src)
+    except (OSError, ValueError):
+        return None
+
+
+def copy_clean(file_path, output_path, spans, link=False):
+    """Put a file without metadata at output_path as it is.
+
+    With link, a hard link is tried first (outputs then share the original's
+    data, and any later edit to one shows in the other); otherwise the file
+    is cloned where the filesystem allows, or copied. Cleaning in place
+    writes nothing.
+    """
+    spans.handler = "clean"
+    if os.path.normcase(os.path.abspath(file_path)) == os.path.normcase(os.path.abspath(output_path)):
+        return
+    if link:
+        with spans.stage("link"):
+            if link_output(file_path, output_path):
+                return
+    with atomic_output(output_path, spans) as temp_path:
+        with spans.stage("copy"), open(file_path, 'rb') as src, open(temp_path, 'wb') as dst:
+            copy_contents(src, dst)
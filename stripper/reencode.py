@@ -0,0 +1,84 @@
+"""Decode/re-encode fallback for formats without a lossless stripper.
+
+The decoded bitmap is copied into a fresh Image in one C-level buffer copy
+instead of going through a Python list of per-pixel tuples, so peak memory
+stays around twice the raw bitmap size. The fresh image carries none of the
+source file's info dict or TIFF tags, which PIL would otherwise write back.
+Images that would need more than the memory limit are re-encoded a band of
+rows at a time by stripper.largeimage, or refused if that isn't possible.
+"""
+
+import os
+import warnings
+
+from PIL import Image
+
+from .largeimage import can_reencode_in_bands, decoded_size, reencode_in_bands
+from .metrics import Spans
+from .output import atomic_output
+
+# Entries from Image.info that describe pixels rather than metadata
+PRESERVED_INFO = ("transparency",)
+
+
+def open_image(file_path):
+    """Open file_path lazily; only its header is read.
+
+    PIL's decompression bomb guard is bypassed: callers weigh the decoded
+    size against their memory limit instead.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+        try:
+            return Image.open(file_path)
+        except Image.DecompressionBombError:
+            pass
+    # Open with the format's plugin directly, which skips the guard
+    Image.init()
+    image_format = Image.registered_extensions().get(os.path.splitext(file_path.lower())[1])
+    if image_format not in Image.OPEN:
+        raise ValueError("Image too large to open")
+    factory, _ = Image.OPEN[image_format]
+    return factory(file_path)
+
+
+def reencode_memory(img):
+    """Peak bytes a full re-encode of img needs: the decoded bitmap and its copy"""
+    return 2 * decoded_size(img)
+
+
+def reencode_image(file_path, output_path, spans=None, memory_limit=None):
+    """Decode file_path and save its pixels alone to output_path.
+
+    spans, if given, receives the handler used and "decode", "encode" and
+    "commit" timings. With memory_limit (bytes), images that would need
+    more are re-encoded in bands (handler "reencode_bands") if their pixels
+    are stored uncompressed, and raise ValueError otherwise.
+    """
+    spans = spans if spans is not None else Spans()
+    if memory_limit is None:
+        img = Image.open(file_path)
+    else:
+        img = open_image(file_path)
+
+    with img:
+        if memory_limit is not None and reencode_memory(img) > memory_limit:
+            if not can_reencode_in_bands(img, output_path):
+                raise ValueError(f"Image needs about {reencode_memory(img) >> 20} MB to re-encode, "
+                                 f"more than the {memory_limit >> 20} MB memory limit")
+            spans.handler = "reencode_bands"
+            reencode_in_bands(img, file_path, output_path, spans, memory_limit)
+            return
+
+        with spans.stage("decode"):
+            img.load()
+            # copy() duplicates the pixel buffer, mode and palette in C
+            clean = img.copy()
+
+    clean.info = {key: clean.info[key] for key in PRESERVED_INFO if key in clean.info}
+    try:
+        with atomic_output(output_path, spans) as temp_path:
+            with spans.stage("encode"):
+                clean.save(temp_path)
+    finally:
+        clean.close()
@@ -0,0 +1,99 @@
+"""Folder scanning with os.scandir.
+
+Files are identified by a normalized real path so the same file reached
+twice (through a symlink, a different spelling or a second scan) is only
+selected once. Directories are visited at most once by device/inode, which
+makes symlink loops harmless.
+"""
+
+import fnmatch
+import os
+import threading
+
+from .images import IMAGE_EXTENSIONS
+from .video import VIDEO_EXTENSIONS
+
+
+def path_key(path):
+    """Identity used to de-duplicate selected files"""
+    return os.path.normcase(os.path.realpath(path))
+
+
+class FolderScanner:
+    """Walks folders and yields supported media files.
+
+    exclude holds glob patterns matched against both the entry name and its
+    full path; matching files and directories are skipped. cancel() may be
+    called from another thread to stop a running scan.
+    """
+
+    def __init__(self, extensions=IMAGE_EXTENSIONS + VIDEO_EXTENSIONS, exclude=()):
+        self.extensions = tuple(extensions)
+        self.exclude = tuple(exclude or ())
+        self.cancelled = threading.Event()
+        self.visited = set()
+
+    def cancel(self):
+        """Stop the scan at the next entry"""
+        self.cancelled.set()
+
+    def is_excluded(self, name, path):
+        """Check an entry against the exclude patterns"""
+        for pattern in self.exclude:
+            if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(path, pattern):
+                return True
+        return False
+
+    def scan(self, folder):
+        """Yield (path, key) for every matching file below folder, sorted per directory"""
+        pending = [folder]
+        while pending and not self.cancelled.is_set():
+            directory = pending.pop()
+            try:
+                stat = os.stat(directory)
+            except OSError:
+                continue
+            identity = (stat.st_dev, stat.st_ino)
+            if identity in self.visited:
+                # Already seen - a symlink loop or a second route to the same folder
+                continue
+            self.visited.add(identity)
+
+            real_dir = path_key(directory)
+            found = []
+            subdirs = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if self.cancelled.is_set():
+                            return
+                        if self.exclude and self.is_excluded(entry.name, entry.path):
+                            continue
+                        try:
+                            if entry.is_dir():
+                                subdirs.append(entry.path)
+                                continue
+                            if not entry.is_file():
+                                continue
+                            if os.path.splitext(entry.name.lower())[1] not in self.extensions:
+                                continue
+                            if entry.is_symlink():
+                                key = path_key(entry.path)
+                            else:
+                                # One realpath per directory instead of one per file
+                                key = os.path.join(real_dir, os.path.normcase(entry.name))
+                        except OSError:
+                            continue
+                        found.append((entry.path, key))
+            except OSError:
+                # Unreadable directory - skip it like os.walk does
+                continue
+
+            found.sort()
+            for item in found:
+                if self.cancelled.is_set():
+                    return
+                yield item
+
+            # Depth-first, visiting subdirectories in name order
+            pending.extend(sorted(subdirs, reverse=True))
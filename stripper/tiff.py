@@ -0,0 +1,415 @@
+"""Lossless TIFF and BigTIFF metadata stripping at the IFD (tag directory) level.
+
+Every image directory in the file - the main chain and any SubIFDs - is
+rebuilt without its metadata tags (EXIF and GPS directories, XMP, IPTC,
+Photoshop resources, DateTime, Artist, Software, Make, Model, ...). The
+strip and tile data is never decoded: the byte ranges the directories point
+at are copied with kernel copy primitives and only their offsets are
+rewritten, so the original compression is kept and large scans are written
+at disk speed. Anything no kept tag points at (old metadata blocks, free
+space) is left behind.
+"""
+
+import struct
+from bisect import bisect_right
+
+from .fastcopy import copy_range
+
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+# Tags that describe the file rather than the pixels
+TIFF_METADATA_TAGS = frozenset([
+    269,    # DocumentName
+    270,    # ImageDescription
+    271,    # Make
+    272,    # Model
+    285,    # PageName
+    305,    # Software
+    306,    # DateTime
+    315,    # Artist
+    316,    # HostComputer
+    700,    # XMP
+    18246,  # Rating
+    18249,  # RatingPercent
+    33432,  # Copyright
+    33723,  # IPTC
+    34377,  # Photoshop image resources
+    34665,  # Exif IFD
+    34853,  # GPS IFD
+    37724,  # Photoshop layer data
+    40091,  # XPTitle
+    40092,  # XPComment
+    40093,  # XPAuthor
+    40094,  # XPKeywords
+    40095,  # XPSubject
+    40965,  # Interoperability IFD
+    42016,  # ImageUniqueID
+    50341,  # PrintIM
+    50740,  # DNGPrivateData
+])
+
+# Free space may still hold whatever was written there before
+FREE_TAGS = frozenset([288, 289])  # FreeOffsets, FreeByteCounts
+
+# (offsets tag, byte counts tag) of the image data each directory points at
+DATA_TAGS = (
+    (273, 279),  # StripOffsets, StripByteCounts
+    (324, 325),  # TileOffsets, TileByteCounts
+    (513, 514),  # JPEGInterchangeFormat, JPEGInterchangeFormatLength
+)
+
+# Tags whose values are offsets of further directories
+SUBIFD_TAGS = frozenset([330])  # SubIFDs
+
+# Field types: (struct code, size)
+TYPES = {
+    1: ("B", 1),   # BYTE
+    2: ("B", 1),   # ASCII
+    3: ("H", 2),   # SHORT
+    4: ("I", 4),   # LONG
+    5: ("I", 8),   # RATIONAL (two LONGs)
+    6: ("b", 1),   # SBYTE
+    7: ("B", 1),   # UNDEFINED
+    8: ("h", 2),   # SSHORT
+    9: ("i", 4),   # SLONG
+    10: ("i", 8),  # SRATIONAL
+    11: ("f", 4),  # FLOAT
+    12: ("d", 8),  # DOUBLE
+    13: ("I", 4),  # IFD
+    16: ("Q", 8),  # LONG8 (BigTIFF)
+    17: ("q", 8),  # SLONG8 (BigTIFF)
+    18: ("Q", 8),  # IFD8 (BigTIFF)
+}
+SHORT, LONG, IFD, LONG8, IFD8 = 3, 4, 13, 16, 18
+
+# More directories than this in one file means a corrupt (or hostile) file
+MAX_IFDS = 4096
+
+
+def _read_exact(src, size):
+    """Read exactly size bytes or fail on a truncated stream"""
+    data = src.read(size)
+    if len(data) != size:
+        raise ValueError("Unexpected end of TIFF data")
+    return data
+
+
+class _Layout:
+    """Byte order and field sizes of a classic TIFF or a BigTIFF"""
+
+    def __init__(self, order, big):
+        self.order = order
+        self.big = big
+        if big:
+            self.count_format, self.entry_size, self.offset_format = "Q", 20, "Q"
+        else:
+            self.count_format, self.entry_size, self.offset_format = "H", 12, "I"
+        self.count_size = struct.calcsize(self.count_format)
+        self.offset_size = struct.calcsize(self.offset_format)
+        # Values up to this size are stored in the entry itself
+        self.inline_size = self.offset_size
+
+    def unpack(self, fmt, data, offset=0):
+        return struct.unpack_from(self.order + fmt, data, offset)
+
+    def pack(self, fmt, *values):
+        return struct.pack(self.order + fmt, *values)
+
+
+def read_header(src):
+    """Read the file header and return (layout, first IFD offset)"""
+    src.seek(0)
+    header = _read_exact(src, 8)
+    if header[:2] == b"II":
+        order = "<"
+    elif header[:2] == b"MM":
+        order = ">"
+    else:
+        raise ValueError("Not a TIFF file")
+    magic = struct.unpack(order + "H", header[2:4])[0]
+    if magic == 42:
+        return _Layout(order, False), struct.unpack(order + "I", header[4:8])[0]
+    if magic == 43:
+        # BigTIFF: offset size (8) and padding, then a 64-bit first IFD offset
+        if struct.unpack(order + "HH", header[4:8]) != (8, 0):
+            raise ValueError("Unsupported BigTIFF header")
+        return _Layout(order, True), struct.unpack(order + "Q", _read_exact(src, 8))[0]
+    raise ValueError("Not a TIFF file")
+
+
+class _Entry:
+    """One directory entry; raw holds the value bytes as stored in the entry"""
+
+    __slots__ = ("tag", "type", "count", "raw")
+
+    def __init__(self, tag, field_type, count, raw):
+        self.tag = tag
+        self.type = field_type
+        self.count = count
+        self.raw = raw
+
+    def size(self):
+        """Size of the value in bytes"""
+        if self.type not in TYPES:
+            raise ValueError(f"Unknown TIFF field type {self.type}")
+        return self.count * TYPES[self.type][1]
+
+    def values(self, src, layout):
+        """The value as a tuple of numbers (for offset and count fields)"""
+        data = self.data(src, layout)
+        code = TYPES[self.type][0]
+        return layout.unpack(f"{len(data) // struct.calcsize(code)}{code}", data)
+
+    def data(self, src, layout):
+        """The value's bytes, read from the file when stored out of line"""
+        size = self.size()
+        if size <= layout.inline_size:
+            return self.raw[:size]
+        src.seek(layout.unpack(layout.offset_format, self.raw)[0])
+        return _read_exact(src, size)
+
+
+def _read_ifd(src, layout, offset):
+    """Read the directory at offset and return (entries, next IFD offset)"""
+    src.seek(offset)
+    count = layout.unpack(layout.count_format, _read_exact(src, layout.count_size))[0]
+    data = _read_exact(src, count * layout.entry_size + layout.offset_size)
+    entries = []
+    tag_format = "HH" + ("Q" if layout.big else "I")
+    for position in range(0, count * layout.entry_size, layout.entry_size):
+        tag, field_type, value_count = layout.unpack(tag_format, data, position)
+        raw = data[position + layout.entry_size - layout.inline_size:position + layout.entry_size]
+        entries.append(_Entry(tag, field_type, value_count, raw))
+    next_offset = layout.unpack(layout.offset_format, data, count * layout.entry_size)[0]
+    return entries, next_offset
+
+
+def _is_subifd(entry):
+    return entry.tag in SUBIFD_TAGS or entry.type in (IFD, IFD8)
+
+
+def iter_ifds(src):
+    """Yield (layout, entries) for every directory: the main chain and all SubIFDs"""
+    layout, first = read_header(src)
+    pending = [first]
+    visited = set()
+    while pending:
+        offset = pending.pop()
+        while offset:
+            if offset in visited or len(visited) >= MAX_IFDS:
+                raise ValueError("Invalid TIFF directory chain")
+            visited.add(offset)
+            entries, next_offset = _read_ifd(src, layout, offset)
+            yield layout, entries
+            for entry in entries:
+                if _is_subifd(entry) and entry.tag not in TIFF_METADATA_TAGS:
+                    pending.extend(entry.values(src, layout))
+            offset = next_offset
+
+
+def tiff_has_metadata(src, metadata_tags=TIFF_METADATA_TAGS):
+    """Check whether any directory of src carries a tag strip_tiff would remove.
+
+    Only the directories are read. Raises ValueError if the stream is not
+    a well-formed TIFF or BigTIFF.
+    """
+    for _, entries in iter_ifds(src):
+        for entry in entries:
+            if entry.tag in metadata_tags or entry.tag in FREE_TAGS:
+                return True
+    return False
+
+
+class _Writer:
+    """Sequential output with deferred patches for offsets not known yet"""
+
+    def __init__(self, dst):
+        self.dst = dst
+        self.position = 0
+        self.patches = []
+
+    def write(self, data):
+        self.dst.write(data)
+        self.position += len(data)
+
+    def align(self):
+        """Move to a word boundary, as directories and values must start on one"""
+        if self.position % 2:
+            self.write(b"\0")
+
+    def copy(self, src, offset, length):
+        copy_range(src, self.dst, offset, length)
+        self.position += length
+
+    def patch(self, position, data):
+        self.patches.append((position, data))
+
+    def finish(self):
+        for position, data in self.patches:
+            self.dst.seek(position)
+            self.dst.write(data)
+        self.dst.seek(0, 2)
+
+
+def _pack_offsets(layout, field_type, offsets):
+    """Encode new offsets, widening SHORT to LONG where they no longer fit"""
+    if field_type == SHORT and any(offset > 0xFFFF for offset in offsets):
+        field_type = LONG
+    if field_type in (LONG, IFD) and any(offset > 0xFFFFFFFF for offset in offsets):
+        if not layout.big:
+            raise ValueError("TIFF output would exceed 4 GB; BigTIFF is needed")
+        field_type = LONG8 if field_type == LONG else IFD8
+    code = TYPES[field_type][0]
+    return field_type, layout.pack(f"{len(offsets)}{code}", *offsets)
+
+
+class _Rewriter:
+    """Copies the directory tree of one TIFF to dst, leaving metadata behind"""
+
+    def __init__(self, src, dst, layout, file_size, metadata_tags):
+        self.src = src
+        self.out = _Writer(dst)
+        self.layout = layout
+        self.file_size = file_size
+        self.metadata_tags = metadata_tags
+        self.visited = set()
+        self.removed = 0
+
+    def copy_data(self, ranges):
+        """Copy image data ranges, merged where they touch; return a source -> output offset map"""
+        runs = []
+        for offset, length in sorted(set(ranges)):
+            if length == 0:
+                continue
+            if offset + length > self.file_size:
+                raise ValueError("TIFF image data runs past the end of the file")
+            if runs and offset <= runs[-1][1]:
+                runs[-1][1] = max(runs[-1][1], offset + length)
+            else:
+                runs.append([offset, offset + length])
+
+        starts = {}
+        for start, end in runs:
+            starts[start] = (end, self.out.position)
+            self.out.copy(self.src, start, end - start)
+
+        run_starts = sorted(starts)
+
+        def remap(offset):
+            # The run containing offset is the last one starting at or before it
+            index = bisect_right(run_starts, offset)
+            start = run_starts[index - 1]
+            end, new_start = starts[start]
+            return new_start + (offset - start)
+
+        return remap
+
+    def write_chain(self, offset):
+        """Write a chain of directories and return the output offset of the first"""
+        first = 0
+        previous_next_field = None
+        while offset:
+            if offset in self.visited or len(self.visited) >= MAX_IFDS:
+                raise ValueError("Invalid TIFF directory chain")
+            self.visited.add(offset)
+            entries, next_offset = _read_ifd(self.src, self.layout, offset)
+            new_offset, next_field = self.write_ifd(entries)
+            if previous_next_field is None:
+                first = new_offset
+            else:
+                self.out.patch(previous_next_field, self.layout.pack(self.layout.offset_format, new_offset))
+            previous_next_field = next_field
+            offset = next_offset
+        return first
+
+    def write_ifd(self, entries):
+        """Write one directory with its data; return (its offset, position of its next-IFD field)"""
+        layout = self.layout
+        kept = []
+        for entry in entries:
+            if entry.tag in self.metadata_tags:
+                self.removed += 1
+            elif entry.tag not in FREE_TAGS:
+                kept.append(entry)
+        by_tag = {entry.tag: entry for entry in kept}
+
+        # Image data first, so its new offsets are known when the directory is written
+        values = {}
+        pairs = []
+        for offsets_tag, counts_tag in DATA_TAGS:
+            if offsets_tag in by_tag and counts_tag in by_tag:
+                offsets = by_tag[offsets_tag].values(self.src, layout)
+                counts = by_tag[counts_tag].values(self.src, layout)
+                if len(offsets) != len(counts):
+                    raise ValueError("TIFF strip offsets and byte counts don't match")
+                pairs.append((offsets_tag, offsets, counts))
+            elif offsets_tag in by_tag:
+                raise ValueError("TIFF image data without byte counts")
+        remap = self.copy_data([(offset, count) for _, offsets, counts in pairs
+                                for offset, count in zip(offsets, counts)])
+        for offsets_tag, offsets, counts in pairs:
+            new_offsets = [remap(offset) if count else 0 for offset, count in zip(offsets, counts)]
+            values[offsets_tag] = _pack_offsets(layout, by_tag[offsets_tag].type, new_offsets)
+
+        # Directories hanging off this one
+        for entry in kept:
+            if _is_subifd(entry):
+                children = [self.write_chain(offset) for offset in entry.values(self.src, layout)]
+                values[entry.tag] = _pack_offsets(layout, entry.type, children)
+
+        # Out-of-line values, then the directory itself
+        fields = []
+        for entry in kept:
+            field_type, data = values.get(entry.tag, (entry.type, None))
+            if data is None:
+                if entry.size() <= layout.inline_size:
+                    fields.append((entry.tag, field_type, entry.count, entry.raw))
+                    continue
+                data = entry.data(self.src, layout)
+            count = len(data) // TYPES[field_type][1]
+            if len(data) <= layout.inline_size:
+                fields.append((entry.tag, field_type, count, data.ljust(layout.inline_size, b"\0")))
+            else:
+                self.out.align()
+                fields.append((entry.tag, field_type, count, layout.pack(layout.offset_format, self.out.position)))
+                self.out.write(data)
+
+        self.out.align()
+        ifd_offset = self.out.position
+        entry_format = "HH" + ("Q" if layout.big else "I")
+        parts = [layout.pack(layout.count_format, len(fields))]
+        for tag, field_type, count, raw in fields:
+            parts.append(layout.pack(entry_format, tag, field_type, count) + raw)
+        self.out.write(b"".join(parts))
+        next_field = self.out.position
+        self.out.write(layout.pack(layout.offset_format, 0))
+        return ifd_offset, next_field
+
+
+def strip_tiff(src, dst, metadata_tags=TIFF_METADATA_TAGS):
+    """Copy a TIFF or BigTIFF from src to dst without the tags in metadata_tags.
+
+    src and dst are binary file objects backed by real files; both must be
+    seekable. Returns the number of tags removed. Raises ValueError if the
+    file is not a well-formed TIFF.
+    """
+    layout, first = read_header(src)
+    file_size = src.seek(0, 2)
+    rewriter = _Rewriter(src, dst, layout, file_size, metadata_tags)
+
+    # Header, with the first directory's offset filled in at the end
+    byte_order = b"II" if layout.order == "<" else b"MM"
+    if layout.big:
+        header = layout.pack("2sHHH", byte_order, 43, 8, 0)
+    else:
+        header = layout.pack("2sH", byte_order, 42)
+    rewriter.out.write(header)
+    first_field = rewriter.out.position
+    rewriter.out.write(layout.pack(layout.offset_format, 0))
+
+    first_ifd = rewriter.write_chain(first)
+    if not first_ifd:
+        raise ValueError("TIFF file has no image directory")
+    rewriter.out.patch(first_field, layout.pack(layout.offset_format, first_ifd))
+    rewriter.out.finish()
+    return rewriter.removed
@@ -0,0 +1,256 @@
+"""Video metadata stripping and a concurrent job scheduler.
+
+MP4 and MOV files are rewritten natively by stripper.mp4; other containers,
+and MP4s the native rewriter can't handle, are remuxed with FFmpeg.
+Remuxing with stream copy is mostly I/O, so several FFmpeg processes can run
+side by side. The scheduler starts the biggest files first, which keeps one
+long clip from starting last and stretching the end of a mixed batch.
+"""
+
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .metrics import Spans, file_sizes, make_result
+from .mp4 import MP4_EXTENSIONS, strip_mp4
+from .output import atomic_output
+from .prescan import CLEAN_STATUS, copy_clean, has_metadata
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv')
+
+FFMPEG_TIMEOUT = 300  # 5 minute timeout for very large files
+
+# FFmpeg muxer needed to write each container
+MUXERS = {'.mp4': 'mp4', '.mov': 'mov', '.avi': 'avi', '.mkv': 'matroska'}
+
+
+def run_ffmpeg(command, input_size=0, on_progress=None, timeout=FFMPEG_TIMEOUT):
+    """Run an FFmpeg command, reporting progress as the fraction of input size written.
+
+    Returns (returncode, stderr text). Raises subprocess.TimeoutExpired if the
+    process is still running after timeout seconds.
+    """
+    # Machine-readable progress on stdout instead of the interactive stats line
+    command = [command[0], '-nostats', '-progress', 'pipe:1'] + list(command[1:])
+    timed_out = threading.Event()
+
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,  # Keep concurrent jobs from reading the terminal
+            stdout=subprocess.PIPE,
+            stderr=stderr_file,
+            text=True
+        )
+
+        def kill():
+            timed_out.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        try:
+            for line in process.stdout:
+                if on_progress and input_size and line.startswith('total_size='):
+                    written = line.split('=', 1)[1].strip()
+                    if written.isdigit():
+                        # Stream copy writes roughly as many bytes as it reads
+                        on_progress(min(int(written) / input_size, 1.0))
+            returncode = process.wait()
+        finally:
+            timer.cancel()
+            process.stdout.close()
+
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(command, timeout)
+
+        stderr_file.seek(0)
+        return returncode, stderr_file.read().decode(errors='replace')
+
+
+def strip_video(file_path, output_path, on_progress=None, ffmpeg_info=None, use_ffmpeg=True, spans=None,
+                link_clean=False):
+    """Write a copy of a video without its container and stream metadata.
+
+    MP4/MOV files are rewritten natively; everything else is remuxed with
+    FFmpeg, as are MP4/MOV files the native rewriter rejects unless
+    use_ffmpeg is False. ffmpeg_info is the dict from
+    stripper.ffmpeg.probe_ffmpeg; without it the ffmpeg on PATH is used and
+    the muxer check is skipped. spans, a stripper.metrics.Spans, receives
+    the handler used and its stage timings. MP4/MOV files without any
+    metadata are copied as they are (handler "clean"), or hard-linked with
+    link_clean.
+    """
+    spans = spans if spans is not None else Spans()
+    ext = os.path.splitext(file_path.lower())[1]
+    if ext in MP4_EXTENSIONS:
+        with spans.stage("prescan"):
+            clean = has_metadata(file_path) is False
+        if clean:
+            try:
+                copy_clean(file_path, output_path, spans, link_clean)
+            except OSError as e:
+                raise Exception(f"Failed to process video: {e}")
+            return
+
+        spans.handler = "mp4"
+        try:
+            with atomic_output(output_path, spans) as temp_path:
+                with spans.stage("strip"), open(file_path, 'rb') as src, open(temp_path, 'wb') as dst:
+                    strip_mp4(src, dst, on_progress)
+            return
+        except ValueError as e:
+            # Fragmented or malformed - let FFmpeg have a go below
+            if not use_ffmpeg:
+                raise Exception(f"Failed to process video: {e}")
+        except OSError as e:
+            raise Exception(f"Failed to process video: {e}")
+
+    ffmpeg = ffmpeg_info["path"] if ffmpeg_info else 'ffmpeg'
+    muxers = ffmpeg_info.get("muxers") if ffmpeg_info else None
+    if muxers and MUXERS.get(ext, ext[1:]) not in muxers:
+        raise Exception(f"Failed to process video: this FFmpeg build cannot write {ext} files")
+
+    try:
+        input_size = os.path.getsize(file_path)
+    except OSError:
+        input_size = 0
+
+    spans.handler = "ffmpeg"
+    try:
+        with atomic_output(output_path, spans) as temp_path, spans.stage("ffmpeg"):
+            _remux(ffmpeg, muxers, ext, file_path, temp_path, input_size, on_progress)
+    except OSError as e:
+        # The temporary output couldn't be created or renamed
+        raise Exception(f"Failed to process video: {e}")
+
+
+def _remux(ffmpeg, muxers, ext, file_path, output_path, input_size, on_progress):
+    """Run FFmpeg to write file_path's streams to output_path without metadata"""
+    try:
+        # Use FFmpeg to strip metadata with more robust options
+        command = [
+            ffmpeg,
+            '-i', file_path,
+            '-map_metadata', '-1',       # Remove all metadata
+            '-map', '0',                 # Map all streams from input to output
+            '-c', 'copy',                # Copy all streams without re-encoding
+            '-movflags', 'faststart',    # Optimize for web playback
+            '-y',                        # Overwrite output files without asking
+            output_path
+        ]
+
+        try:
+            returncode, error_msg = run_ffmpeg(command, input_size, on_progress)
+        except subprocess.TimeoutExpired:
+            raise Exception("Video processing timed out. The file may be too large.")
+
+        if returncode != 0:
+            # Make the error message more user-friendly
+            if "No such file or directory" in error_msg:
+                error_msg = "FFmpeg could not find the input file."
+            elif "Invalid data found when processing input" in error_msg:
+                error_msg = "The video file appears to be corrupt or in an unsupported format."
+            raise Exception(f"FFmpeg error: {error_msg}")
+
+    except Exception as e:
+        # If something goes wrong, try a simpler approach for some common formats
+        if ext in ('.mp4', '.mov') and (not muxers or 'mp4' in muxers):
+            try:
+                # Alternative command for MP4/MOV files
+                alt_command = [
+                    ffmpeg,
+                    '-i', file_path,
+                    '-map_metadata', '-1',
+                    '-c:v', 'copy',
+                    '-c:a', 'copy',
+                    '-f', 'mp4',
+                    '-y',
+                    output_path
+                ]
+                returncode, _ = run_ffmpeg(alt_command, input_size, on_progress)
+                if returncode == 0:
+                    return  # If alternative method succeeds, return
+            except Exception:
+                # If alternative also fails, continue with raising the original error
+                pass
+
+        raise Exception(f"Failed to process video: {str(e)}")
+
+
+class VideoScheduler:
+    """Runs video jobs on a limited number of concurrent FFmpeg processes.
+
+    add() every job, then start(); jobs are started largest file first.
+    results() yields result dicts in completion order. handler is called as
+    handler(file_path, output_path, on_progress, spans=spans) and
+    on_progress, if given, receives (file_path, fraction) updates while a
+    job runs.
+    """
+
+    def __init__(self, workers=4, handler=strip_video, on_progress=None):
+        self.workers = max(1, workers or 1)
+        self.handler = handler
+        self.on_progress = on_progress
+        self.jobs = []
+        self.futures = {}
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    def add(self, file_path, output_path):
+        """Queue a video for stripping"""
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            size = 0
+        self.jobs.append((size, file_path, output_path))
+
+    def start(self):
+        """Start the queued jobs, longest (largest) first"""
+        if not self.jobs:
+            return
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        # The executor starts jobs in submission order
+        for size, file_path, output_path in sorted(self.jobs, key=lambda job: job[0], reverse=True):
+            future = self.executor.submit(self.run_job, file_path, output_path)
+            self.futures[future] = (file_path, output_path)
+
+    def run_job(self, file_path, output_path):
+        """Strip one video and describe the outcome; never raises"""
+        start = time.perf_counter()
+        if self.on_progress:
+            def on_progress(fraction):
+                self.on_progress(file_path, fraction)
+        else:
+            on_progress = None
+        spans = Spans()
+        try:
+            self.handler(file_path, output_path, on_progress, spans=spans)
+            status = CLEAN_STATUS if spans.handler == "clean" else "Success"
+            error = None
+        except Exception as e:
+            status, error = "Error", str(e)
+        bytes_in, bytes_out = file_sizes(file_path, output_path if error is None else None)
+        return make_result(file_path, output_path, status, error, time.perf_counter() - start,
+                           spans.handler, spans.stages, bytes_in, bytes_out)
+
+    def results(self):
+        """Yield result dicts as the jobs finish"""
+        for future in as_completed(self.futures):
+            yield future.result()
+
+    def shutdown(self):
+        """Wait for running jobs and drop the ones that haven't started"""
+        if self.executor is not None:
+            for future in self.futures:
+                future.cancel()
+            self.executor.shutdown(wait=True)
+            self.executor = None
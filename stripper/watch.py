@@ -0,0 +1,443 @@
+"""Watch-folder mode: strip new media as it arrives in drop folders.
+
+FolderWatcher follows the watched folders with Linux inotify where it is
+available, or by rescanning them every few seconds elsewhere. A file is
+only handed on once it is stable: closed after writing (or moved in) and
+unchanged in size and modification time for a settle period. Files already
+in the folders when watching starts are picked up too, so anything that
+arrived while the daemon was down is not missed.
+
+WatchDaemon feeds stable files through process_batch() in small batches.
+The queue between the two is bounded: when processing falls behind, the
+watcher stops reading events and the kernel holds them; if its queue
+overflows, the folders are rescanned, so no file is lost either way.
+"""
+
+import glob
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+
+from .core import MEDIA_EXTENSIONS, OutputPlanner, process_batch
+from .images import MEMORY_LIMIT
+from .output import PARTIAL_SUFFIX
+from .scan import FolderScanner, path_key
+
+try:
+    import ctypes
+    import ctypes.util
+except ImportError:
+    ctypes = None
+
+# Seconds a file must stay unchanged after its last write before it is processed
+SETTLE_SECONDS = 1.0
+
+# How often folders are rescanned when inotify isn't available
+POLL_INTERVAL = 2.0
+
+# Stable files waiting for processing before the watcher holds back
+QUEUE_SIZE = 256
+
+# Files processed together; a batch starts as soon as files are waiting
+BATCH_SIZE = 64
+
+# inotify event flags (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+# struct inotify_event without the trailing name
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_libc():
+    """libc with the inotify calls, or None where there is no inotify"""
+    if ctypes is None or not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+class Inotify:
+    """Minimal inotify binding: directory watches and raw event reading"""
+
+    def __init__(self, libc):
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.directories = {}  # Watch descriptor -> directory path
+
+    def add_watch(self, directory):
+        """Watch a directory; returns False if it can't be watched (gone, or out of watches)"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            return False
+        self.directories[wd] = directory
+        return True
+
+    def read(self, timeout):
+        """Wait up to timeout seconds; returns a list of (directory, name, mask)"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_IGNORED:
+                # The watch is gone (directory deleted or moved away)
+                self.directories.pop(wd, None)
+                continue
+            directory = self.directories.get(wd)
+            if directory is not None or mask & IN_Q_OVERFLOW:
+                events.append((directory, name, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """Reports media files in folders once they are stable.
+
+    Call ready() repeatedly; each call waits up to timeout seconds and
+    returns (path, first_seen) for files that have settled, first_seen
+    being the time.monotonic() at which the file was first noticed.
+    """
+
+    def __init__(self, folders, extensions=MEDIA_EXTENSIONS, exclude=(), settle=SETTLE_SECONDS,
+                 poll_interval=POLL_INTERVAL, use_inotify=True):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.extensions = tuple(extensions)
+        # Half-written outputs of atomic_output are never picked up
+        self.exclude = tuple(exclude) + (f".*{PARTIAL_SUFFIX}.*",)
+        self.filter = FolderScanner(self.extensions, self.exclude)
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.pending = {}  # Path -> [signature, last change, first seen]
+        self.writing = set()  # Paths written to but not yet closed
+        self.signatures = {}  # Path -> signature it was last reported with
+        self.next_poll = 0.0
+        # Set when a directory couldn't be watched (e.g. out of inotify watches)
+        self.incomplete = False
+
+        libc = _load_libc() if use_inotify else None
+        self.inotify = Inotify(libc) if libc is not None else None
+        if self.inotify is not None:
+            for folder in self.folders:
+                self.watch_tree(folder)
+            self.rescan()
+
+    @property
+    def mode(self):
+        """How changes are noticed: "inotify", or "polling" where that isn't available"""
+        if self.inotify is None:
+            return "polling"
+        return "inotify+polling" if self.incomplete else "inotify"
+
+    def is_excluded(self, name, path):
+        """Same filters as a folder scan"""
+        return self.filter.is_excluded(name, path)
+
+    def is_media(self, name):
+        return os.path.splitext(name.lower())[1] in self.extensions
+
+    def watch_tree(self, folder):
+        """Add inotify watches for folder and every directory below it"""
+        for directory, subdirs, _ in os.walk(folder):
+            subdirs[:] = [name for name in subdirs
+                          if not self.is_excluded(name, os.path.join(directory, name))]
+            if not self.inotify.add_watch(directory):
+                # Changes below here are only seen by rescanning
+                self.incomplete = True
+
+    def rescan(self, folders=None):
+        """Pick up files that changed without an event (startup, new folders, overflow, polling)"""
+        # Scanners remember the folders they visited, so every rescan needs a new one
+        scanner = FolderScanner(self.extensions, self.exclude)
+        now = time.monotonic()
+        for folder in folders or self.folders:
+            for path, _ in scanner.scan(folder):
+                self.touch(path, now)
+
+    def touch(self, path, now):
+        """Note that path may have changed; it is reported again once stable"""
+        signature = self.signature(path)
+        if signature is None or self.signatures.get(path) == signature:
+            return
+        entry = self.pending.get(path)
+        if entry is None:
+            self.pending[path] = [signature, now, now]
+        elif entry[0] != signature:
+            entry[0] = signature
+            entry[1] = now
+
+    def signature(self, path):
+        """(size, mtime) of a file, or None if it is gone"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def handle(self, directory, name, mask, now):
+        """Apply one inotify event"""
+        if mask & IN_Q_OVERFLOW:
+            # Events were dropped; look at everything again
+            self.rescan()
+            return
+        path = os.path.join(directory, name) if name else directory
+        if name and self.is_excluded(name, path):
+            return
+
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                # A new folder: watch it, and take what was moved in with it
+                self.watch_tree(path)
+                self.rescan([path])
+            return
+        if not name or not self.is_media(name):
+            return
+
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            self.pending.pop(path, None)
+            self.writing.discard(path)
+            self.signatures.pop(path, None)
+        elif mask & IN_MODIFY:
+            self.writing.add(path)
+            self.touch(path, now)
+        elif mask & IN_CREATE:
+            # A hard link (ln, cp -l) is created complete and never closed; writers send IN_MODIFY
+            self.touch(path, now)
+        elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            self.writing.discard(path)
+            self.touch(path, now)
+
+    def ready(self, timeout):
+        """Wait for changes, then return [(path, first_seen)] of files that have settled"""
+        polling = self.inotify is None or self.incomplete
+        if polling:
+            timeout = min(timeout, self.next_poll - time.monotonic())
+        if self.pending:
+            # Wake up in time for the next file to settle
+            soonest = min(entry[1] for entry in self.pending.values()) + self.settle
+            timeout = min(timeout, soonest - time.monotonic())
+        timeout = max(0.0, timeout)
+
+        if self.inotify is not None:
+            events = self.inotify.read(timeout)
+            now = time.monotonic()
+            for directory, name, mask in events:
+                self.handle(directory, name, mask, now)
+        else:
+            time.sleep(timeout)
+        if polling and time.monotonic() >= self.next_poll:
+            self.rescan()
+            self.next_poll = time.monotonic() + self.poll_interval
+
+        now = time.monotonic()
+        settled = []
+        for path, entry in list(self.pending.items()):
+            if path in self.writing or now - entry[1] < self.settle:
+                continue
+            signature = self.signature(path)
+            if signature is None:
+                del self.pending[path]
+            elif signature != entry[0]:
+                # Still growing; wait another settle period
+                entry[0] = signature
+                entry[1] = now
+            else:
+                del self.pending[path]
+                self.signatures[path] = signature
+                settled.append((path, entry[2]))
+        return sorted(settled)
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+
+
+def _output_key(path):
+    """Normalized absolute path, to recognise outputs when they show up as events"""
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+def same_folder(first, second):
+    """Whether two paths name the same folder, following symlinks"""
+    return os.path.normcase(os.path.realpath(first)) == os.path.normcase(os.path.realpath(second))
+
+
+class WatchDaemon:
+    """Watches folders and strips every stable media file into output_dir.
+
+    run() blocks until stop() is called (e.g. from a signal handler), then
+    finishes every file already queued before returning. on_result is
+    called with each result dict, which carries an extra "latency" key:
+    seconds from the file first being noticed to its output being done.
+    Files noticed but not yet stable at shutdown are found again by the
+    startup scan of the next run; a ResultCache keeps already finished
+    files from being redone. output_dir may lie inside a watched folder,
+    which is then left out of the watch, but it can't be one of the
+    watched folders itself (ValueError).
+    """
+
+    def __init__(self, folders, output_dir, allow_overwrite=False, exclude=(), settle=SETTLE_SECONDS,
+                 use_inotify=True, image_workers=None, video_workers=4, ffmpeg_info=None,
+                 cache=None, journal=None, link_clean=False, memory_limit=MEMORY_LIMIT, memory_budget=None,
+                 queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE):
+        self.output_dir = os.path.abspath(output_dir)
+        if any(same_folder(folder, self.output_dir) for folder in folders):
+            raise ValueError("The output directory can't be one of the watched folders")
+        self.allow_overwrite = allow_overwrite
+        self.image_workers = image_workers
+        self.video_workers = video_workers
+        self.ffmpeg_info = ffmpeg_info
+        self.cache = cache
+        self.journal = journal
+        self.link_clean = link_clean
+        self.memory_limit = memory_limit
+        self.memory_budget = memory_budget
+        self.batch_size = batch_size
+        self.stopping = threading.Event()
+        self.queue = queue.Queue(queue_size)
+
+        # Outputs written here must never be picked up as new input
+        exclude = tuple(exclude) + (glob.escape(self.output_dir),)
+        self.watcher = FolderWatcher(folders, exclude=exclude, settle=settle, use_inotify=use_inotify)
+        # One plan for the daemon's lifetime, so same-named files from different drops never collide
+        self.planner = OutputPlanner([], self.output_dir, allow_overwrite)
+        self.planned = {}  # Source path key -> output path
+        self.issued = set()  # Normalized output paths handed out, never taken as input
+
+    def stop(self):
+        """Stop watching; run() returns once the queued files are done"""
+        self.stopping.set()
+
+    def watch(self):
+        """Watcher thread: move stable files into the bounded queue"""
+        try:
+            while not self.stopping.is_set():
+                for item in self.watcher.ready(0.5):
+                    if _output_key(item[0]) in self.issued:
+                        continue
+                    # Blocks while the queue is full; that's the backpressure
+                    while not self.stopping.is_set():
+                        try:
+                            self.queue.put(item, timeout=0.5)
+                            break
+                        except queue.Full:
+                            continue
+        finally:
+            self.queue.put(None)
+
+    def next_batch(self):
+        """Wait for at least one queued file and take up to batch_size; None when stopped"""
+        batch = []
+        while not batch:
+            item = self.queue.get()
+            if item is None:
+                return None
+            batch.append(item)
+        while len(batch) < self.batch_size:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Finish this batch first, then stop
+                self.queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def output_paths(self, files):
+        """Output names for files, reusing the name a file got if it arrives again"""
+        output_paths = {}
+        for file in files:
+            key = path_key(file)
+            if key not in self.planned:
+                self.planner.reserve(file)
+                self.planned[key] = self.planner.output_path(file)
+                self.issued.add(_output_key(self.planned[key]))
+            output_paths[file] = self.planned[key]
+        return output_paths
+
+    def run(self, on_result):
+        """Process files as they arrive until stop() is called"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        watcher_thread = threading.Thread(target=self.watch, daemon=True)
+        watcher_thread.start()
+        try:
+            while True:
+                batch = self.next_batch()
+                if batch is None:
+                    break
+                first_seen = dict(batch)
+                files = [file for file, _ in batch]
+                output_paths = self.output_paths(files)
+                batch_id = None
+                if self.journal is not None:
+                    batch_id = self.journal.begin(self.output_dir, self.allow_overwrite, output_paths)
+                for result in process_batch(
+                    files,
+                    self.output_dir,
+                    allow_overwrite=self.allow_overwrite,
+                    image_workers=self.image_workers,
+                    video_workers=self.video_workers,
+                    ffmpeg_info=self.ffmpeg_info,
+                    output_paths=output_paths,
+                    cache=self.cache,
+                    link_clean=self.link_clean,
+                    memory_limit=self.memory_limit,
+                    memory_budget=self.memory_budget
+                ):
+                    if batch_id is not None:
+                        self.journal.record(batch_id, result)
+                    latency = time.monotonic() - first_seen[result["source_file"]]
+                    on_result(dict(result, latency=round(latency, 3)))
+                if batch_id is not None:
+                    self.journal.finish(batch_id)
+        finally:
+            self.stopping.set()
+            # Unblock the watcher if it is waiting for room in the queue
+            while watcher_thread.is_alive():
+                try:
+                    self.queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self.watcher.close()
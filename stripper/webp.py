@@ -0,0 +1,103 @@
+"""Streaming WebP metadata stripping at the RIFF chunk level.
+
+EXIF and XMP chunks are left out and the matching VP8X flag bits cleared;
+the RIFF size is rewritten to match. Every other chunk - VP8/VP8L
+bitstreams, ALPH, ANIM/ANMF frames, the ICC profile - is copied byte for
+byte in merged runs with kernel copy primitives, so nothing is decoded and
+memory use does not depend on the file size.
+"""
+
+import struct
+
+from .fastcopy import copy_range
+
+# Chunks that only describe the file
+DEFAULT_WEBP_DROP = frozenset([b"EXIF", b"XMP "])
+
+# VP8X flag bits announcing the chunks above
+VP8X_FLAGS = {b"EXIF": 0x08, b"XMP ": 0x04}
+
+
+def _read_exact(src, offset, size):
+    """Read exactly size bytes at offset or fail on a truncated stream"""
+    src.seek(offset)
+    data = src.read(size)
+    if len(data) != size:
+        raise ValueError("Unexpected end of WebP data")
+    return data
+
+
+def _iter_chunks(src):
+    """Yield (fourcc, start, end) for every chunk inside the RIFF container.
+
+    end includes the pad byte of odd-sized chunks. Raises ValueError if
+    the stream is not a well-formed WebP.
+    """
+    header = _read_exact(src, 0, 12)
+    if header[:4] != b"RIFF" or header[8:] != b"WEBP":
+        raise ValueError("Not a WebP file")
+    riff_end = 8 + struct.unpack("<I", header[4:8])[0]
+    if riff_end & 1:
+        raise ValueError("Invalid RIFF size")
+
+    offset = 12
+    while offset < riff_end:
+        fourcc, size = struct.unpack("<4sI", _read_exact(src, offset, 8))
+        end = offset + 8 + size + (size & 1)
+        if end > riff_end:
+            raise ValueError("WebP chunk overruns the RIFF container")
+        yield fourcc, offset, end
+        offset = end
+
+
+def webp_has_metadata(src, drop_chunks=DEFAULT_WEBP_DROP):
+    """Check whether strip_webp would remove anything from src.
+
+    Only the chunk headers are read. Data after the RIFF container counts
+    as metadata, as strip_webp drops it. Raises ValueError if the stream
+    is not a WebP.
+    """
+    end = 12
+    for fourcc, _, end in _iter_chunks(src):
+        if fourcc in drop_chunks:
+            return True
+    return src.seek(0, 2) != end
+
+
+def strip_webp(src, dst, drop_chunks=DEFAULT_WEBP_DROP):
+    """Copy a WebP from src to dst without the chunk types in drop_chunks.
+
+    src and dst are binary file objects backed by real files; src must be
+    seekable. Anything after the RIFF container is dropped. Returns the
+    number of chunks removed. Raises ValueError if the stream is not a
+    well-formed WebP.
+    """
+    # Find every chunk first, so a malformed file fails before anything is written
+    runs = []
+    removed = 0
+    flags = 0
+    vp8x = None
+    size = 4  # The "WEBP" form type
+    for fourcc, start, end in _iter_chunks(src):
+        if fourcc in drop_chunks:
+            removed += 1
+            flags |= VP8X_FLAGS.get(fourcc, 0)
+            continue
+        if fourcc == b"VP8X":
+            vp8x = start
+        size += end - start
+        if runs and runs[-1][1] == start:
+            runs[-1][1] = end
+        else:
+            runs.append([start, end])
+
+    dst.write(b"RIFF" + struct.pack("<I", size) + b"WEBP")
+    for start, end in runs:
+        if vp8x is not None and start <= vp8x < end:
+            # Clear the flags of dropped chunks; the rest of VP8X is unchanged
+            copy_range(src, dst, start, vp8x + 8 - start)
+            feature = _read_exact(src, vp8x + 8, 1)[0]
+            dst.write(bytes([feature & ~flags & 0xFF]))
+            start = vp8x + 9
+        copy_range(src, dst, start, end - start)
+    return removed
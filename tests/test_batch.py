@@ -0,0 +1,62 @@
+"""Every job must come back as a full result, even when its worker dies"""
+
+import os
+import signal
+import threading
+
+from stripper.batch import ImageBatchRunner, merge_results, run_image_job, worker_failed
+from stripper.metrics import make_result
+from stripper.video import VideoScheduler
+
+
+def test_broken_pool_reports_every_job(tmp_path):
+    files = [str(tmp_path / f"{index}.jpg") for index in range(5)]
+    # A budget of one byte admits one job at a time, so four are still waiting when the worker dies
+    with ImageBatchRunner(workers=2, memory_budget=1) as runner:
+        for file in files:
+            runner.submit(file, file + ".out")
+        for process in list(runner.executor._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+
+        results = list(merge_results(runner.results()))
+
+    assert sorted(result["source_file"] for result in results) == files
+    assert all(result["status"] == "Error" and result["error"].startswith("Worker failed") for result in results)
+    assert all("bytes_in" in result for result in results)
+
+
+def test_shutdown_while_results_are_drained(tmp_path):
+    files = [str(tmp_path / f"{index}.jpg") for index in range(20)]
+    runner = ImageBatchRunner(workers=2, memory_budget=1)
+    for file in files:
+        runner.submit(file, file + ".out")
+
+    results = []
+    first = threading.Event()
+
+    def drain():
+        for result in runner.results():
+            results.append(result)
+            first.set()
+
+    thread = threading.Thread(target=drain)
+    thread.start()
+    first.wait(60)
+    # Cancelled on the consumer thread, as when a batch is stopped
+    runner.shutdown()
+    thread.join(60)
+
+    assert not thread.is_alive()
+    assert 1 <= len(results) <= len(files)
+
+
+def test_every_result_has_every_field(tmp_path):
+    missing = str(tmp_path / "missing.jpg")
+
+    def failing_handler(file_path, output_path, on_progress, spans=None):
+        raise ValueError("no video")
+
+    fields = set(make_result(missing, missing, "Error"))
+    assert set(run_image_job(missing, missing + ".out")) == fields
+    assert set(worker_failed(missing, missing + ".out", "killed")) == fields
+    assert set(VideoScheduler(handler=failing_handler).run_job(missing, missing + ".out")) == fields
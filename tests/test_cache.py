@@ -0,0 +1,51 @@
+"""A cached result only stands for a run with the same output options"""
+
+import os
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+
+from stripper.cache import ResultCache  # noqa: E402
+from stripper.core import process_batch  # noqa: E402
+
+
+def run(cache, source, out, **options):
+    return list(process_batch([source], out, image_workers=1, cache=cache, **options))[0]
+
+
+def test_link_clean_output_is_not_reused_without_link_clean(tmp_path):
+    source = str(tmp_path / "clean.png")
+    Image.effect_noise((16, 16), 60).save(source)
+    out = str(tmp_path / "out")
+    os.mkdir(out)
+    cache = ResultCache(str(tmp_path / "cache.db"))
+    try:
+        linked = run(cache, source, out, link_clean=True)
+        assert os.path.samefile(linked["output_file"], source)
+        assert run(cache, source, out, link_clean=True)["status"] == "Cached"
+
+        copied = run(cache, source, out, link_clean=False)
+        assert copied["status"] != "Cached"
+        assert not os.path.samefile(copied["output_file"], source)
+    finally:
+        cache.close()
+
+
+@pytest.mark.parametrize("option, first, second", [
+    ("allow_overwrite", False, True),
+    ("memory_limit", 1024, None),
+])
+def test_other_output_options_are_part_of_the_key(tmp_path, option, first, second):
+    source = str(tmp_path / "clean.png")
+    Image.effect_noise((16, 16), 60).save(source)
+    out = str(tmp_path / "out")
+    os.mkdir(out)
+    cache = ResultCache(str(tmp_path / "cache.db"))
+    try:
+        run(cache, source, out, **{option: first})
+        assert run(cache, source, out, **{option: first})["status"] == "Cached"
+        assert run(cache, source, out, **{option: second})["status"] != "Cached"
+    finally:
+        cache.close()
@@ -0,0 +1,78 @@
+"""GIF block stripping must drop comments and XMP, and keep every frame and the loop"""
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image, ImageSequence  # noqa: E402
+
+from stripper.gif import gif_has_metadata, strip_gif  # noqa: E402
+
+
+def sub_blocks(data):
+    """data split into GIF sub-blocks, with the terminator"""
+    return b"".join(bytes([len(data[i:i + 255])]) + data[i:i + 255] for i in range(0, len(data), 255)) + b"\0"
+
+
+def make_gif(path):
+    """Write a looping three-frame GIF with a comment and an XMP application extension"""
+    frames = [Image.effect_noise((97, 61), 40 + 20 * index).convert("P") for index in range(3)]
+    frames[0].save(path, save_all=True, append_images=frames[1:], loop=0, duration=100, comment=b"secret comment")
+    xmp = b"\x21\xff\x0bXMP DataXMP" + sub_blocks(b"<x:xmpmeta>secret xmp</x:xmpmeta>" * 20)
+    with open(path, 'rb') as f:
+        data = f.read()
+    # Just before the trailer, where XMP writers put it
+    with open(path, 'wb') as f:
+        f.write(data[:-1] + xmp + data[-1:])
+    return path
+
+
+def strip(source, output):
+    with open(source, 'rb') as src, open(output, 'wb') as dst:
+        return strip_gif(src, dst)
+
+
+def test_metadata_is_dropped_and_frames_kept(tmp_path):
+    source = make_gif(str(tmp_path / "in.gif"))
+    output = str(tmp_path / "out.gif")
+
+    with open(source, 'rb') as src:
+        assert gif_has_metadata(src)
+    assert strip(source, output) == 2
+
+    with open(output, 'rb') as f:
+        data = f.read()
+        assert not gif_has_metadata(f)
+    assert b"secret" not in data and b"XMP Data" not in data
+    assert b"NETSCAPE2.0" in data
+    with Image.open(source) as before, Image.open(output) as after:
+        assert after.n_frames == before.n_frames == 3
+        assert after.info["loop"] == 0
+        for frame_before, frame_after in zip(ImageSequence.Iterator(before), ImageSequence.Iterator(after)):
+            assert frame_after.convert("RGB").tobytes() == frame_before.convert("RGB").tobytes()
+
+
+def test_data_after_trailer_is_dropped(tmp_path):
+    source = make_gif(str(tmp_path / "in.gif"))
+    with open(source, 'ab') as f:
+        f.write(b"secret trailer")
+    output = str(tmp_path / "out.gif")
+
+    strip(source, output)
+    with open(output, 'rb') as f:
+        assert f.read().endswith(b"\0;")
+
+
+@pytest.mark.parametrize("edit", [
+    lambda data: data[:len(data) // 2],          # Truncated in a frame
+    lambda data: data[:-1] + b"\x99",            # Unknown block instead of the trailer
+    lambda data: b"JPEG89a" + data[6:],          # Not a GIF
+])
+def test_malformed_input_raises_value_error(tmp_path, edit):
+    source = make_gif(str(tmp_path / "in.gif"))
+    with open(source, 'rb') as f:
+        data = edit(f.read())
+    with open(source, 'wb') as f:
+        f.write(data)
+
+    with pytest.raises(ValueError):
+        strip(source, str(tmp_path / "out.gif"))
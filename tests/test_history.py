@@ -0,0 +1,109 @@
+"""History paging and search must be served by indexes, not table scans"""
+
+import sqlite3
+
+import pytest
+
+from stripper.history import HistoryStore, _where
+
+
+def make_store(path, count):
+    store = HistoryStore(str(path))
+    for index in range(count):
+        store.add({
+            "timestamp": "2024-01-01 00:00:00",
+            "source_file": f"/photos/{'Holiday' if index % 10 == 0 else 'misc'}/img_{index:05d}.jpg",
+            "output_file": f"/clean/img_{index:05d}_clean.jpg",
+            "status": "Success" if index % 2 else "Failed: bad file",
+            "duration": 0.1,
+        })
+    store.flush()
+    return store
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = make_store(tmp_path / "history.db", 1000)
+    if not store.full_text:
+        store.close()
+        pytest.skip("SQLite without FTS5 trigram support")
+    yield store
+    store.close()
+
+
+def query_plan(store, search, status):
+    where, params = _where(search, status, store.full_text, ["id > ?"], [500])
+    rows = store.connection.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM history" + where + " ORDER BY id LIMIT 10", params
+    ).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+def test_keyset_pages(store):
+    newest = store.fetch(5)
+    assert [entry["source_file"][-9:] for entry in newest] == [f"{i:05d}.jpg" for i in range(995, 1000)]
+
+    top = store.seek(newest[0]["id"], -100)
+    page = store.fetch(5, start=top)
+    assert page[0]["id"] == newest[0]["id"] - 100
+    assert [entry["id"] for entry in page] == list(range(page[0]["id"], page[0]["id"] + 5))
+
+    # Seeking past either end stops at the first or last entry
+    first, last = store.id_range()
+    assert store.seek(top, -5000) == first
+    assert store.seek(top, 5000) == last
+
+
+def test_filtered_pages(store):
+    page = store.fetch(3, "holiday", "Failed")
+    assert all("Holiday" in entry["source_file"] and entry["status"].startswith("Failed") for entry in page)
+    assert store.count("holiday", "Failed") == 100
+
+    previous = store.seek(page[0]["id"], -1, "holiday", "Failed")
+    assert page[0]["id"] - previous == 10
+    assert store.fetch(1, "holiday", "Failed", start=previous + 1)[0]["id"] == page[0]["id"]
+
+
+def test_search_matches_inside_either_path(store):
+    assert store.count("_00042") == 1
+    assert store.count("00042_clean") == 1
+    assert store.count("100%") == 0
+    # Too short for trigrams, but the same case-insensitive substring match
+    assert store.count("/P") == 1000
+    assert store.count("_0") == 1000
+    assert store.count("y/") == 100
+
+
+def test_search_without_full_text_index(store):
+    store.full_text = False
+
+    assert store.count("HOLIDAY") == 100
+    assert store.count("00042_clean") == 1
+    assert store.fetch(3, "holiday", "Failed")[0]["source_file"].startswith("/photos/Holiday/")
+
+
+def test_search_and_paging_use_indexes(store):
+    for search, status in [("holiday", None), (None, "Failed"), ("holiday", "Success")]:
+        plan = query_plan(store, search, status)
+        assert "SCAN history" not in plan.replace("SCAN history_paths VIRTUAL TABLE", ""), plan
+
+
+def test_existing_history_is_indexed(tmp_path):
+    path = tmp_path / "history.db"
+    make_store(path, 20).close()
+    with sqlite3.connect(str(path)) as connection:
+        connection.execute("DROP TABLE IF EXISTS history_paths")
+        connection.execute("DROP TRIGGER IF EXISTS history_paths_insert")
+        connection.execute("DROP TRIGGER IF EXISTS history_paths_delete")
+    connection.close()
+
+    store = HistoryStore(str(path))
+    try:
+        if not store.full_text:
+            pytest.skip("SQLite without FTS5 trigram support")
+        assert store.count("holiday") == 2
+        store.prune(max_entries=5)
+        assert store.count("holiday") == 0
+        assert store.count("img_0001") == 5
+    finally:
+        store.close()
@@ -0,0 +1,28 @@
+"""Resuming a batch must only clean up after the batch itself"""
+
+from stripper.journal import BatchJournal
+from stripper.output import PARTIAL_SUFFIX
+
+
+def test_resume_keeps_planned_outputs_and_removes_partials(tmp_path):
+    source = tmp_path / "a.jpg"
+    source.write_bytes(b"source")
+    out = tmp_path / "out"
+    out.mkdir()
+    # A file that was in the output directory before the batch started
+    existing = out / "a.jpg"
+    existing.write_bytes(b"not ours")
+    partial = out / f".a.jpg.1234{PARTIAL_SUFFIX}.jpg"
+    partial.write_bytes(b"half")
+
+    journal = BatchJournal(str(tmp_path / "journal.db"))
+    try:
+        batch_id = journal.begin(str(out), False, {str(source): str(existing)})
+        files, output_paths = journal.resume(batch_id)
+    finally:
+        journal.close()
+
+    assert files == [str(source)]
+    assert output_paths[str(source)] == str(existing)
+    assert existing.read_bytes() == b"not ours"
+    assert not partial.exists()
@@ -0,0 +1,62 @@
+"""JPEG segment stripping must drop metadata and leave the scan data alone"""
+
+import io
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+
+from stripper.jpeg import jpeg_has_metadata, strip_jpeg  # noqa: E402
+
+
+def make_jpeg(progressive=False):
+    """A JPEG with EXIF, XMP, a comment and an ICC profile"""
+    exif = Image.Exif()
+    exif[0x010F] = "SecretCam"
+    exif[0x0131] = "SecretSoft"
+    buffer = io.BytesIO()
+    Image.effect_noise((97, 61), 60).convert("RGB").save(
+        buffer, "JPEG", exif=exif, comment=b"secret comment", xmp=b"<x:xmpmeta>secret</x:xmpmeta>",
+        icc_profile=b"\0" * 12 + b"ICC profile", progressive=progressive
+    )
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("progressive", [False, True])
+def test_metadata_is_dropped_and_pixels_kept(progressive):
+    data = make_jpeg(progressive)
+    output = io.BytesIO()
+
+    assert jpeg_has_metadata(io.BytesIO(data))
+    assert strip_jpeg(io.BytesIO(data), output) == 3
+    stripped = output.getvalue()
+
+    assert b"secret" not in stripped
+    assert not jpeg_has_metadata(io.BytesIO(stripped))
+    with Image.open(io.BytesIO(data)) as before, Image.open(io.BytesIO(stripped)) as after:
+        assert [marker for marker, _ in after.applist] == ["APP0", "APP2"]
+        assert after.info.get("icc_profile") == before.info["icc_profile"]
+        assert after.tobytes() == before.tobytes()
+
+
+def test_trailing_data_counts_as_metadata():
+    data = make_jpeg() + b"secret trailer"
+    output = io.BytesIO()
+
+    assert jpeg_has_metadata(io.BytesIO(data))
+    strip_jpeg(io.BytesIO(data), output)
+    assert output.getvalue().endswith(b"\xff\xd9")
+
+
+@pytest.mark.parametrize("damage", [
+    lambda data: data[:len(data) // 2],               # Truncated in the scan
+    lambda data: data[:30],                           # Truncated in a segment
+    lambda data: data[:2] + b"\xff\xe1\x00\x01",      # Segment length below 2
+    lambda data: b"\0" + data[1:],                    # Not a JPEG
+])
+def test_malformed_input_raises_value_error(damage):
+    data = damage(make_jpeg())
+
+    with pytest.raises(ValueError):
+        strip_jpeg(io.BytesIO(data), io.BytesIO())
@@ -0,0 +1,106 @@
+"""Re-encoding in bands must keep pixels intact and stay within the memory limit"""
+
+import os
+import struct
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+
+from stripper.metrics import Spans  # noqa: E402
+from stripper.reencode import reencode_image  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_bmp(path, width, height):
+    """Write a 24-bit bottom-up BMP with a row-varying pattern, without holding it in memory"""
+    stride = (width * 3 + 3) & ~3
+    pattern = bytes(range(256)) * (stride // 256 + 2)
+    with open(path, 'wb') as f:
+        f.write(b"BM" + struct.pack("<IHHI", 54 + stride * height, 0, 0, 54))
+        f.write(struct.pack("<IiiHHIIiiII", 40, width, height, 1, 24, 0, stride * height, 2835, 2835, 0, 0))
+        for row in range(height):
+            f.write(pattern[row % 251:row % 251 + stride])
+    return 54
+
+
+def pixel_data(path, offset, chunk_size=1024 * 1024):
+    """Yield the pixel array of a BMP in chunks"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def test_large_bmp_stays_within_a_few_bands(tmp_path):
+    # 12000 x 8000 RGB: 288 MB on disk, 384 MB once decoded by PIL
+    source = str(tmp_path / "large.bmp")
+    output = str(tmp_path / "large_out.bmp")
+    offset = write_bmp(source, 12000, 8000)
+    memory_limit = 16 * 1024 * 1024
+
+    # ru_maxrss is per process, so measure in a fresh one
+    script = textwrap.dedent(f"""
+        import resource
+        from stripper.metrics import Spans
+        from stripper.reencode import reencode_image
+        import PIL.BmpImagePlugin
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        spans = Spans()
+        reencode_image({source!r}, {output!r}, spans, memory_limit={memory_limit})
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(spans.handler, (peak - baseline) * 1024)
+    """)
+    completed = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    handler, growth = completed.stdout.split()
+
+    assert handler == "reencode_bands"
+    # A band is at most memory_limit / 2; allow for the read buffer, the band and its encoded copy
+    assert int(growth) < 3 * memory_limit
+    assert os.path.getsize(output) == os.path.getsize(source)
+    assert all(a == b for a, b in zip(pixel_data(source, offset), pixel_data(output, offset)))
+
+
+@pytest.mark.parametrize("mode", ["1", "L", "P", "RGB", "RGBA", "CMYK"])
+@pytest.mark.parametrize("extension", [".bmp", ".tif"])
+def test_bands_keep_pixels(tmp_path, mode, extension):
+    if mode == "CMYK" and extension == ".bmp":
+        pytest.skip("BMP has no CMYK")
+    noise = Image.effect_noise((333, 211), 60)
+    if mode == "P":
+        image = noise.convert("RGB").quantize(200)
+    elif mode == "RGBA":
+        image = Image.merge("RGBA", [noise, noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT),
+                                     noise.transpose(Image.Transpose.FLIP_TOP_BOTTOM), noise.point(lambda v: 255 - v)])
+    else:
+        image = noise.convert(mode)
+    source = str(tmp_path / f"source{extension}")
+    output = str(tmp_path / f"output{extension}")
+    image.save(source)
+
+    spans = Spans()
+    reencode_image(source, output, spans, memory_limit=20000)
+
+    assert spans.handler == "reencode_bands"
+    with Image.open(source) as before, Image.open(output) as after:
+        assert (after.mode, after.size) == (before.mode, before.size)
+        assert after.tobytes() == before.tobytes()
+        if mode == "P":
+            assert after.convert("RGB").tobytes() == before.convert("RGB").tobytes()
+
+
+def test_compressed_image_over_the_limit_is_refused(tmp_path):
+    source = str(tmp_path / "lzw.tif")
+    Image.effect_noise((333, 211), 60).save(source, compression="tiff_lzw")
+
+    with pytest.raises(ValueError):
+        reencode_image(source, str(tmp_path / "out.tif"), Spans(), memory_limit=20000)
+    assert not os.path.exists(str(tmp_path / "out.tif"))
@@ -0,0 +1,157 @@
+"""MP4 box stripping must drop metadata and keep every chunk offset pointing at its samples"""
+
+import os
+import struct
+
+import pytest
+
+from stripper.mp4 import XMP_UUID, mp4_has_metadata, strip_mp4
+
+SAMPLES = [os.urandom(size) for size in (300, 17, 1024)]
+
+CONTAINERS = (b"moov", b"trak", b"mdia", b"minf", b"stbl")
+
+
+def box(box_type, *payload):
+    data = b"".join(payload)
+    return struct.pack(">I4s", len(data) + 8, box_type) + data
+
+
+def full_box(box_type, version, payload):
+    return box(box_type, bytes([version, 0, 0, 0]), payload)
+
+
+def chunk_offsets(offsets, co64):
+    if co64:
+        return full_box(b"co64", 0, struct.pack(">I%dQ" % len(offsets), len(offsets), *offsets))
+    return full_box(b"stco", 0, struct.pack(">I%dI" % len(offsets), len(offsets), *offsets))
+
+
+def make_moov(offsets, co64):
+    """A moov with one track, timestamps and iTunes-style metadata in udta"""
+    times = struct.pack(">II", 3600000000, 3600000001)
+    ilst = box(b"ilst", box(b"\xa9nam", box(b"data", b"\0\0\0\1\0\0\0\0secret title")))
+    return box(
+        b"moov",
+        full_box(b"mvhd", 0, times + struct.pack(">II", 1000, 3000) + bytes(80)),
+        box(b"trak",
+            full_box(b"tkhd", 0, times + bytes(72)),
+            box(b"mdia",
+                full_box(b"mdhd", 0, times + struct.pack(">II", 1000, 3000) + bytes(4)),
+                box(b"minf", box(b"stbl", chunk_offsets(offsets, co64)))),
+            box(b"udta", box(b"\xa9cmt", b"secret comment"))),
+        box(b"udta", full_box(b"meta", 0, ilst)),
+    )
+
+
+def make_mp4(path, moov_first, co64=False):
+    """Write an MP4 with top-level metadata around mdat, before or after moov"""
+    ftyp = box(b"ftyp", b"isom", bytes(4), b"isommp41")
+    xmp = box(b"uuid", XMP_UUID, b"<x:xmpmeta>secret</x:xmpmeta>")
+    mdat = box(b"mdat", *SAMPLES)
+    moov_size = len(make_moov([0] * len(SAMPLES), co64))
+    mdat_start = len(ftyp) + len(xmp) + (moov_size if moov_first else 0)
+    offsets = []
+    position = mdat_start + 8
+    for sample in SAMPLES:
+        offsets.append(position)
+        position += len(sample)
+    moov = make_moov(offsets, co64)
+    if moov_first:
+        boxes = [ftyp, xmp, moov, mdat, box(b"meta", bytes(4))]
+    else:
+        boxes = [ftyp, xmp, mdat, box(b"free", bytes(16)), moov]
+    with open(path, 'wb') as f:
+        f.write(b"".join(boxes))
+    return path
+
+
+def iter_boxes(data, start, end):
+    while start < end:
+        size, box_type = struct.unpack_from(">I4s", data, start)
+        yield box_type, start, size
+        if box_type in CONTAINERS:
+            yield from iter_boxes(data, start + 8, start + size)
+        start += size
+
+
+def find_boxes(data):
+    return {box_type: (offset, size) for box_type, offset, size in iter_boxes(data, 0, len(data))}
+
+
+def read_offsets(data):
+    boxes = find_boxes(data)
+    if b"co64" in boxes:
+        offset, _ = boxes[b"co64"]
+        count = struct.unpack_from(">I", data, offset + 12)[0]
+        return struct.unpack_from(">%dQ" % count, data, offset + 16)
+    offset, _ = boxes[b"stco"]
+    count = struct.unpack_from(">I", data, offset + 12)[0]
+    return struct.unpack_from(">%dI" % count, data, offset + 16)
+
+
+def strip(source, output):
+    with open(source, 'rb') as src, open(output, 'wb') as dst:
+        return strip_mp4(src, dst)
+
+
+@pytest.mark.parametrize("moov_first", [True, False])
+@pytest.mark.parametrize("co64", [False, True])
+def test_metadata_is_dropped_and_samples_kept(tmp_path, moov_first, co64):
+    source = make_mp4(str(tmp_path / "in.mp4"), moov_first, co64)
+    output = str(tmp_path / "out.mp4")
+
+    with open(source, 'rb') as src:
+        assert mp4_has_metadata(src)
+    assert strip(source, output) == (4 if moov_first else 3)
+
+    with open(output, 'rb') as f:
+        data = f.read()
+        assert not mp4_has_metadata(f)
+    assert b"secret" not in data and XMP_UUID not in data
+    boxes = find_boxes(data)
+    assert not set(boxes) & {b"udta", b"meta", b"uuid", b"\xa9nam", b"\xa9cmt"}
+    # Creation and modification times are zeroed
+    for box_type in (b"mvhd", b"tkhd", b"mdhd"):
+        offset, _ = boxes[box_type]
+        assert data[offset + 12:offset + 20] == bytes(8)
+    # Each chunk offset still points at its sample
+    offsets = read_offsets(data)
+    assert [data[offset:offset + len(sample)] for offset, sample in zip(offsets, SAMPLES)] == SAMPLES
+
+    # Stripping again changes nothing
+    again = str(tmp_path / "again.mp4")
+    assert strip(output, again) == 0
+    with open(again, 'rb') as f:
+        assert f.read() == data
+
+
+def damage(path, edit):
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(edit(data))
+
+
+@pytest.mark.parametrize("edit", [
+    lambda data: data[:-10],                                            # Truncated
+    lambda data: data.replace(                                          # Box size past its parent
+        struct.pack(">I4s", 16 + 4 * len(SAMPLES), b"stco"), struct.pack(">I4s", 0xFFFF, b"stco"), 1),
+    lambda data: data.replace(b"ftyp", b"moof", 1),                     # Fragmented
+    lambda data: b"\0\0\0\x08junk" + data,                              # Not an MP4
+])
+def test_malformed_input_raises_value_error(tmp_path, edit):
+    source = make_mp4(str(tmp_path / "in.mp4"), True)
+    damage(source, edit)
+
+    with pytest.raises(ValueError):
+        strip(source, str(tmp_path / "out.mp4"))
+
+
+def test_chunk_offset_into_removed_data_raises_value_error(tmp_path):
+    source = make_mp4(str(tmp_path / "in.mp4"), False)
+    # Point the first chunk into the XMP box, which is dropped
+    damage(source, lambda data: data.replace(struct.pack(">I", read_offsets(data)[0]), struct.pack(">I", 40), 1))
+
+    with pytest.raises(ValueError):
+        strip(source, str(tmp_path / "out.mp4"))
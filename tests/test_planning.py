@@ -0,0 +1,37 @@
+"""Output planning must never put a cleaned file over its original"""
+
+import json
+import os
+
+from stripper import cli
+from stripper.core import plan_output_paths
+
+
+def test_relative_input_with_absolute_output_dir(tmp_path, monkeypatch):
+    (tmp_path / "a.jpg").write_bytes(b"")
+    monkeypatch.chdir(tmp_path)
+
+    output_paths = plan_output_paths(["a.jpg"], str(tmp_path))
+
+    assert output_paths["a.jpg"] == os.path.join(str(tmp_path), "a_clean.jpg")
+
+
+def test_absolute_input_with_relative_output_dir(tmp_path, monkeypatch):
+    (tmp_path / "a.jpg").write_bytes(b"")
+    monkeypatch.chdir(tmp_path)
+
+    output_paths = plan_output_paths([str(tmp_path / "a.jpg")], ".")
+
+    assert os.path.basename(output_paths[str(tmp_path / "a.jpg")]) == "a_clean.jpg"
+
+
+def test_cli_relative_input_with_absolute_out(tmp_path, monkeypatch, capsys):
+    (tmp_path / "a.jpg").write_bytes(b"")
+    monkeypatch.chdir(tmp_path)
+
+    assert cli.main(["--dry-run", "--out", str(tmp_path), "a.jpg"]) == 0
+
+    plans = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    plan = next(record for record in plans if record["event"] == "plan")
+    assert plan["output_file"] == os.path.join(str(tmp_path), "a_clean.jpg")
+    assert plan["action"] == "new"
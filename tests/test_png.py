@@ -0,0 +1,84 @@
+"""PNG chunk stripping must drop metadata chunks and copy the rest untouched"""
+
+import io
+import struct
+import zlib
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image, PngImagePlugin  # noqa: E402
+
+from stripper.png import PNG_SIGNATURE, png_has_metadata, strip_png  # noqa: E402
+
+
+def chunk_types(data):
+    """Chunk types of a PNG, in file order"""
+    types = []
+    offset = len(PNG_SIGNATURE)
+    while offset < len(data):
+        length, chunk_type = struct.unpack_from(">I4s", data, offset)
+        types.append(chunk_type)
+        offset += length + 12
+    return types
+
+
+def make_png(mode="RGB"):
+    """A PNG with tEXt, zTXt, iTXt, eXIf and tIME chunks"""
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Comment", "secret text")
+    info.add_text("Author", "secret zipped " * 20, zip=True)
+    info.add_itxt("Description", "secret international", lang="en")
+    info.add(b"tIME", struct.pack(">HBBBBB", 2024, 1, 2, 3, 4, 5))
+    exif = Image.Exif()
+    exif[0x010F] = "SecretCam"
+    image = Image.effect_noise((97, 61), 60).convert("RGB")
+    extra = {}
+    if mode == "P":
+        image = image.quantize(50)
+        extra["transparency"] = 7
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG", pnginfo=info, exif=exif, **extra)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("mode", ["RGB", "P"])
+def test_metadata_chunks_are_dropped_and_pixels_kept(mode):
+    data = make_png(mode)
+    output = io.BytesIO()
+
+    assert png_has_metadata(io.BytesIO(data))
+    assert strip_png(io.BytesIO(data), output) == 5
+    stripped = output.getvalue()
+
+    assert b"secret" not in stripped and b"SecretCam" not in stripped
+    assert not png_has_metadata(io.BytesIO(stripped))
+    assert not set(chunk_types(stripped)) & {b"tEXt", b"zTXt", b"iTXt", b"eXIf", b"tIME"}
+    # Everything else is copied as it was, CRCs included
+    assert [t for t in chunk_types(data) if t in chunk_types(stripped)] == chunk_types(stripped)
+    with Image.open(io.BytesIO(data)) as before, Image.open(io.BytesIO(stripped)) as after:
+        after.load()
+        assert after.mode == before.mode
+        assert after.info.get("transparency") == before.info.get("transparency")
+        assert after.tobytes() == before.tobytes()
+
+
+def test_data_after_iend_is_dropped():
+    data = make_png() + b"secret trailer"
+    output = io.BytesIO()
+
+    strip_png(io.BytesIO(data), output)
+    assert output.getvalue().endswith(b"IEND" + struct.pack(">I", zlib.crc32(b"IEND")))
+
+
+@pytest.mark.parametrize("damage", [
+    lambda data: data[:len(data) - 20],                              # Truncated in IDAT
+    lambda data: data[:50],                                          # Truncated in a dropped chunk
+    lambda data: data[:33] + b"\xff\xff\xff\xfftEXt" + data[41:],    # Chunk length over 2^31
+    lambda data: b"\0" + data[1:],                                   # Not a PNG
+])
+def test_malformed_input_raises_value_error(damage):
+    data = damage(make_png())
+
+    with pytest.raises(ValueError):
+        strip_png(io.BytesIO(data), io.BytesIO())
@@ -0,0 +1,82 @@
+"""Re-encoding without a memory limit must keep pixels and drop everything else"""
+
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image, PngImagePlugin, TiffImagePlugin  # noqa: E402
+
+from stripper.metrics import Spans  # noqa: E402
+from stripper.reencode import reencode_image  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("extension", [".png", ".gif"])
+def test_palette_and_transparency_survive(tmp_path, extension):
+    source = str(tmp_path / f"source{extension}")
+    output = str(tmp_path / f"output{extension}")
+    image = Image.effect_noise((97, 61), 60).convert("RGB").quantize(50)
+    if extension == ".png":
+        info = PngImagePlugin.PngInfo()
+        info.add_text("Comment", "secret")
+        image.save(source, transparency=7, pnginfo=info)
+    else:
+        image.save(source, transparency=7, comment=b"secret")
+
+    spans = Spans()
+    reencode_image(source, output, spans, memory_limit=None)
+
+    assert set(spans.stages) >= {"decode", "encode"}
+    with Image.open(source) as before, Image.open(output) as after:
+        assert after.mode == before.mode == "P"
+        assert after.getpalette() == before.getpalette()
+        assert after.info.get("transparency") == before.info["transparency"] == 7
+        assert after.tobytes() == before.tobytes()
+        assert "Comment" not in after.info and "comment" not in after.info
+
+
+@pytest.mark.parametrize("mode", ["L", "RGB", "RGBA", "CMYK"])
+def test_tiff_tags_are_dropped(tmp_path, mode):
+    source = str(tmp_path / "source.tif")
+    output = str(tmp_path / "output.tif")
+    tags = TiffImagePlugin.ImageFileDirectory_v2()
+    tags[270] = "secret description"
+    tags[305] = "secret software"
+    Image.effect_noise((97, 61), 60).convert(mode).save(source, tiffinfo=tags)
+
+    reencode_image(source, output, memory_limit=None)
+
+    with Image.open(source) as before, Image.open(output) as after:
+        assert before.tag_v2[270] == "secret description"
+        assert 270 not in after.tag_v2 and 305 not in after.tag_v2
+        assert (after.mode, after.size) == (before.mode, before.size)
+        assert after.tobytes() == before.tobytes()
+
+
+def test_peak_memory_is_about_two_bitmaps(tmp_path):
+    # 4000 x 3000 RGB: 36 MB decoded
+    source = str(tmp_path / "large.bmp")
+    output = str(tmp_path / "large_out.bmp")
+    Image.effect_noise((4000, 3000), 60).convert("RGB").save(source)
+    decoded = 4000 * 3000 * 3
+
+    # ru_maxrss is per process, so measure in a fresh one
+    script = textwrap.dedent(f"""
+        import resource
+        from stripper.reencode import reencode_image
+        import PIL.BmpImagePlugin
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        reencode_image({source!r}, {output!r}, memory_limit=None)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print((peak - baseline) * 1024)
+    """)
+    completed = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+
+    assert int(completed.stdout) < 2.5 * decoded
+    with Image.open(source) as before, Image.open(output) as after:
+        assert after.tobytes() == before.tobytes()
@@ -0,0 +1,100 @@
+"""TIFF tag stripping must drop metadata tags and keep every page's image data"""
+
+import struct
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image, ImageSequence, TiffImagePlugin  # noqa: E402
+
+from stripper.tiff import TIFF_METADATA_TAGS, tiff_has_metadata, strip_tiff  # noqa: E402
+
+
+def make_tiff(path, big_tiff=False, compression="raw"):
+    """Write a three-page TIFF with description, software, date and EXIF tags on every page"""
+    tags = TiffImagePlugin.ImageFileDirectory_v2()
+    tags[270] = "secret description"
+    tags[305] = "secret software"
+    tags[306] = "2024:01:02 03:04:05"
+    exif = Image.Exif()
+    exif[0x010F] = "SecretCam"
+    pages = [Image.effect_noise((97, 61), 60 + index).convert(mode)
+             for index, mode in enumerate(["RGB", "L", "RGBA"])]
+    pages[0].save(path, save_all=True, append_images=pages[1:], tiffinfo=tags, exif=exif,
+                  big_tiff=big_tiff, compression=compression)
+    return path
+
+
+def strip(source, output):
+    with open(source, 'rb') as src, open(output, 'wb') as dst:
+        return strip_tiff(src, dst)
+
+
+# Pillow writes compressed TIFFs through libtiff, which only writes classic TIFF
+@pytest.mark.parametrize("big_tiff, compression", [(False, "raw"), (True, "raw"), (False, "tiff_lzw")])
+def test_metadata_tags_are_dropped_and_pages_kept(tmp_path, big_tiff, compression):
+    source = make_tiff(str(tmp_path / "in.tif"), big_tiff, compression)
+    output = str(tmp_path / "out.tif")
+    header = b"II+\0" if big_tiff else b"II*\0"
+    with open(source, 'rb') as f:
+        assert f.read(4) == header
+
+    with open(source, 'rb') as src:
+        assert tiff_has_metadata(src)
+    assert strip(source, output) > 0
+
+    with open(output, 'rb') as f:
+        data = f.read()
+        assert not tiff_has_metadata(f)
+    assert data[:4] == header
+    assert b"secret" not in data and b"SecretCam" not in data
+    with Image.open(source) as before, Image.open(output) as after:
+        assert after.n_frames == before.n_frames == 3
+        for page_before, page_after in zip(ImageSequence.Iterator(before), ImageSequence.Iterator(after)):
+            assert not set(page_after.tag_v2) & TIFF_METADATA_TAGS
+            assert page_after.tag_v2[259] == page_before.tag_v2[259]
+            assert (page_after.mode, page_after.size) == (page_before.mode, page_before.size)
+            assert page_after.tobytes() == page_before.tobytes()
+
+
+def first_ifd_next_field(data):
+    """Position of the next-IFD field of a classic little-endian TIFF's first directory"""
+    first = struct.unpack_from("<I", data, 4)[0]
+    count = struct.unpack_from("<H", data, first)[0]
+    return first, first + 2 + 12 * count
+
+
+def loop(data):
+    first, next_field = first_ifd_next_field(data)
+    return data[:next_field] + struct.pack("<I", first) + data[next_field + 4:]
+
+
+def strip_offsets_past_end(data):
+    # Every strip of the first page now ends beyond the file
+    first, next_field = first_ifd_next_field(data)
+    for position in range(first + 2, next_field, 12):
+        tag, field_type, count = struct.unpack_from("<HHI", data, position)
+        if tag == 273:
+            value = struct.pack("<I", len(data)) if count == 1 else None
+            assert value is not None
+            return data[:position + 8] + value + data[position + 12:]
+    raise AssertionError("No StripOffsets")
+
+
+@pytest.mark.parametrize("edit", [
+    lambda data: data[:len(data) // 2],     # Truncated
+    loop,                                   # Directory chain that loops
+    strip_offsets_past_end,                 # Image data past the end of the file
+    lambda data: b"XX" + data[2:],          # Not a TIFF
+])
+def test_malformed_input_raises_value_error(tmp_path, edit):
+    source = str(tmp_path / "in.tif")
+    Image.effect_noise((97, 61), 60).convert("RGB").save(source, compression="tiff_lzw",
+                                                         tiffinfo={270: "secret description"})
+    with open(source, 'rb') as f:
+        data = edit(f.read())
+    with open(source, 'wb') as f:
+        f.write(data)
+
+    with pytest.raises(ValueError):
+        strip(source, str(tmp_path / "out.tif"))
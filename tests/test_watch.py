@@ -0,0 +1,91 @@
+"""The watch daemon must pick up every new file, and never its own outputs"""
+
+import os
+import time
+
+import pytest
+
+from stripper import cli
+from stripper.watch import FolderWatcher, WatchDaemon
+
+
+def test_output_dir_can_not_be_a_watched_folder(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(ValueError):
+        WatchDaemon([str(tmp_path)], ".", use_inotify=False)
+
+
+def test_cli_rejects_out_equal_to_watched_folder(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(SystemExit):
+        cli.main(["--watch", "--out", str(tmp_path), "."])
+
+
+def test_outputs_are_never_queued(tmp_path):
+    watched = tmp_path / "in"
+    watched.mkdir()
+    daemon = WatchDaemon([str(watched)], str(tmp_path / "out"), use_inotify=False)
+    try:
+        output_path = daemon.output_paths([str(watched / "a.jpg")])[str(watched / "a.jpg")]
+        new_file = str(watched / "b.jpg")
+        polls = []
+
+        def ready(timeout):
+            # The first poll reports an output and a new file; the second one stops the daemon
+            polls.append(timeout)
+            if len(polls) > 1:
+                daemon.stop()
+                return []
+            return [(output_path, 0.0), (new_file, 0.0)]
+
+        daemon.watcher.ready = ready
+        daemon.watch()
+        assert daemon.queue.get_nowait() == (new_file, 0.0)
+        assert daemon.queue.get_nowait() is None
+    finally:
+        daemon.watcher.close()
+
+
+def test_hard_linked_file_is_picked_up(tmp_path):
+    watched = tmp_path / "in"
+    watched.mkdir()
+    source = tmp_path / "a.jpg"
+    source.write_bytes(b"image")
+    watcher = FolderWatcher([str(watched)], settle=0.05)
+    try:
+        if watcher.inotify is None:
+            pytest.skip("inotify not available")
+        # Linking sends IN_CREATE and no IN_CLOSE_WRITE
+        os.link(str(source), str(watched / "a.jpg"))
+        deadline = time.monotonic() + 5
+        settled = []
+        while not settled and time.monotonic() < deadline:
+            settled = watcher.ready(0.1)
+        assert [path for path, _ in settled] == [str(watched / "a.jpg")]
+    finally:
+        watcher.close()
+
+
+def test_file_being_written_waits_for_close(tmp_path):
+    watched = tmp_path / "in"
+    watched.mkdir()
+    watcher = FolderWatcher([str(watched)], settle=0.05)
+    try:
+        if watcher.inotify is None:
+            pytest.skip("inotify not available")
+        with open(str(watched / "a.jpg"), 'wb') as f:
+            f.write(b"half")
+            f.flush()
+            deadline = time.monotonic() + 0.5
+            while time.monotonic() < deadline:
+                assert watcher.ready(0.05) == []
+            f.write(b" and the rest")
+        settled = []
+        deadline = time.monotonic() + 5
+        while not settled and time.monotonic() < deadline:
+            settled = watcher.ready(0.1)
+        assert [path for path, _ in settled] == [str(watched / "a.jpg")]
+    finally:
+        watcher.close()
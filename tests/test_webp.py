@@ -0,0 +1,95 @@
+"""WebP chunk stripping must drop EXIF and XMP, clear their flags and keep the bitstream"""
+
+import struct
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image, features  # noqa: E402
+
+from stripper.webp import webp_has_metadata, strip_webp  # noqa: E402
+
+if not features.check("webp"):
+    pytest.skip("Pillow without WebP support", allow_module_level=True)
+
+ICC = bytes(12) + b"ICC profile"
+
+
+def make_webp(path, mode="RGB"):
+    """Write a lossless WebP with EXIF, XMP and an ICC profile"""
+    exif = Image.Exif()
+    exif[0x010F] = "SecretCam"
+    image = Image.effect_noise((97, 61), 60).convert(mode)
+    image.save(path, lossless=True, exif=exif, xmp=b"<x:xmpmeta>secret</x:xmpmeta>", icc_profile=ICC)
+    return path
+
+
+def chunks(data):
+    """(fourcc, payload) of every chunk in a WebP"""
+    found = []
+    offset = 12
+    while offset < len(data):
+        fourcc, size = struct.unpack_from("<4sI", data, offset)
+        found.append((fourcc, data[offset + 8:offset + 8 + size]))
+        offset += 8 + size + (size & 1)
+    return found
+
+
+def strip(source, output):
+    with open(source, 'rb') as src, open(output, 'wb') as dst:
+        return strip_webp(src, dst)
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+def test_metadata_is_dropped_and_pixels_kept(tmp_path, mode):
+    source = make_webp(str(tmp_path / "in.webp"), mode)
+    output = str(tmp_path / "out.webp")
+
+    with open(source, 'rb') as src:
+        assert webp_has_metadata(src)
+    assert strip(source, output) == 2
+
+    with open(output, 'rb') as f:
+        data = f.read()
+        assert not webp_has_metadata(f)
+    assert b"secret" not in data and b"SecretCam" not in data
+    assert struct.unpack_from("<I", data, 4)[0] == len(data) - 8
+    found = dict(chunks(data))
+    assert not {b"EXIF", b"XMP "} & set(found)
+    # EXIF (0x08) and XMP (0x04) flags cleared, ICC (0x20) kept
+    assert found[b"VP8X"][0] & 0x0C == 0 and found[b"VP8X"][0] & 0x20
+    with Image.open(source) as before, Image.open(output) as after:
+        assert after.info.get("icc_profile") == ICC
+        assert "exif" not in after.info and "xmp" not in after.info
+        assert (after.mode, after.size) == (before.mode, before.size)
+        assert after.tobytes() == before.tobytes()
+
+
+def test_data_after_riff_is_dropped(tmp_path):
+    source = make_webp(str(tmp_path / "in.webp"))
+    with open(source, 'ab') as f:
+        f.write(b"secret trailer")
+    output = str(tmp_path / "out.webp")
+
+    strip(source, output)
+    with open(output, 'rb') as f:
+        data = f.read()
+    assert b"secret" not in data and len(data) == struct.unpack_from("<I", data, 4)[0] + 8
+
+
+@pytest.mark.parametrize("edit", [
+    lambda data: data[:40],                                               # Truncated in the ICC chunk
+    lambda data: data[:-100],                                             # Truncated in the bitstream
+    lambda data: data[:4] + struct.pack("<I", len(data) - 7) + data[8:],  # Odd RIFF size
+    lambda data: data[:16] + struct.pack("<I", 0x7FFFFFF0) + data[20:],   # Chunk past the container
+    lambda data: b"RIFX" + data[4:],                                      # Not a WebP
+])
+def test_malformed_input_raises_value_error(tmp_path, edit):
+    source = make_webp(str(tmp_path / "in.webp"))
+    with open(source, 'rb') as f:
+        data = edit(f.read())
+    with open(source, 'wb') as f:
+        f.write(data)
+
+    with pytest.raises(ValueError):
+        strip(source, str(tmp_path / "out.webp"))